@@ -0,0 +1,91 @@
+"""
+Cache configuration read from the environment.
+
+ETIP_CACHE_BACKEND selects the backend of the default cache:
+
+- `locmem` (default): in the memory of each process. Each gunicorn worker
+  has its own cache and its own catalogue versions, so the versions
+  expire after VERSION_TIMEOUT seconds for the changes made by the other
+  workers to be seen.
+- `file`: files under ETIP_CACHE_LOCATION, shared by the workers of a
+  node.
+- `database`: the ETIP_CACHE_LOCATION table of the default database
+  (create it with `python manage.py createcachetable`), shared by all
+  nodes.
+- `redis`: the ETIP_CACHE_LOCATION server URL (requires the `redis`
+  package), shared by all nodes.
+
+The catalogue versions of trackers/versions.py live in this cache, so
+with a shared backend every worker invalidates its cached results as
+soon as a tracker, an approval or a category changes. The signature
+snapshot and the background jobs require a shared backend.
+"""
+import os
+import tempfile
+
+from django.core.exceptions import ImproperlyConfigured
+
+BACKENDS = {
+    'locmem': 'django.core.cache.backends.locmem.LocMemCache',
+    'file': 'django.core.cache.backends.filebased.FileBasedCache',
+    'database': 'django.core.cache.backends.db.DatabaseCache',
+    'redis': 'django.core.cache.backends.redis.RedisCache',
+}
+DEFAULT_LOCATIONS = {
+    'locmem': 'etip',
+    'file': os.path.join(tempfile.gettempdir(), 'etip_cache'),
+    'database': 'etip_cache',
+    'redis': 'redis://127.0.0.1:6379',
+}
+# Seconds the results are kept when no timeout is given, the versions
+# invalidating them on every change
+DEFAULT_TIMEOUT = 24 * 3600
+# Entries kept by the local memory and file backends
+DEFAULT_MAX_ENTRIES = 10000
+# Seconds a catalogue version lives in a cache private to the process
+VERSION_TIMEOUT = 60
+
+
+def caches_from_env(environ):
+    """
+    Returns the CACHES setting described by the environ mapping.
+    """
+    backend = environ.get('ETIP_CACHE_BACKEND') or 'locmem'
+    if backend not in BACKENDS:
+        raise ImproperlyConfigured(
+            f"ETIP_CACHE_BACKEND must be one of {', '.join(BACKENDS)}, "
+            f"not {backend!r}")
+
+    cache = {
+        'BACKEND': BACKENDS[backend],
+        'LOCATION': environ.get('ETIP_CACHE_LOCATION')
+        or DEFAULT_LOCATIONS[backend],
+        'TIMEOUT': DEFAULT_TIMEOUT,
+        'KEY_PREFIX': environ.get('ETIP_CACHE_KEY_PREFIX', 'etip'),
+    }
+    if backend in ('locmem', 'file'):
+        cache['OPTIONS'] = {'MAX_ENTRIES': DEFAULT_MAX_ENTRIES}
+    return {'default': cache}
+
+
+def check_shared(caches, features):
+    """
+    Raises ImproperlyConfigured when one of the features, a dict of setting
+    names to values, is enabled while the cache is private to each
+    process, so that the processes would not see each other's results.
+    """
+    enabled = [name for name, value in features.items() if value]
+    if enabled and version_timeout(caches) is not None:
+        raise ImproperlyConfigured(
+            f"{' and '.join(enabled)} require a cache shared by the "
+            "processes: set ETIP_CACHE_BACKEND to file, database or redis")
+
+
+def version_timeout(caches):
+    """
+    Returns the lifetime of the catalogue versions in the given caches:
+    unlimited when the cache is shared by all processes.
+    """
+    if caches['default']['BACKEND'] == BACKENDS['locmem']:
+        return VERSION_TIMEOUT
+    return None
@@ -0,0 +1,153 @@
+"""
+Database configuration read from the environment.
+
+ETIP_DB_ENGINE selects the profile:
+
+- `sqlite` (default), for small deployments: the database file is
+  ETIP_DB_NAME, opened in WAL mode so that readers never wait for a
+  writer, with write transactions started immediately so that concurrent
+  workers queue on the busy timeout instead of failing.
+- `postgresql`, with ETIP_DB_NAME, ETIP_DB_USER, ETIP_DB_PASSWORD,
+  ETIP_DB_HOST and ETIP_DB_PORT. Setting ETIP_DB_POOL_MAX_SIZE enables
+  the connection pool of psycopg 3 (requires `psycopg[pool]`), which
+  replaces the persistent connections.
+
+Connections are kept open ETIP_DB_CONN_MAX_AGE seconds (60 by default,
+empty for unlimited) and checked before being reused.
+
+With PostgreSQL, ETIP_DB_REPLICA_HOSTS lists the `host[:port]` of read
+replicas, configured as the primary otherwise (see etip/replicas.py).
+"""
+import copy
+
+from django.core.exceptions import ImproperlyConfigured
+
+SQLITE = 'sqlite'
+POSTGRESQL = 'postgresql'
+ENGINES = {
+    SQLITE: 'django.db.backends.sqlite3',
+    POSTGRESQL: 'django.db.backends.postgresql',
+}
+
+DEFAULT_CONN_MAX_AGE = 60
+# Seconds a SQLite connection waits for a lock before failing
+DEFAULT_SQLITE_TIMEOUT = 20
+DEFAULT_SQLITE_MMAP_SIZE = 256 * 1024 * 1024
+DEFAULT_SQLITE_CACHE_SIZE = -64 * 1024  # KiB, when negative
+
+
+def _integer(environ, name, default):
+    value = environ.get(name, '')
+    if value == '':
+        return default
+    try:
+        return int(value)
+    except ValueError:
+        raise ImproperlyConfigured(f'{name} must be an integer, not {value!r}')
+
+
+def _boolean(environ, name, default):
+    value = environ.get(name, '').lower()
+    if value == '':
+        return default
+    if value in ('1', 'true', 'yes', 'on'):
+        return True
+    if value in ('0', 'false', 'no', 'off'):
+        return False
+    raise ImproperlyConfigured(f'{name} must be a boolean, not {value!r}')
+
+
+def sqlite_init_command(environ):
+    """
+    Returns the pragmas run on every new SQLite connection.
+    """
+    mmap_size = _integer(
+        environ, 'ETIP_SQLITE_MMAP_SIZE', DEFAULT_SQLITE_MMAP_SIZE)
+    cache_size = _integer(
+        environ, 'ETIP_SQLITE_CACHE_SIZE', DEFAULT_SQLITE_CACHE_SIZE)
+    return ' '.join([
+        'PRAGMA journal_mode=WAL;',
+        'PRAGMA synchronous=NORMAL;',
+        f'PRAGMA mmap_size={mmap_size};',
+        f'PRAGMA cache_size={cache_size};',
+        'PRAGMA temp_store=MEMORY;',
+    ])
+
+
+def database_from_env(environ, default_name):
+    """
+    Returns the settings of the default database described by the
+    environ mapping, default_name being the SQLite file used when
+    ETIP_DB_NAME is not set.
+    """
+    engine = environ.get('ETIP_DB_ENGINE', SQLITE) or SQLITE
+    if engine not in ENGINES:
+        raise ImproperlyConfigured(
+            f"ETIP_DB_ENGINE must be one of {', '.join(ENGINES)}, "
+            f"not {engine!r}")
+
+    conn_max_age = DEFAULT_CONN_MAX_AGE
+    if 'ETIP_DB_CONN_MAX_AGE' in environ:
+        # An empty value keeps the connections open without limit
+        conn_max_age = _integer(environ, 'ETIP_DB_CONN_MAX_AGE', None)
+    database = {
+        'ENGINE': ENGINES[engine],
+        'NAME': environ.get('ETIP_DB_NAME') or default_name,
+        'CONN_MAX_AGE': conn_max_age,
+        'CONN_HEALTH_CHECKS': _boolean(
+            environ, 'ETIP_DB_CONN_HEALTH_CHECKS', True),
+    }
+
+    if engine == SQLITE:
+        database['OPTIONS'] = {
+            'init_command': sqlite_init_command(environ),
+            'transaction_mode': 'IMMEDIATE',
+            'timeout': _integer(
+                environ, 'ETIP_SQLITE_TIMEOUT', DEFAULT_SQLITE_TIMEOUT),
+        }
+        return database
+
+    database.update({
+        'NAME': environ.get('ETIP_DB_NAME') or 'etip',
+        'USER': environ.get('ETIP_DB_USER', 'etip'),
+        'PASSWORD': environ.get('ETIP_DB_PASSWORD', ''),
+        'HOST': environ.get('ETIP_DB_HOST', ''),
+        'PORT': environ.get('ETIP_DB_PORT', ''),
+        'OPTIONS': {},
+    })
+    pool_max_size = _integer(environ, 'ETIP_DB_POOL_MAX_SIZE', None)
+    if pool_max_size:
+        database['OPTIONS']['pool'] = {
+            'min_size': _integer(environ, 'ETIP_DB_POOL_MIN_SIZE', 1),
+            'max_size': pool_max_size,
+        }
+        # The pool keeps the connections itself
+        database['CONN_MAX_AGE'] = 0
+    return database
+
+
+def replicas_from_env(environ, primary):
+    """
+    Returns the settings of the replicas of the primary database, by
+    alias.
+    """
+    hosts = [
+        host.strip()
+        for host in environ.get('ETIP_DB_REPLICA_HOSTS', '').split(',')
+        if host.strip()
+    ]
+    if hosts and primary['ENGINE'] != ENGINES[POSTGRESQL]:
+        raise ImproperlyConfigured('Replicas require the postgresql engine')
+
+    databases = {}
+    for i, address in enumerate(hosts, 1):
+        host, _, port = address.partition(':')
+        replica = copy.deepcopy(primary)
+        replica.update({
+            'HOST': host,
+            'PORT': port or primary['PORT'],
+            # Tests read the test database of the primary
+            'TEST': {'MIRROR': 'default'},
+        })
+        databases[f'replica{i}'] = replica
+    return databases
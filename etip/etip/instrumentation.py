@@ -0,0 +1,328 @@
+"""
+Request-level performance instrumentation.
+
+The middleware records, for every request, the name of the view, the
+wall time, the number and duration of the SQL queries and the duration
+of the template rendering. Requests slower than SLOW_REQUEST_THRESHOLD
+seconds are logged with their most repeated SQL statements, and the
+measures are aggregated into histograms served in the Prometheus text
+format by the metrics view.
+
+The histograms are kept in the memory of each process. With several
+gunicorn workers, set METRICS_DIRECTORY to a directory shared by them:
+each process writes its histograms there, at most every FLUSH_INTERVAL
+seconds, and the metrics view serves the sum of all the files, like the
+multiprocess mode of prometheus_client. As with it, the directory must be
+emptied when the server (re)starts, the files being named after the
+process ids.
+"""
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+from contextvars import ContextVar
+import json
+import logging
+import os
+import tempfile
+import threading
+import time
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import connections
+from django.http import HttpResponse
+from django.template.backends.django import DjangoTemplates
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_SLOW_REQUEST_THRESHOLD = 1.0
+REPEATED_STATEMENTS = 5
+
+DURATION_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0
+)
+QUERY_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100, 200, 500)
+# Seconds between two writes of the metrics of a process to METRICS_DIRECTORY
+FLUSH_INTERVAL = 1.0
+
+HISTOGRAMS = (
+    ('etip_request_duration_seconds', 'Wall time of the requests.',
+     'wall_time', DURATION_BUCKETS),
+    ('etip_request_sql_duration_seconds',
+     'Time spent in SQL queries by the requests.',
+     'sql_time', DURATION_BUCKETS),
+    ('etip_request_template_duration_seconds',
+     'Time spent rendering templates by the requests.',
+     'template_time', DURATION_BUCKETS),
+    ('etip_request_queries', 'Number of SQL queries of the requests.',
+     'queries', QUERY_BUCKETS),
+)
+
+_current = ContextVar('etip_request_record', default=None)
+
+
+class RequestRecord:
+    def __init__(self):
+        self.view = 'unresolved'
+        self.wall_time = 0.0
+        self.queries = 0
+        self.sql_time = 0.0
+        self.template_time = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.sql_time += time.perf_counter() - start
+            self.queries += 1
+            self.statements[sql] += 1
+
+    def repeated_statements(self, limit=REPEATED_STATEMENTS):
+        return [
+            (sql, count)
+            for sql, count in self.statements.most_common(limit) if count > 1
+        ]
+
+
+class Histogram:
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.total = 0
+        self.sum = 0
+
+    def observe(self, value):
+        for i, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[i] += 1
+        self.total += 1
+        self.sum += value
+
+
+class Registry:
+    """
+    Histograms of the request measures per view, and response counters
+    per view and status code.
+    """
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.clear()
+
+    def clear(self):
+        self.histograms = {
+            name: defaultdict(lambda buckets=buckets: Histogram(buckets))
+            for name, _, _, buckets in HISTOGRAMS
+        }
+        self.responses = Counter()
+        self.flushed = None
+
+    def dump(self):
+        """
+        Returns the metrics as a JSON-serializable dict, for merge().
+        """
+        with self.lock:
+            return {
+                'histograms': {
+                    name: {
+                        view: [histogram.counts, histogram.total,
+                               histogram.sum]
+                        for view, histogram in histograms.items()
+                    }
+                    for name, histograms in self.histograms.items()
+                },
+                'responses': [
+                    [view, status, count]
+                    for (view, status), count in self.responses.items()
+                ],
+            }
+
+    def merge(self, data):
+        """
+        Adds the metrics dumped by another registry to these ones.
+        """
+        with self.lock:
+            for name, views in data['histograms'].items():
+                for view, (counts, total, total_sum) in views.items():
+                    histogram = self.histograms[name][view]
+                    histogram.counts = [
+                        a + b for a, b in zip(histogram.counts, counts)]
+                    histogram.total += total
+                    histogram.sum += total_sum
+            for view, status, count in data['responses']:
+                self.responses[(view, status)] += count
+
+    def observe(self, record, status):
+        with self.lock:
+            for name, _, attribute, _ in HISTOGRAMS:
+                self.histograms[name][record.view].observe(
+                    getattr(record, attribute))
+            self.responses[(record.view, status)] += 1
+
+    def render(self):
+        """
+        Returns the metrics in the Prometheus text exposition format.
+        """
+        lines = []
+        with self.lock:
+            for name, description, _, _ in HISTOGRAMS:
+                lines += [f'# HELP {name} {description}',
+                          f'# TYPE {name} histogram']
+                for view, histogram in sorted(self.histograms[name].items()):
+                    label = f'view="{_escape(view)}"'
+                    for bound, count in zip(
+                            histogram.buckets, histogram.counts):
+                        lines.append(
+                            f'{name}_bucket{{{label},le="{bound}"}} {count}')
+                    lines += [
+                        f'{name}_bucket{{{label},le="+Inf"}} {histogram.total}',
+                        f'{name}_sum{{{label}}} {histogram.sum}',
+                        f'{name}_count{{{label}}} {histogram.total}',
+                    ]
+            lines += ['# HELP etip_responses_total Responses per status code.',
+                      '# TYPE etip_responses_total counter']
+            for (view, status), count in sorted(self.responses.items()):
+                lines.append(
+                    f'etip_responses_total{{view="{_escape(view)}",'
+                    f'status="{status}"}} {count}')
+        return '\n'.join(lines) + '\n'
+
+
+def _escape(value):
+    return value.replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+registry = Registry()
+
+
+def flush(directory):
+    """
+    Writes the metrics of the process to the shared directory, replacing
+    its file atomically.
+    """
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.metrics-')
+    try:
+        with os.fdopen(fd, 'w') as f:
+            json.dump(registry.dump(), f)
+        os.replace(temporary, os.path.join(directory, f'{os.getpid()}.json'))
+    except BaseException:
+        os.unlink(temporary)
+        raise
+    registry.flushed = time.monotonic()
+
+
+def collect(directory):
+    """
+    Returns a registry holding the sum of the metrics of all the processes
+    writing to the shared directory.
+    """
+    flush(directory)
+    total = Registry()
+    for name in sorted(os.listdir(directory)):
+        if not name.endswith('.json'):
+            continue
+        try:
+            with open(os.path.join(directory, name)) as f:
+                total.merge(json.load(f))
+        except (OSError, ValueError):
+            # Unreadable file, of a process being stopped
+            continue
+    return total
+
+
+class InstrumentationMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        record = RequestRecord()
+        token = _current.set(record)
+        start = time.perf_counter()
+        try:
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(record))
+                response = self.get_response(request)
+        finally:
+            record.wall_time = time.perf_counter() - start
+            _current.reset(token)
+
+        if request.resolver_match is not None:
+            record.view = request.resolver_match.view_name
+        registry.observe(record, response.status_code)
+        directory = getattr(settings, 'METRICS_DIRECTORY', None)
+        if directory and (registry.flushed is None or
+                          time.monotonic() - registry.flushed > FLUSH_INTERVAL):
+            flush(directory)
+        self.log_slow_request(request, record)
+        return response
+
+    def log_slow_request(self, request, record):
+        threshold = getattr(
+            settings, 'SLOW_REQUEST_THRESHOLD', DEFAULT_SLOW_REQUEST_THRESHOLD)
+        if threshold is None or record.wall_time < threshold:
+            return
+        repeated = ''.join(
+            f'\n  {count}x {sql}' for sql, count in record.repeated_statements()
+        )
+        logger.warning(
+            'Slow request %s %s (%s): %.3fs, %d queries in %.3fs, '
+            'templates in %.3fs%s',
+            request.method, request.path, record.view, record.wall_time,
+            record.queries, record.sql_time, record.template_time, repeated
+        )
+
+
+class TimedTemplate:
+    def __init__(self, template):
+        self.template = template
+
+    def __getattr__(self, name):
+        return getattr(self.template, name)
+
+    def render(self, context=None, request=None):
+        start = time.perf_counter()
+        try:
+            return self.template.render(context, request)
+        finally:
+            record = _current.get()
+            if record is not None:
+                record.template_time += time.perf_counter() - start
+
+
+class InstrumentedDjangoTemplates(DjangoTemplates):
+    """
+    Django template backend timing the rendering of the templates in the
+    request records of the instrumentation middleware.
+    """
+    def from_string(self, template_code):
+        return TimedTemplate(super().from_string(template_code))
+
+    def get_template(self, template_name):
+        return TimedTemplate(super().get_template(template_name))
+
+
+def request_user(request):
+    """
+    Returns the user of the session, or else of the API token of the
+    request, as scripts and scrapers cannot log in.
+    """
+    if request.user.is_authenticated:
+        return request.user
+    try:
+        authenticated = TokenAuthentication().authenticate(request)
+    except AuthenticationFailed:
+        authenticated = None
+    return authenticated[0] if authenticated else request.user
+
+
+def metrics(request):
+    if not request_user(request).is_staff:
+        raise PermissionDenied
+    directory = getattr(settings, 'METRICS_DIRECTORY', None)
+    source = collect(directory) if directory else registry
+    return HttpResponse(
+        source.render(), content_type='text/plain; version=0.0.4')
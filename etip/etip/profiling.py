@@ -0,0 +1,100 @@
+"""
+On-demand profiling of a request, for superusers.
+
+When PROFILING_ENABLED is set, a superuser can add `_profile=cprofile` to
+the URL of any page or API endpoint to get the cProfile report of the
+request instead of its response, or `_profile=sql` to get all its SQL
+queries with their timings.
+"""
+from collections import defaultdict
+from contextlib import ExitStack
+import cProfile
+import io
+import pstats
+import time
+
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+from django.utils.cache import add_never_cache_headers
+
+from .instrumentation import request_user
+
+PARAMETER = '_profile'
+CPROFILE = 'cprofile'
+SQL = 'sql'
+# Number of functions listed in the cProfile reports
+PROFILE_LINES = 60
+
+
+class SqlRecorder:
+    def __init__(self):
+        self.queries = []
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.queries.append((
+                time.perf_counter() - start, context['connection'].alias, sql))
+
+    def report(self):
+        """
+        Returns the statements sorted by their total time, then every
+        query in execution order.
+        """
+        statements = defaultdict(list)
+        for duration, _, sql in self.queries:
+            statements[sql].append(duration)
+
+        total = sum(duration for duration, _, _ in self.queries)
+        lines = [f'{len(self.queries)} queries in {total:.6f}s', '',
+                 'Statements by total time:', '']
+        for sql, durations in sorted(
+                statements.items(), key=lambda item: -sum(item[1])):
+            lines.append(
+                f'{sum(durations):.6f}s {len(durations)}x '
+                f'(max {max(durations):.6f}s) {sql}')
+        lines += ['', 'Queries in execution order:', '']
+        for i, (duration, alias, sql) in enumerate(self.queries, 1):
+            lines.append(f'{i}. [{alias}] {duration:.6f}s {sql}')
+        return '\n'.join(lines) + '\n'
+
+
+class ProfilingMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        mode = request.GET.get(PARAMETER)
+        if mode not in (CPROFILE, SQL) \
+                or not getattr(settings, 'PROFILING_ENABLED', False) \
+                or not request_user(request).is_superuser:
+            return self.get_response(request)
+
+        start = time.perf_counter()
+        if mode == CPROFILE:
+            profiler = cProfile.Profile()
+            response = profiler.runcall(self.get_response, request)
+            report = io.StringIO()
+            stats = pstats.Stats(profiler, stream=report)
+            stats.sort_stats('cumulative').print_stats(PROFILE_LINES)
+            report = report.getvalue()
+        else:
+            recorder = SqlRecorder()
+            with ExitStack() as stack:
+                for connection in connections.all():
+                    stack.enter_context(connection.execute_wrapper(recorder))
+                response = self.get_response(request)
+            report = recorder.report()
+        elapsed = time.perf_counter() - start
+
+        header = (
+            f'{request.method} {request.get_full_path()}: '
+            f'{response.status_code} in {elapsed:.6f}s\n\n'
+        )
+        profile = HttpResponse(header + report, content_type='text/plain')
+        add_never_cache_headers(profile)
+        return profile
@@ -0,0 +1,138 @@
+"""
+Routing of the read-only views to the database replicas.
+
+Reads go to the primary database, except in the GET and HEAD requests of
+the views decorated with read_from_replica, which read from a random
+replica of DATABASE_REPLICAS. Writes, and all the queries on the
+accounts, sessions, admin and revisions tables, always go to the primary.
+
+After a request writes to the database, the next requests of the same
+client read from the primary for REPLICA_STICKY_SECONDS, so that editors
+see their changes while the replicas catch up.
+
+The results cached under the catalogue versions are computed within
+read_from_primary(): a replica lagging behind a bump would otherwise
+compute them from the data of the previous version and cache them under
+the new one, until the next bump.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+from functools import wraps
+import random
+import time
+
+from django.conf import settings
+
+PRIMARY = 'default'
+# Tables read from the primary, as they are written by most requests or
+# must reflect the last write
+PRIMARY_APPS = {
+    'admin', 'auth', 'authtoken', 'contenttypes', 'reversion', 'sessions',
+}
+STICKY_COOKIE = 'etip_primary_until'
+DEFAULT_STICKY_SECONDS = 10
+SAFE_METHODS = ('GET', 'HEAD')
+
+
+class RequestState:
+    def __init__(self, sticky=False):
+        self.sticky = sticky
+        self.replica = False
+        self.wrote = False
+
+
+_state = ContextVar('etip_replica_state', default=None)
+
+
+def replicas():
+    return getattr(settings, 'DATABASE_REPLICAS', [])
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        state = _state.get()
+        aliases = replicas()
+        if state is None or not state.replica or state.sticky or not aliases \
+                or model._meta.app_label in PRIMARY_APPS:
+            return PRIMARY
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        state = _state.get()
+        if state is not None:
+            state.wrote = True
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # The replicas hold the same data as the primary
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        return db not in replicas()
+
+
+class ReplicaMiddleware:
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        if not replicas():
+            return self.get_response(request)
+
+        try:
+            sticky = float(request.COOKIES.get(STICKY_COOKIE, 0)) > time.time()
+        except ValueError:
+            sticky = False
+        state = RequestState(sticky)
+        token = _state.set(state)
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.reset(token)
+
+        if state.wrote:
+            seconds = getattr(
+                settings, 'REPLICA_STICKY_SECONDS', DEFAULT_STICKY_SECONDS)
+            response.set_cookie(
+                STICKY_COOKIE, str(time.time() + seconds), max_age=seconds,
+                httponly=True, samesite='Lax')
+        return response
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Reads from the primary within the block, even in a read_from_replica
+    view.
+    """
+    state = _state.get()
+    if state is None:
+        yield
+        return
+
+    previous = state.replica
+    state.replica = False
+    try:
+        yield
+    finally:
+        state.replica = previous
+
+
+def read_from_replica(view):
+    """
+    Decorates a view whose GET and HEAD requests can read from a replica.
+    """
+    @wraps(view)
+    def wrapper(request, *args, **kwargs):
+        state = _state.get()
+        if state is None or request.method not in SAFE_METHODS:
+            return view(request, *args, **kwargs)
+
+        previous = state.replica
+        state.replica = True
+        try:
+            return view(request, *args, **kwargs)
+        finally:
+            state.replica = previous
+
+    return wrapper
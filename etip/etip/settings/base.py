@@ -13,6 +13,9 @@ https://docs.djangoproject.com/en/2.0/ref/settings/
 import os
 from pathlib import Path
 
+from etip.caches import caches_from_env, check_shared, version_timeout
+from etip.database import database_from_env, replicas_from_env
+
 # Build paths inside the project like this: os.path.join(BASE_DIR, ...)
 ROOT_DIR = Path(__file__).resolve(strict=True).parent.parent.parent
 APPS_DIR = ROOT_DIR / ""
@@ -45,11 +48,14 @@ REST_FRAMEWORK = {
 }
 
 MIDDLEWARE = [
+    'etip.instrumentation.InstrumentationMiddleware',
+    'etip.replicas.ReplicaMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'etip.profiling.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -58,7 +64,7 @@ ROOT_URLCONF = 'etip.urls'
 
 TEMPLATES = [
     {
-        'BACKEND': 'django.template.backends.django.DjangoTemplates',
+        'BACKEND': 'etip.instrumentation.InstrumentedDjangoTemplates',
         'DIRS': [],
         'APP_DIRS': True,
         'OPTIONS': {
@@ -77,13 +83,49 @@ WSGI_APPLICATION = 'etip.wsgi.application'
 
 # Database
 # https://docs.djangoproject.com/en/2.0/ref/settings/#databases
+# Configured by the ETIP_DB_* environment variables, see etip/database.py
 
 DATABASES = {
-    'default': {
-        'ENGINE': 'django.db.backends.sqlite3',
-        'NAME': os.path.join(BASE_DIR, '..', 'db.sqlite3'),
-    }
+    'default': database_from_env(
+        os.environ, os.path.join(BASE_DIR, '..', 'db.sqlite3')),
 }
+DATABASES.update(replicas_from_env(os.environ, DATABASES['default']))
+
+# Aliases of the replicas read by the read-only views, see etip/replicas.py
+DATABASE_REPLICAS = [alias for alias in DATABASES if alias != 'default']
+DATABASE_ROUTERS = ['etip.replicas.ReplicaRouter']
+
+# Seconds the requests of a client keep reading from the primary database
+# after one of them wrote to it.
+REPLICA_STICKY_SECONDS = 10
+
+
+# Cache
+# Configured by the ETIP_CACHE_* environment variables, see etip/caches.py
+
+CACHES = caches_from_env(os.environ)
+
+# Seconds the catalogue versions invalidating the cached results are kept,
+# None when the cache is shared by all processes.
+
+CATALOGUE_VERSION_TIMEOUT = version_timeout(CACHES)
+
+# File of the signature index shared by the workers of a server, see
+# trackers/snapshot.py. Requires a shared cache; None keeps the index in the
+# memory of each process.
+
+SIGNATURE_SNAPSHOT_PATH = os.environ.get('ETIP_SIGNATURE_SNAPSHOT') or None
+
+# Enqueue the recomputation of the collisions, export and stats when the
+# catalogue changes, for `python manage.py run_worker` to run it outside of
+# the requests. Requires a shared cache, see trackers/jobs.py.
+
+CATALOGUE_JOBS = os.environ.get('ETIP_CATALOGUE_JOBS', '') == '1'
+
+check_shared(CACHES, {
+    'SIGNATURE_SNAPSHOT_PATH': SIGNATURE_SNAPSHOT_PATH,
+    'CATALOGUE_JOBS': CATALOGUE_JOBS,
+})
 
 
 # Password validation
@@ -127,3 +169,30 @@ LOGIN_URL = '/admin/login/'
 # See https://docs.djangoproject.com/en/3.2/releases/3.2/#customizing-type-of-auto-created-primary-keys
 
 DEFAULT_AUTO_FIELD = 'django.db.models.AutoField'
+
+# Cache the total counts of the tracker lists until a tracker or an
+# approval changes, instead of counting on every page view.
+
+TRACKER_LIST_CACHE_COUNTS = True
+
+# Seconds a shared cache may serve the anonymous tracker pages without
+# revalidating them with their ETag.
+
+CATALOGUE_CACHE_MAX_AGE = 60
+
+# Requests slower than this number of seconds are logged with their most
+# repeated SQL statements. None disables the log.
+
+SLOW_REQUEST_THRESHOLD = 1.0
+
+# Directory where the workers of a server write their request metrics, for
+# the metrics view to serve them all, see etip/instrumentation.py. It must
+# be emptied when the server starts. None serves the metrics of the process
+# answering the scrape only.
+
+METRICS_DIRECTORY = os.environ.get('ETIP_METRICS_DIR') or None
+
+# Let superusers profile a request by adding `_profile=cprofile` or
+# `_profile=sql` to its URL.
+
+PROFILING_ENABLED = False
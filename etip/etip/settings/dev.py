@@ -11,3 +11,5 @@ ALLOWED_HOSTS = [u'localhost', u'127.0.0.1']
 STATIC_URL = '/static/'
 STATIC_ROOT = f'{ROOT_DIR}/staticfiles/'
 STATICFILES_DIRS = [f'{BASE_DIR}/static']
+
+PROFILING_ENABLED = True
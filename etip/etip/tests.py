@@ -0,0 +1,445 @@
+import json
+import os
+import tempfile
+
+from django.contrib.auth.models import User
+from django.core.exceptions import ImproperlyConfigured
+from django.http import HttpResponse
+from django.test import Client, override_settings, RequestFactory, \
+    SimpleTestCase, TestCase
+from rest_framework.authtoken.models import Token
+
+from trackers.models import Tracker
+from .caches import caches_from_env, check_shared, version_timeout
+from .database import database_from_env, replicas_from_env
+from .instrumentation import Registry, registry, RequestRecord
+from .replicas import read_from_primary, read_from_replica, \
+    ReplicaMiddleware, ReplicaRouter, STICKY_COOKIE
+
+
+class InstrumentationTests(TestCase):
+    METRICS_PATH = '/metrics'
+
+    def setUp(self):
+        registry.clear()
+
+    def _staff_client(self):
+        c = Client()
+        c.force_login(User.objects.create_user(
+            'jane', 'jdoe@mail.com', '@password', is_staff=True))
+        return c
+
+    def test_records_requests_per_view(self):
+        Tracker.objects.create(name='tracker_1', website='https://website1')
+        c = self._staff_client()
+
+        c.get('/trackers/all')
+        c.get('/trackers/all')
+        c.get('/trackers/review')
+        response = c.get(self.METRICS_PATH)
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        metrics = response.content.decode()
+        self.assertIn('# TYPE etip_request_duration_seconds histogram', metrics)
+        self.assertIn(
+            'etip_request_duration_seconds_count{view="trackers:index"} 2',
+            metrics)
+        self.assertIn(
+            'etip_request_queries_count{view="trackers:review"} 1', metrics)
+        self.assertIn(
+            'etip_responses_total{view="trackers:index",status="200"} 2',
+            metrics)
+
+    def test_records_queries_and_templates(self):
+        Tracker.objects.create(name='tracker_1', website='https://website1')
+
+        self.client.get('/trackers/all')
+
+        histograms = registry.histograms
+        queries = histograms['etip_request_queries']['trackers:index']
+        templates = histograms[
+            'etip_request_template_duration_seconds']['trackers:index']
+        self.assertGreater(queries.sum, 0)
+        self.assertGreater(templates.sum, 0)
+
+        self.client.get('/trackers/export')
+
+        json_templates = histograms[
+            'etip_request_template_duration_seconds']['trackers:export']
+        self.assertEqual(json_templates.total, 1)
+        self.assertEqual(json_templates.sum, 0)
+
+    def test_unresolved_requests(self):
+        self.client.get('/nowhere/')
+
+        self.assertEqual(registry.responses[('unresolved', 404)], 1)
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=0)
+    def test_logs_slow_requests_with_repeated_statements(self):
+        tracker = Tracker.objects.create(
+            name='tracker_1', website='https://website1')
+
+        with self.assertLogs('etip.instrumentation', 'WARNING') as logs:
+            self.client.get(f'/trackers/{tracker.pk}/approvals/')
+
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn(f'/trackers/{tracker.pk}/approvals/', logs.output[0])
+        self.assertIn('trackers:tracker_approvals', logs.output[0])
+
+    def test_repeated_statements(self):
+        record = RequestRecord()
+
+        def execute(sql, params, many, context):
+            return None
+
+        for sql in ['SELECT 1', 'SELECT 2', 'SELECT 1', 'SELECT 1', 'SELECT 2',
+                    'SELECT 3']:
+            record(execute, sql, [], False, {})
+
+        self.assertEqual(record.queries, 6)
+        self.assertEqual(
+            record.repeated_statements(), [('SELECT 1', 3), ('SELECT 2', 2)])
+
+    @override_settings(SLOW_REQUEST_THRESHOLD=None)
+    def test_slow_request_log_disabled(self):
+        with self.assertNoLogs('etip.instrumentation', 'WARNING'):
+            self.client.get('/trackers/all')
+
+    def test_metrics_refused_to_anonymous_and_non_staff(self):
+        response = self.client.get(self.METRICS_PATH)
+        self.assertEqual(response.status_code, 403)
+
+        User.objects.create_user('john', 'john@mail.com', '@password')
+        self.client.login(username='john', password='@password')
+        response = self.client.get(self.METRICS_PATH)
+        self.assertEqual(response.status_code, 403)
+
+    def test_metrics_of_all_processes(self):
+        other = Registry()
+        record = RequestRecord()
+        record.view = 'trackers:index'
+        other.observe(record, 200)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        with open(os.path.join(directory.name, '1.json'), 'w') as f:
+            json.dump(other.dump(), f)
+        with open(os.path.join(directory.name, '2.json'), 'w') as f:
+            f.write('{"truncated')
+        c = self._staff_client()
+
+        with self.settings(METRICS_DIRECTORY=directory.name):
+            c.get('/trackers/all')
+            response = c.get(self.METRICS_PATH)
+
+        metrics = response.content.decode()
+        self.assertIn(
+            'etip_request_duration_seconds_count{view="trackers:index"} 2',
+            metrics)
+        self.assertIn(
+            'etip_responses_total{view="trackers:index",status="200"} 2',
+            metrics)
+        self.assertTrue(os.path.exists(
+            os.path.join(directory.name, f'{os.getpid()}.json')))
+
+    def test_metrics_with_api_token(self):
+        user = User.objects.create_user(
+            'scraper', 'scraper@mail.com', '@password', is_staff=True)
+        token = Token.objects.create(user=user)
+
+        response = self.client.get(
+            self.METRICS_PATH, HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertEqual(response.status_code, 200)
+
+        response = self.client.get(
+            self.METRICS_PATH, HTTP_AUTHORIZATION='Token invalid')
+        self.assertEqual(response.status_code, 403)
+
+
+@override_settings(PROFILING_ENABLED=True)
+class ProfilingTests(TestCase):
+
+    def setUp(self):
+        self.tracker = Tracker.objects.create(
+            name='tracker_1', website='https://website1')
+        self.superuser = User.objects.create_superuser(
+            'admin', 'admin@mail.com', '@password')
+
+    def test_cprofile_report(self):
+        c = Client()
+        c.force_login(self.superuser)
+
+        response = c.get('/trackers/all', {'_profile': 'cprofile'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response['Content-Type'].startswith('text/plain'))
+        report = response.content.decode()
+        self.assertIn('GET /trackers/all?_profile=cprofile: 200', report)
+        self.assertIn('cumulative', report)
+        self.assertIn('views.py', report)
+        self.assertIn('no-cache', response['Cache-Control'])
+
+    def test_sql_report(self):
+        c = Client()
+        c.force_login(self.superuser)
+
+        response = c.get(
+            f'/trackers/{self.tracker.pk}/', {'_profile': 'sql'})
+
+        report = response.content.decode()
+        self.assertIn('Statements by total time:', report)
+        self.assertIn('FROM "trackers_tracker"', report)
+        self.assertIn('1. [default]', report)
+
+    def test_stats_and_api(self):
+        c = Client()
+        c.force_login(self.superuser)
+
+        response = c.get('/stats/', {'_profile': 'sql'})
+        self.assertIn('Statements by total time:', response.content.decode())
+
+        token = Token.objects.create(user=self.superuser)
+        response = Client().get(
+            '/api/trackers/', {'_profile': 'cprofile'},
+            HTTP_AUTHORIZATION=f'Token {token.key}')
+        self.assertIn('GET /api/trackers/', response.content.decode())
+
+    def test_ignored_for_other_users(self):
+        response = self.client.get('/trackers/all', {'_profile': 'sql'})
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+        User.objects.create_user('john', 'john@mail.com', '@password')
+        self.client.login(username='john', password='@password')
+        response = self.client.get('/trackers/all', {'_profile': 'sql'})
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+    @override_settings(PROFILING_ENABLED=False)
+    def test_disabled(self):
+        c = Client()
+        c.force_login(self.superuser)
+
+        response = c.get('/trackers/all', {'_profile': 'sql'})
+
+        self.assertTrue(response['Content-Type'].startswith('text/html'))
+
+
+class DatabaseFromEnvTests(SimpleTestCase):
+
+    def test_sqlite_by_default(self):
+        database = database_from_env({}, '/tmp/db.sqlite3')
+
+        self.assertEqual(database['ENGINE'], 'django.db.backends.sqlite3')
+        self.assertEqual(database['NAME'], '/tmp/db.sqlite3')
+        self.assertEqual(database['CONN_MAX_AGE'], 60)
+        self.assertTrue(database['CONN_HEALTH_CHECKS'])
+        options = database['OPTIONS']
+        self.assertIn('PRAGMA journal_mode=WAL;', options['init_command'])
+        self.assertIn('PRAGMA synchronous=NORMAL;', options['init_command'])
+        self.assertIn('PRAGMA mmap_size=268435456;', options['init_command'])
+        self.assertEqual(options['transaction_mode'], 'IMMEDIATE')
+        self.assertEqual(options['timeout'], 20)
+
+    def test_sqlite_tuning(self):
+        database = database_from_env({
+            'ETIP_DB_NAME': '/data/etip.sqlite3',
+            'ETIP_SQLITE_MMAP_SIZE': '0',
+            'ETIP_SQLITE_TIMEOUT': '5',
+            'ETIP_DB_CONN_MAX_AGE': '',
+        }, '/tmp/db.sqlite3')
+
+        self.assertEqual(database['NAME'], '/data/etip.sqlite3')
+        self.assertIsNone(database['CONN_MAX_AGE'])
+        self.assertIn('PRAGMA mmap_size=0;', database['OPTIONS']['init_command'])
+        self.assertEqual(database['OPTIONS']['timeout'], 5)
+
+    def test_postgresql(self):
+        database = database_from_env({
+            'ETIP_DB_ENGINE': 'postgresql',
+            'ETIP_DB_NAME': 'trackers',
+            'ETIP_DB_USER': 'etip_user',
+            'ETIP_DB_PASSWORD': 'secret',
+            'ETIP_DB_HOST': 'db',
+            'ETIP_DB_PORT': '5433',
+            'ETIP_DB_CONN_MAX_AGE': '300',
+            'ETIP_DB_CONN_HEALTH_CHECKS': 'false',
+        }, '/tmp/db.sqlite3')
+
+        self.assertEqual(database['ENGINE'], 'django.db.backends.postgresql')
+        self.assertEqual(database['NAME'], 'trackers')
+        self.assertEqual(database['USER'], 'etip_user')
+        self.assertEqual(database['PASSWORD'], 'secret')
+        self.assertEqual(database['HOST'], 'db')
+        self.assertEqual(database['PORT'], '5433')
+        self.assertEqual(database['CONN_MAX_AGE'], 300)
+        self.assertFalse(database['CONN_HEALTH_CHECKS'])
+        self.assertEqual(database['OPTIONS'], {})
+
+    def test_postgresql_pool(self):
+        database = database_from_env({
+            'ETIP_DB_ENGINE': 'postgresql',
+            'ETIP_DB_POOL_MIN_SIZE': '2',
+            'ETIP_DB_POOL_MAX_SIZE': '8',
+        }, '/tmp/db.sqlite3')
+
+        self.assertEqual(database['NAME'], 'etip')
+        self.assertEqual(
+            database['OPTIONS']['pool'], {'min_size': 2, 'max_size': 8})
+        self.assertEqual(database['CONN_MAX_AGE'], 0)
+
+    def test_invalid_values(self):
+        with self.assertRaises(ImproperlyConfigured):
+            database_from_env({'ETIP_DB_ENGINE': 'oracle'}, '/tmp/db.sqlite3')
+        with self.assertRaises(ImproperlyConfigured):
+            database_from_env(
+                {'ETIP_DB_CONN_MAX_AGE': 'forever'}, '/tmp/db.sqlite3')
+        with self.assertRaises(ImproperlyConfigured):
+            database_from_env(
+                {'ETIP_DB_CONN_HEALTH_CHECKS': 'maybe'}, '/tmp/db.sqlite3')
+
+    def test_replicas(self):
+        primary = database_from_env({
+            'ETIP_DB_ENGINE': 'postgresql',
+            'ETIP_DB_HOST': 'primary',
+            'ETIP_DB_PORT': '5432',
+        }, '/tmp/db.sqlite3')
+
+        databases = replicas_from_env(
+            {'ETIP_DB_REPLICA_HOSTS': 'replica-a, replica-b:6432'}, primary)
+
+        self.assertEqual(list(databases), ['replica1', 'replica2'])
+        self.assertEqual(databases['replica1']['HOST'], 'replica-a')
+        self.assertEqual(databases['replica1']['PORT'], '5432')
+        self.assertEqual(databases['replica2']['HOST'], 'replica-b')
+        self.assertEqual(databases['replica2']['PORT'], '6432')
+        self.assertEqual(databases['replica1']['NAME'], primary['NAME'])
+        self.assertEqual(databases['replica1']['TEST'], {'MIRROR': 'default'})
+        self.assertEqual(replicas_from_env({}, primary), {})
+
+    def test_replicas_require_postgresql(self):
+        with self.assertRaises(ImproperlyConfigured):
+            replicas_from_env(
+                {'ETIP_DB_REPLICA_HOSTS': 'replica'},
+                database_from_env({}, '/tmp/db.sqlite3'))
+
+
+@override_settings(DATABASE_REPLICAS=['replica1'], REPLICA_STICKY_SECONDS=10)
+class ReplicaRoutingTests(SimpleTestCase):
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+        self.routes = {}
+
+    def _view(self, write=False):
+        def view(request):
+            self.routes['tracker'] = self.router.db_for_read(Tracker)
+            self.routes['user'] = self.router.db_for_read(User)
+            if write:
+                self.router.db_for_write(Tracker)
+            return HttpResponse()
+        return view
+
+    def test_reads_from_replica(self):
+        middleware = ReplicaMiddleware(read_from_replica(self._view()))
+
+        response = middleware(self.factory.get('/trackers/all'))
+
+        self.assertEqual(self.routes['tracker'], 'replica1')
+        self.assertEqual(self.routes['user'], 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_cached_results_computed_on_primary(self):
+        def view(request):
+            with read_from_primary():
+                self.routes['computed'] = self.router.db_for_read(Tracker)
+            self.routes['tracker'] = self.router.db_for_read(Tracker)
+            return HttpResponse()
+
+        ReplicaMiddleware(read_from_replica(view))(
+            self.factory.get('/trackers/all'))
+
+        self.assertEqual(self.routes['computed'], 'default')
+        self.assertEqual(self.routes['tracker'], 'replica1')
+
+    def test_primary_outside_replica_views(self):
+        middleware = ReplicaMiddleware(self._view())
+        middleware(self.factory.get('/trackers/all'))
+        self.assertEqual(self.routes['tracker'], 'default')
+
+        middleware = ReplicaMiddleware(read_from_replica(self._view()))
+        middleware(self.factory.post('/trackers/all'))
+        self.assertEqual(self.routes['tracker'], 'default')
+
+        self.assertEqual(self.router.db_for_read(Tracker), 'default')
+
+    def test_primary_after_a_write(self):
+        response = ReplicaMiddleware(self._view(write=True))(
+            self.factory.post('/trackers/1/approve/'))
+
+        cookie = response.cookies[STICKY_COOKIE]
+        self.assertEqual(cookie['max-age'], 10)
+        self.assertTrue(cookie['httponly'])
+
+        middleware = ReplicaMiddleware(read_from_replica(self._view()))
+        request = self.factory.get('/trackers/1/')
+        request.COOKIES[STICKY_COOKIE] = cookie.value
+        middleware(request)
+        self.assertEqual(self.routes['tracker'], 'default')
+
+        request = self.factory.get('/trackers/1/')
+        request.COOKIES[STICKY_COOKIE] = '0'
+        middleware(request)
+        self.assertEqual(self.routes['tracker'], 'replica1')
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        middleware = ReplicaMiddleware(
+            read_from_replica(self._view(write=True)))
+
+        response = middleware(self.factory.get('/trackers/all'))
+
+        self.assertEqual(self.routes['tracker'], 'default')
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_no_migrations_on_replicas(self):
+        self.assertTrue(self.router.allow_migrate('default', 'trackers'))
+        self.assertFalse(self.router.allow_migrate('replica1', 'trackers'))
+
+
+class CachesFromEnvTests(SimpleTestCase):
+
+    def test_local_memory_by_default(self):
+        caches = caches_from_env({})
+
+        self.assertEqual(
+            caches['default']['BACKEND'],
+            'django.core.cache.backends.locmem.LocMemCache')
+        self.assertEqual(caches['default']['KEY_PREFIX'], 'etip')
+        self.assertEqual(version_timeout(caches), 60)
+
+    def test_shared_backends(self):
+        caches = caches_from_env({
+            'ETIP_CACHE_BACKEND': 'database',
+            'ETIP_CACHE_LOCATION': 'cache_table',
+        })
+
+        self.assertEqual(
+            caches['default']['BACKEND'],
+            'django.core.cache.backends.db.DatabaseCache')
+        self.assertEqual(caches['default']['LOCATION'], 'cache_table')
+        self.assertIsNone(version_timeout(caches))
+
+        caches = caches_from_env({'ETIP_CACHE_BACKEND': 'file'})
+        self.assertTrue(caches['default']['LOCATION'].endswith('etip_cache'))
+
+    def test_shared_cache_required(self):
+        features = {'CATALOGUE_JOBS': True, 'SIGNATURE_SNAPSHOT_PATH': None}
+
+        with self.assertRaises(ImproperlyConfigured):
+            check_shared(caches_from_env({}), features)
+        check_shared(caches_from_env({'ETIP_CACHE_BACKEND': 'file'}), features)
+        check_shared(caches_from_env({}), {'CATALOGUE_JOBS': False})
+
+    def test_invalid_backend(self):
+        with self.assertRaises(ImproperlyConfigured):
+            caches_from_env({'ETIP_CACHE_BACKEND': 'memcached'})
@@ -16,8 +16,11 @@ Including another URLconf
 from django.contrib import admin
 from django.urls import include, path
 
+from . import instrumentation
+
 urlpatterns = [
     path('admin/', admin.site.urls),
+    path('metrics', instrumentation.metrics, name='metrics'),
     path('api/', include('restful_api.urls')),
     path('stats/', include('stats.urls')),
     path('', include('trackers.urls')),
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 
-from trackers.models import Tracker, TrackerCategory
+from trackers.models import Advertising, Analytic, Capability, \
+    Network, Tracker, TrackerCategory
 
 
 class TrackerCategorySerializer(serializers.ModelSerializer):
@@ -9,8 +10,44 @@ class TrackerCategorySerializer(serializers.ModelSerializer):
         fields = ['name']
 
 
+class CategorySerializer(serializers.ModelSerializer):
+    class Meta:
+        fields = [
+          'id',
+          'created',
+          'updated',
+          'name',
+          'description',
+          'is_in_exodus',
+        ]
+
+
+class CapabilitySerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        model = Capability
+
+
+class AdvertisingSerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        model = Advertising
+
+
+class AnalyticSerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        model = Analytic
+
+
+class NetworkSerializer(CategorySerializer):
+    class Meta(CategorySerializer.Meta):
+        model = Network
+
+
 class TrackerSerializer(serializers.ModelSerializer):
     category = TrackerCategorySerializer(read_only=True, many=True)
+    capability = CapabilitySerializer(read_only=True, many=True)
+    advertising = AdvertisingSerializer(read_only=True, many=True)
+    analytic = AnalyticSerializer(read_only=True, many=True)
+    network = NetworkSerializer(read_only=True, many=True)
     documentation = serializers.ListField(source='documentation_list')
 
     class Meta:
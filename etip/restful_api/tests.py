@@ -1,9 +1,11 @@
 from datetime import date
 
+from django.core.cache import cache
 from rest_framework import status
 from rest_framework.test import APITestCase
 
 from trackers.models import Advertising, Tracker, TrackerCategory
+from trackers.testing import QueryBudgetMixin
 
 
 class RestfulApiGetAllTrackersTests(APITestCase):
@@ -11,6 +13,10 @@ class RestfulApiGetAllTrackersTests(APITestCase):
     TRACKERS_PATH = '/api/trackers/'
     TIME_FORMAT = '%Y-%m-%dT%H:%M:%S.%fZ'  # ISO8601
 
+    def setUp(self):
+        # Cached results outlive the rolled back data of previous tests
+        cache.clear()
+
     def test_get_empty_when_no_tracker(self):
         response = self.client.get(self.TRACKERS_PATH)
 
@@ -174,3 +180,85 @@ class RestfulApiGetAllTrackersTests(APITestCase):
 
         self.assertEqual(response.status_code,
                          status.HTTP_405_METHOD_NOT_ALLOWED)
+
+
+class RestfulApiTrackersByApiKeyIdTests(APITestCase):
+
+    PATH = '/api/trackers/api-key-ids/'
+
+    def test_get_trackers_by_api_key_ids(self):
+        tracker1 = Tracker.objects.create(
+            name='tracker1', api_key_ids='ga_trackingId com.t1.key')
+        tracker2 = Tracker.objects.create(
+            name='tracker2', api_key_ids='com.t1.key,com.t2.key')
+
+        response = self.client.get(
+            self.PATH, {'key_id': ['com.t1.key,ga_trackingId', 'unknown']})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), {
+            'com.t1.key': [
+                {'id': str(tracker1.id), 'name': 'tracker1'},
+                {'id': str(tracker2.id), 'name': 'tracker2'},
+            ],
+            'ga_trackingId': [{'id': str(tracker1.id), 'name': 'tracker1'}],
+            'unknown': [],
+        })
+
+    def test_get_follows_api_key_ids_updates(self):
+        tracker = Tracker.objects.create(
+            name='tracker1', api_key_ids='old_key')
+        tracker = Tracker.objects.get(pk=tracker.pk)
+        tracker.api_key_ids = 'new_key'
+        tracker.save()
+
+        response = self.client.get(
+            self.PATH, {'key_id': ['old_key', 'new_key']})
+
+        self.assertEqual(response.json(), {
+            'old_key': [],
+            'new_key': [{'id': str(tracker.id), 'name': 'tracker1'}],
+        })
+
+
+class RestfulApiTrackersLookupTests(APITestCase):
+
+    PATH = '/api/trackers/lookup/'
+
+    def test_get_trackers_matching_value(self):
+        tracker = Tracker.objects.create(
+            name='tracker1',
+            code_signature='com.tracker1.',
+            network_signature='tracker1\\.com'
+        )
+        Tracker.objects.create(name='tracker2', code_signature='com.tracker2.')
+
+        response = self.client.get(self.PATH, {'value': 'api.tracker1.com'})
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [{
+            'id': str(tracker.id),
+            'name': 'tracker1',
+            'signatures': ['network'],
+        }])
+
+    def test_get_empty_without_value(self):
+        response = self.client.get(self.PATH)
+
+        self.assertEqual(response.status_code, status.HTTP_200_OK)
+        self.assertEqual(response.json(), [])
+
+
+class RestfulApiQueryBudgetTests(QueryBudgetMixin, APITestCase):
+
+    def budgets(self, tracker):
+        key_ids = Tracker.objects.exclude(api_key_ids='').values_list(
+            'api_key_ids', flat=True)
+        return [
+            ('trackers', 'get', '/api/trackers/', {}, False, 6),
+            ('tracker', 'get', f'/api/trackers/{tracker.pk}/', {}, False, 6),
+            ('api_key_ids', 'get', '/api/trackers/api-key-ids/',
+             {'key_id': ','.join(key_ids)}, False, 1),
+            ('lookup', 'get', '/api/trackers/lookup/',
+             {'value': tracker.code_signature.split('|')[0]}, False, 1),
+        ]
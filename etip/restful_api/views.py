@@ -1,15 +1,63 @@
+from django.utils.decorators import method_decorator
+from etip.replicas import read_from_replica
 from rest_framework import viewsets
-from rest_framework.decorators import authentication_classes, permission_classes
+from rest_framework.decorators import action, authentication_classes, permission_classes
+from rest_framework.response import Response
 
 from restful_api.serializers import TrackerSerializer
-from trackers.models import Tracker
+from trackers import matcher, versions
+from trackers.models import Tracker, TrackerApiKeyId
 
 
 @authentication_classes(())
 @permission_classes(())
+@method_decorator(read_from_replica, name='dispatch')
 class TrackerViewSet(viewsets.ReadOnlyModelViewSet):
     """
     API endpoint that allows trackers to be viewed or edited.
     """
-    queryset = Tracker.objects.all().order_by('name')
+    queryset = Tracker.objects.all().order_by('name').prefetch_related(
+        *Tracker.CATEGORY_FIELDS)
     serializer_class = TrackerSerializer
+
+    def list(self, request, *args, **kwargs):
+        # Every client gets the same list, serialized once per catalogue
+        # version
+        return Response(versions.cached('api:trackers', self.serialize_list))
+
+    def serialize_list(self):
+        serializer = self.get_serializer(
+            self.filter_queryset(self.get_queryset()), many=True)
+        return list(serializer.data)
+
+    @action(detail=False, url_path='api-key-ids')
+    def api_key_ids(self, request):
+        """
+        Returns the trackers owning each of the requested API key ids.
+        """
+        key_ids = [
+            key_id
+            for value in request.query_params.getlist('key_id')
+            for key_id in value.split(',') if key_id
+        ]
+        results = {key_id: [] for key_id in key_ids}
+        entries = TrackerApiKeyId.objects.filter(
+            key_id__in=key_ids
+        ).order_by('tracker__name').values_list(
+            'key_id', 'tracker_id', 'tracker__name')
+        for key_id, tracker_id, tracker_name in entries:
+            results[key_id].append({'id': tracker_id, 'name': tracker_name})
+        return Response(results)
+
+    @action(detail=False)
+    def lookup(self, request):
+        """
+        Returns the trackers whose signatures match a package name or a
+        hostname.
+        """
+        value = request.query_params.get('value', '').strip()
+        matches = matcher.lookup(value) if value else []
+        return Response([
+            {'id': tracker_id, 'name': name, 'signatures': kinds}
+            for tracker_id, name, kinds in matches
+        ])
@@ -1,14 +1,21 @@
 from django.conf import settings
 from django.contrib.auth.models import User
-from django.test import Client, TestCase
+from django.core.cache import cache
+from django.test import Client, override_settings, TestCase
 from django.urls import reverse
 
+from trackers import jobs
 from trackers.models import Tracker
+from trackers.testing import QueryBudgetMixin
 
 
 class IndexStatsListViewTests(TestCase):
     PATH = reverse('stats:index')
 
+    def setUp(self):
+        # Cached results outlive the rolled back data of previous tests
+        cache.clear()
+
     def _force_authentication(self, c):
         c.user = User.objects.create_user('jane', 'jdoe@mail.com', '@password')
         c.login(username='jane', password='@password')
@@ -110,3 +117,59 @@ class IndexStatsListViewTests(TestCase):
 
         self.assertEqual(response.status_code, 200)
         self.assertEqual(response.json()['trackers']['with_collisions'], 1)
+
+    def test_not_modified_until_trackers_change(self):
+        c = Client()
+        self._force_authentication(c)
+        Tracker.objects.create(
+            name='tracker 1',
+            code_signature='toto.com',
+            network_signature='network.signature',
+            website='https://website1'
+        )
+
+        response = c.get(self.PATH)
+        etag = response['ETag']
+        self.assertIn('private', response['Cache-Control'])
+
+        response = c.get(self.PATH, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+        Tracker.objects.create(
+            name='tracker 2',
+            code_signature='toto2.com',
+            network_signature='network.signature',
+            website='https://website2'
+        )
+        response = c.get(self.PATH, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['trackers']['all'], 2)
+
+    @override_settings(CATALOGUE_JOBS=True)
+    def test_previous_stats_not_validated(self):
+        c = Client()
+        self._force_authentication(c)
+        Tracker.objects.create(name='tracker 1')
+        c.get(self.PATH)
+
+        with self.captureOnCommitCallbacks(execute=True):
+            Tracker.objects.create(name='tracker 2')
+        response = c.get(self.PATH)
+        self.assertEqual(response.json()['trackers']['all'], 1)
+        self.assertNotIn('ETag', response)
+        self.assertEqual(response['Cache-Control'], 'no-store')
+
+        jobs.run_pending('test')
+        response = c.get(self.PATH)
+        self.assertEqual(response.json()['trackers']['all'], 2)
+        etag = response['ETag']
+        response = c.get(self.PATH, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+
+class StatsQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def budgets(self, tracker):
+        return [
+            ('index', 'get', reverse('stats:index'), {}, True, 11),
+        ]
@@ -3,23 +3,42 @@ from datetime import timedelta
 from django.contrib.auth.decorators import login_required
 from django.http import JsonResponse
 from django.utils import timezone
+from etip.replicas import read_from_replica
 
+from trackers import jobs, versions
+from trackers.catalogue import catalogue_condition
+from trackers.matcher import get_matcher
 from trackers.models import Tracker
 
 
+def current_hour(request):
+    # The last week and last month counts move with time
+    return timezone.now().strftime('%Y%m%d%H')
+
+
+@read_from_replica
 @login_required
+@catalogue_condition(current_hour)
 def index(request):
+    return JsonResponse(get_stats(current_hour(request)))
+
+
+def get_stats(hour):
+    return versions.cached(
+        'stats', compute_stats, {'hour': hour}, names=[versions.TRACKERS],
+        job=jobs.STATS)
+
+
+def compute_stats():
     trackers = Tracker.objects.all()
 
     if trackers.count() == 0:
-        return JsonResponse({})
+        return {}
 
     trackers_in_exodus = trackers.filter(is_in_exodus=True)
     trackers_only_in_etip = trackers.filter(is_in_exodus=False)
 
-    trackers_with_collisions = list(
-        t for t in trackers if t.has_any_signature_collision()
-    )
+    trackers_with_collisions = get_matcher().colliding_ids()
 
     last_week = timezone.now() - timedelta(days=7)
     trackers_from_last_week = trackers.filter(created__gte=last_week)
@@ -43,4 +62,4 @@ def index(request):
         }
     }
 
-    return JsonResponse(data)
+    return data
@@ -1,8 +1,12 @@
 from django.contrib import admin
+from django.utils import timezone
 from reversion.admin import VersionAdmin
 
-from trackers.models import Advertising, Analytic, Capability, \
+from trackers import jobs
+from trackers.category_cache import attach_category_ids
+from trackers.models import Advertising, Analytic, Capability, Job, \
     Network, Tracker, TrackerApproval, TrackerCategory
+from trackers.search import search_trackers
 
 
 @admin.register(Tracker)
@@ -16,9 +20,21 @@ class TrackerModelAdmin(VersionAdmin):
         'categories'
     )
     list_filter = ('is_in_exodus',)
+    change_list_template = 'admin/trackers/tracker/change_list.html'
+    actions = ['refresh_catalogue', 'compare_with_exodus']
 
     def categories(self, obj):
-        return ", ".join([c.name for c in obj.category.all()])
+        return ", ".join(obj.category_names())
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search_trackers(queryset, search_term), False
+
+    def get_changelist_instance(self, request):
+        changelist = super().get_changelist_instance(request)
+        attach_category_ids(changelist.result_list, ['category'])
+        return changelist
 
     def get_exclude(self, request, obj=None):
         excluded = super().get_exclude(request, obj) or []
@@ -28,6 +44,35 @@ class TrackerModelAdmin(VersionAdmin):
 
         return excluded
 
+    @admin.action(description='Recompute the collisions, export and stats')
+    def refresh_catalogue(self, request, queryset):
+        for kind in jobs.CATALOGUE_JOBS:
+            jobs.enqueue(kind)
+        self.message_user(request, 'Recomputation enqueued.')
+
+    @admin.action(description='Compare all trackers with εxodus')
+    def compare_with_exodus(self, request, queryset):
+        jobs.enqueue(jobs.EXODUS_COMPARISON)
+        self.message_user(
+            request, 'Comparison enqueued, see its output in the jobs.')
+
+
+@admin.register(Job)
+class JobModelAdmin(admin.ModelAdmin):
+    list_display = (
+        'kind', 'status', 'created', 'finished', 'attempts', 'worker')
+    list_filter = ('status', 'kind')
+    readonly_fields = [field.name for field in Job._meta.fields]
+    actions = ['retry']
+
+    def has_add_permission(self, request):
+        return False
+
+    @admin.action(description='Retry the selected failed jobs')
+    def retry(self, request, queryset):
+        queryset.filter(status=Job.FAILED).update(
+            status=Job.PENDING, run_at=timezone.now(), attempts=0)
+
 
 @admin.register(TrackerApproval)
 class TrackerApprovalModelAdmin(VersionAdmin):
@@ -3,3 +3,6 @@ from django.apps import AppConfig
 
 class TrackersConfig(AppConfig):
     name = 'trackers'
+
+    def ready(self):
+        from trackers import signals  # noqa: F401
@@ -0,0 +1,365 @@
+"""
+Synthetic catalogues and measurements for the benchmark command.
+
+The catalogues are generated with bulk inserts: the indexed tables that
+the signals usually maintain (signature patterns, API key ids, search
+index, rendered descriptions) are filled directly, and the cache
+versions are bumped once at the end.
+"""
+from datetime import timedelta
+import io
+import itertools
+import json
+import random
+import statistics
+import time
+import tracemalloc
+
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from reversion.models import Revision, Version
+
+from trackers import matcher, search, versions
+from trackers.models import Category, SignaturePattern, Tracker, \
+    TrackerApiKeyId, TrackerApproval
+from trackers.rendering import render_markdown
+
+BATCH_SIZE = 500
+REVIEWERS = 20
+WORDS = [
+    'ad', 'ads', 'analytics', 'beacon', 'cloud', 'crash', 'data', 'event',
+    'insight', 'link', 'lytics', 'media', 'metrics', 'mobile', 'push',
+    'report', 'sdk', 'social', 'stats', 'tag', 'track', 'vendor',
+]
+TLDS = ['com', 'io', 'net', 'org', 'co']
+DESCRIPTION = (
+    '**{name}** is a {word} SDK.\n\n'
+    'It collects:\n\n'
+    '* the device identifiers\n'
+    '* the {word} events\n\n'
+    'See [the documentation](https://{host}/docs).\n'
+)
+
+
+def _vendor(rng, i):
+    return f'{rng.choice(WORDS)}{rng.choice(WORDS)}{i}'
+
+
+def _signatures(rng, vendor, shared):
+    """
+    Returns (code, network) signatures shaped like the real ones: package
+    and host alternations, a few of them sharing a prefix with another
+    vendor to create collisions.
+    """
+    tld = rng.choice(TLDS)
+    packages = [f'com.{vendor}.'] + [
+        f'com.{vendor}.{rng.choice(WORDS)}.' for _ in range(rng.randint(0, 2))
+    ]
+    hosts = [f'{vendor}\\.{tld}'] + [
+        f'{rng.choice(WORDS)}\\.{vendor}\\.{tld}'
+        for _ in range(rng.randint(0, 2))
+    ]
+    if shared is not None:
+        packages.append(f'com.{shared}.')
+    return '|'.join(packages), '|'.join(hosts)
+
+
+def generate_catalogue(size, seed=0):
+    """
+    Adds size trackers to the current database, with their categories,
+    approvals and revision history.
+    """
+    rng = random.Random(seed)
+    call_command('import_categories', stdout=io.StringIO())
+    reviewers = list(User.objects.filter(username__startswith='reviewer'))
+    if not reviewers:
+        reviewers = User.objects.bulk_create([
+            User(username=f'reviewer{i}', password='!')
+            for i in range(REVIEWERS)
+        ])
+
+    trackers = []
+    vendors = []
+    start = Tracker.objects.count()
+    for i in range(start, start + size):
+        vendor = _vendor(rng, i)
+        shared = rng.choice(vendors) if vendors and rng.random() < 0.05 \
+            else None
+        vendors.append(vendor)
+        code_signature, network_signature = _signatures(rng, vendor, shared)
+        host = f'{vendor}.{rng.choice(TLDS)}'
+        description = DESCRIPTION.format(
+            name=vendor, word=rng.choice(WORDS), host=host)
+        trackers.append(Tracker(
+            name=vendor.capitalize(),
+            description=description,
+            description_html=render_markdown(description),
+            code_signature=code_signature,
+            network_signature=network_signature,
+            website=f'https://{host}',
+            is_in_exodus=rng.random() < 0.6,
+            api_key_ids=f'{vendor}_key' if rng.random() < 0.2 else '',
+            exodus_matches=rng.choice([None, 0, rng.randint(1, 5000)]),
+            needs_rework=rng.random() < 0.05,
+        ))
+    Tracker.objects.bulk_create(trackers, batch_size=BATCH_SIZE)
+
+    _fill_relations(rng, trackers)
+    _fill_approvals(rng, trackers, reviewers)
+    _fill_history(rng, trackers, reviewers)
+    _fill_indexes(trackers)
+
+    for name in (versions.CATEGORIES, versions.TRACKERS, versions.APPROVALS):
+        versions.bump_version(name)
+
+
+def _fill_relations(rng, trackers):
+    categories = {}
+    for category_id, kind in Category.objects.values_list('id', 'kind'):
+        categories.setdefault(kind, []).append(category_id)
+
+    for field in Tracker.CATEGORY_FIELDS:
+        through, column = Tracker.category_relation(field)
+        kind = Tracker._meta.get_field(field).related_model.KIND
+        choices = categories.get(kind, [])
+        rows = [
+            through(tracker_id=tracker.pk, **{column: category_id})
+            for tracker in trackers
+            for category_id in rng.sample(
+                choices, rng.randint(0, min(2, len(choices))))
+        ]
+        through.objects.bulk_create(rows, batch_size=BATCH_SIZE)
+
+
+def _fill_approvals(rng, trackers, reviewers):
+    approvals = [
+        TrackerApproval(tracker=tracker, approver=approver)
+        for tracker in trackers
+        for approver in rng.sample(reviewers, rng.choice([0, 0, 1, 2, 3]))
+    ]
+    TrackerApproval.objects.bulk_create(approvals, batch_size=BATCH_SIZE)
+
+
+def _fill_history(rng, trackers, reviewers):
+    content_type = ContentType.objects.get_for_model(Tracker)
+    now = timezone.now()
+    revisions = []
+    owners = []
+    for tracker in trackers:
+        for i in range(rng.randint(1, 3)):
+            revisions.append(Revision(
+                date_created=now - timedelta(days=rng.randint(0, 900)),
+                user=rng.choice(reviewers),
+                comment='Added.' if i == 0 else 'Changed description.',
+            ))
+            owners.append(tracker)
+    revisions = Revision.objects.bulk_create(revisions, batch_size=BATCH_SIZE)
+    Version.objects.bulk_create([
+        Version(
+            revision=revision,
+            object_id=str(tracker.pk),
+            content_type=content_type,
+            db='default',
+            format='json',
+            serialized_data=json.dumps([{
+                'model': 'trackers.tracker',
+                'pk': str(tracker.pk),
+                'fields': {'name': tracker.name},
+            }]),
+            object_repr=tracker.name,
+        )
+        for revision, tracker in zip(revisions, owners)
+    ], batch_size=BATCH_SIZE)
+
+
+def _fill_indexes(trackers):
+    SignaturePattern.objects.bulk_create([
+        pattern
+        for tracker in trackers
+        for kind, _ in SignaturePattern.SIGNATURE_FIELDS
+        for pattern in SignaturePattern.from_signature(tracker, kind)
+    ], batch_size=BATCH_SIZE)
+    TrackerApiKeyId.objects.bulk_create([
+        TrackerApiKeyId(tracker=tracker, key_id=key_id)
+        for tracker in trackers
+        for key_id in tracker.api_key_id_list()
+    ], batch_size=BATCH_SIZE)
+    search.rebuild_search_index()
+
+
+def endpoints():
+    """
+    Returns the (name, path, params, authenticated) of the measured requests.
+    """
+    tracker = Tracker.objects.filter(
+        pk__in=SignaturePattern.objects.filter(
+            kind=SignaturePattern.CODE).values('tracker')
+    ).order_by('name').first()
+    word = WORDS[0]
+
+    requests = []
+    for trackers_select, approve_select, only_collisions in itertools.product(
+            ['', 'exodus', 'etip'],
+            ['', 'no_approvals', 'need_review', 'approved'],
+            [False, True]):
+        params = {}
+        if trackers_select:
+            params['trackers_select'] = trackers_select
+        if approve_select:
+            params['approve_select'] = approve_select
+        if only_collisions:
+            params['only_collisions'] = 'on'
+        name = 'index?' + '&'.join(f'{k}={v}' for k, v in params.items())
+        requests.append((name, '/trackers/all', params, False))
+
+    requests += [
+        ('index?tracker_name', '/trackers/all', {'tracker_name': 'A'}, False),
+        ('index?q', '/trackers/all', {'q': word}, False),
+        ('index?cursor=last', '/trackers/all', {'cursor': 'last'}, False),
+        ('index?page=50', '/trackers/all', {'page': 50}, False),
+        ('review', '/trackers/review', {}, False),
+        ('approved', '/trackers/approved', {}, False),
+        ('export_tracker_list', '/trackers/export', {}, False),
+        ('stats', '/stats/', {}, True),
+        ('api_trackers', '/api/trackers/', {}, False),
+    ]
+    if tracker is not None:
+        path = f'/trackers/{tracker.pk}/'
+        requests += [
+            ('display_tracker', path, {}, False),
+            ('display_tracker:collisions', f'{path}collisions/', {}, False),
+            ('display_tracker:approvals', f'{path}approvals/', {}, False),
+            ('display_tracker:history', f'{path}history/', {}, False),
+            ('display_tracker:description', f'{path}description/', {}, False),
+        ]
+    return requests
+
+
+def _request(client, path, params):
+    with CaptureQueriesContext(connection) as queries:
+        start = time.perf_counter()
+        response = client.get(path, params)
+        elapsed = time.perf_counter() - start
+    if response.status_code != 200:
+        raise RuntimeError(f'{path} answered {response.status_code}')
+    return elapsed, len(queries)
+
+
+def compute_collisions():
+    """
+    Computes the signature collisions of the catalogue, which the cache
+    clears of the measurements keep, and returns the time it took.
+    """
+    start = time.perf_counter()
+    shared_matcher = matcher.get_matcher()
+    for kind, _ in matcher.SIGNATURE_FIELDS:
+        shared_matcher.collisions(kind)
+    return time.perf_counter() - start
+
+
+def clear_cache():
+    """
+    Empties the cache, except for the catalogue versions and the signature
+    collisions computed for them, which depend on the catalogue only:
+    recomputing them before every cold request would measure them once per
+    endpoint instead of the endpoints.
+    """
+    trackers_version = versions.get_version(versions.TRACKERS)
+    tokens = versions.get_tokens()
+    kept = cache.get_many([
+        matcher.collisions_key(trackers_version, kind)
+        for kind, _ in matcher.SIGNATURE_FIELDS
+    ])
+    cache.clear()
+    versions.set_tokens(tokens)
+    cache.set_many(kept)
+
+
+def measure(path, params, client, repeat):
+    """
+    Returns the cold (results not cached) and warm timings, the query
+    counts and the peak memory allocated by a request.
+    """
+    clear_cache()
+    cold_time, cold_queries = _request(client, path, params)
+
+    times = []
+    warm_queries = 0
+    for _ in range(repeat):
+        elapsed, warm_queries = _request(client, path, params)
+        times.append(elapsed)
+
+    clear_cache()
+    tracemalloc.start()
+    _request(client, path, params)
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return {
+        'cold_seconds': round(cold_time, 6),
+        'cold_queries': cold_queries,
+        'warm_seconds': round(statistics.median(times), 6),
+        'warm_queries': warm_queries,
+        'peak_memory_bytes': peak,
+    }
+
+
+class StatementRecorder:
+    def __init__(self):
+        self.statements = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        # Database execute wrapper keeping the distinct SELECT statements
+        if not many and sql.lstrip().upper().startswith('SELECT'):
+            self.statements.setdefault(sql, params)
+        return execute(sql, params, many, context)
+
+
+def explain(path, params, client):
+    """
+    Returns the query plans of the distinct SELECT statements of a
+    request on a cleared cache, explained with their actual parameters.
+    """
+    clear_cache()
+    recorder = StatementRecorder()
+    with connection.execute_wrapper(recorder):
+        client.get(path, params)
+
+    prefix = connection.ops.explain_query_prefix()
+    plans = []
+    with connection.cursor() as cursor:
+        for sql, sql_params in recorder.statements.items():
+            cursor.execute(f'{prefix} {sql}', sql_params)
+            plans.append({
+                'sql': sql,
+                'plan': [
+                    ' '.join(str(column) for column in row)
+                    for row in cursor.fetchall()
+                ],
+            })
+    return plans
+
+
+def run(repeat=3, plans=False):
+    """
+    Measures every endpoint on the catalogue of the current database, with
+    the query plans of their statements if plans is set.
+    """
+    anonymous = Client()
+    authenticated = Client()
+    authenticated.force_login(User.objects.create_superuser(
+        'benchmark', password=None))
+
+    results = {}
+    for name, path, params, needs_login in endpoints():
+        client = authenticated if needs_login else anonymous
+        results[name] = measure(path, params, client, repeat)
+        if plans:
+            results[name]['plans'] = explain(path, params, client)
+    return results
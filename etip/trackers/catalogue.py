@@ -0,0 +1,100 @@
+"""
+Global version of the tracker catalogue, for conditional GET.
+
+The version is read with a single query of cheap aggregates (the last
+update of trackers and categories, the last approval, and the number of
+trackers, approvals and categories), combined with the cache versions
+bumped by the signals, which also cover the category relations. The
+HTML pages and the stats endpoint answer 304 while it is unchanged.
+
+A response built from a previous result, served while its job computes
+the current one, is neither stored nor validated: under the ETag of the
+current version, it would be revalidated after the job ran.
+
+The responses have no Last-Modified header: deletions, revoked approvals
+and relation changes leave the modification times of the remaining rows
+unchanged, so only the ETag tells that the catalogue changed.
+"""
+from functools import wraps
+import hashlib
+
+from django.conf import settings
+from django.db import connection
+from django.utils.cache import patch_cache_control, patch_vary_headers
+from django.views.decorators.http import condition
+
+from trackers import versions
+
+# Seconds a shared cache may serve anonymous pages without revalidation
+DEFAULT_MAX_AGE = 60
+
+
+def _fingerprint():
+    from trackers.models import Category, Tracker, TrackerApproval
+
+    trackers = Tracker._meta.db_table
+    approvals = TrackerApproval._meta.db_table
+    categories = Category._meta.db_table
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f"SELECT (SELECT MAX(updated) FROM {trackers}), "
+            f"(SELECT COUNT(*) FROM {trackers}), "
+            f"(SELECT COUNT(*) FROM {approvals}), "
+            f"(SELECT MAX(created) FROM {approvals}), "
+            f"(SELECT MAX(updated) FROM {categories}), "
+            f"(SELECT COUNT(*) FROM {categories})"
+        )
+        return cursor.fetchone()
+
+
+def catalogue_version(request):
+    """
+    Returns the version of the catalogue, computed once per request.
+    """
+    if not hasattr(request, '_catalogue_version'):
+        tokens = [str(value) for value in _fingerprint()] + [
+            versions.get_version(versions.CATALOGUE)
+        ]
+        request._catalogue_version = hashlib.sha1(
+            ':'.join(tokens).encode()).hexdigest()
+    return request._catalogue_version
+
+
+def _user_key(request):
+    user = request.user
+    return f'{user.pk}:{user.is_superuser}' if user.is_authenticated else '-'
+
+
+def catalogue_condition(*extra_keys):
+    """
+    Decorates a GET view whose response only depends on the catalogue,
+    the user and the request URL, and on the values returned by the
+    extra_keys functions of the request.
+    """
+    def etag(request, *args, **kwargs):
+        parts = [catalogue_version(request), _user_key(request)]
+        parts += [str(key(request)) for key in extra_keys]
+        return hashlib.sha1(':'.join(parts).encode()).hexdigest()
+
+    def decorator(view):
+        conditional_view = condition(etag_func=etag)(view)
+
+        @wraps(view)
+        def wrapper(request, *args, **kwargs):
+            with versions.watch_previous_results() as previous:
+                response = conditional_view(request, *args, **kwargs)
+            if previous.served:
+                del response['ETag']
+                response['Cache-Control'] = 'no-store'
+            elif request.user.is_authenticated:
+                patch_cache_control(response, private=True, no_cache=True)
+            else:
+                max_age = getattr(
+                    settings, 'CATALOGUE_CACHE_MAX_AGE', DEFAULT_MAX_AGE)
+                patch_cache_control(
+                    response, public=True, max_age=0, s_maxage=max_age)
+            patch_vary_headers(response, ['Cookie'])
+            return response
+
+        return wrapper
+    return decorator
@@ -0,0 +1,85 @@
+"""
+Process-wide cache of the category names.
+
+Categories are a tiny, rarely edited table: they are loaded once per
+process and reloaded whenever the categories version is bumped. Trackers
+only need to read their many-to-many rows to resolve their categories.
+"""
+from etip.replicas import read_from_primary
+
+from trackers import versions
+
+
+class CategoryCache:
+    def __init__(self):
+        self.version = None
+        self.categories = {}
+
+    def load(self, version):
+        from trackers.models import Category
+
+        rows = Category.objects.order_by('name', 'pk').values_list(
+            'pk', 'name', 'kind')
+        self.categories = {
+            pk: (rank, name, kind)
+            for rank, (pk, name, kind) in enumerate(rows)
+        }
+        self.version = version
+
+    def get(self, ids):
+        version = versions.get_version(versions.CATEGORIES)
+        if version != self.version or \
+                any(pk not in self.categories for pk in ids):
+            with read_from_primary():
+                self.load(version)
+        return [self.categories[pk] for pk in ids if pk in self.categories]
+
+
+_cache = CategoryCache()
+
+
+def category_names(ids):
+    """
+    Returns the names of the given categories, sorted like the database.
+    """
+    return [name for _, name, _ in sorted(_cache.get(ids))]
+
+
+def categories_of_kind(kind):
+    """
+    Returns the (id, name) of the categories of the given kind, sorted
+    like the database.
+    """
+    _cache.get([])
+    return [
+        (pk, name)
+        for pk, (_, name, category_kind) in sorted(
+            _cache.categories.items(), key=lambda item: item[1])
+        if category_kind == kind
+    ]
+
+
+def attach_category_ids(trackers, fields):
+    """
+    Fetches the category ids of the given relations for all trackers at
+    once, with one query on each relation table.
+    """
+    from trackers.models import Tracker
+
+    trackers = list(trackers)
+    if not trackers:
+        return trackers
+
+    for field in fields:
+        through, column = Tracker.category_relation(field)
+        ids = {tracker.pk: [] for tracker in trackers}
+        rows = through.objects.filter(
+            tracker_id__in=ids).values_list('tracker_id', column)
+        for tracker_id, category_id in rows:
+            ids[tracker_id].append(category_id)
+        for tracker in trackers:
+            if not hasattr(tracker, '_category_ids'):
+                tracker._category_ids = {}
+            tracker._category_ids[field] = ids[tracker.pk]
+
+    return trackers
@@ -0,0 +1,99 @@
+"""
+Facet counts of the tracker list.
+
+All the facets are conditional aggregates of a single query on top of
+the filtered list queryset, cached per filters until a tracker, an
+approval or a category changes.
+"""
+from django.conf import settings
+from django.db.models import Case, Count, Exists, IntegerField, OuterRef, \
+    Q, Value, When
+
+from trackers import versions
+from trackers.category_cache import categories_of_kind
+
+# Same order and rules as Tracker.status()
+STATUSES = [
+    ('in_exodus', 'In εxodus', Q(is_in_exodus=True)),
+    ('needs_rework', 'Needs rework', Q(needs_rework=True)),
+    ('missing_signature', 'Missing signature', Q(code_signature='')),
+    ('not_analyzed', 'Not analyzed', Q(exodus_matches__isnull=True)),
+    ('unmatched', 'Unmatched in εxodus', Q(exodus_matches=0)),
+    ('waiting', 'Waiting for review', Q(approvals_count__lt=2)),
+    ('approved', 'Approved', Q()),
+]
+
+APPROVALS = [
+    ('no_approvals', 'No approvals', Q(approvals_count=0)),
+    ('need_review', 'Need 2nd review', Q(approvals_count=1)),
+    ('approved', 'Approved', Q(approvals_count__gte=2)),
+]
+
+
+def status_expression():
+    return Case(
+        *(
+            When(condition, then=Value(i))
+            for i, (_, _, condition) in enumerate(STATUSES[:-1])
+        ),
+        default=Value(len(STATUSES) - 1),
+        output_field=IntegerField(),
+    )
+
+
+def compute_facets(trackers):
+    """
+    Returns the facet counts of the trackers queryset, which must be
+    annotated with approvals_count.
+    """
+    from trackers.models import Category, Tracker
+
+    through, column = Tracker.category_relation('category')
+    categories = categories_of_kind(Category.TRACKER)
+
+    aggregates = {
+        'exodus': Count('pk', filter=Q(is_in_exodus=True)),
+        'etip': Count('pk', filter=Q(is_in_exodus=False)),
+        'rework': Count('pk', filter=Q(needs_rework=True)),
+    }
+    for key, _, condition in APPROVALS:
+        aggregates[f'approvals_{key}'] = Count('pk', filter=condition)
+    for i, (key, _, _) in enumerate(STATUSES):
+        aggregates[f'status_{key}'] = Count('pk', filter=Q(facet_status=i))
+    # Row-level flags, as the aggregation may run on a subquery of them
+    flags = {'facet_status': status_expression()}
+    for pk, _ in categories:
+        flags[f'facet_category_{pk}'] = Exists(through.objects.filter(
+            tracker_id=OuterRef('pk'), **{column: pk}))
+        aggregates[f'category_{pk}'] = Count(
+            'pk', filter=Q(**{f'facet_category_{pk}': True}))
+
+    counts = trackers.order_by().annotate(**flags).aggregate(**aggregates)
+
+    return {
+        'exodus': counts['exodus'],
+        'etip': counts['etip'],
+        'needs_rework': counts['rework'],
+        'approvals': {
+            key: counts[f'approvals_{key}'] for key, _, _ in APPROVALS
+        },
+        'statuses': [
+            (label, counts[f'status_{key}']) for key, label, _ in STATUSES
+        ],
+        'categories': [
+            (name, counts[f'category_{pk}']) for pk, name in categories
+        ],
+    }
+
+
+def get_facets(trackers, filters):
+    """
+    Returns the facet counts of the trackers queryset, cached per filters.
+    """
+    if not getattr(settings, 'TRACKER_LIST_CACHE_COUNTS', True):
+        return compute_facets(trackers)
+
+    return versions.cached(
+        'trackers:facets', lambda: compute_facets(trackers), filters,
+        names=[versions.TRACKERS, versions.APPROVALS, versions.CATEGORIES]
+    )
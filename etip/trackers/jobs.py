@@ -0,0 +1,217 @@
+"""
+Background jobs stored in the database and run by the `run_worker`
+command, outside of the requests.
+
+When CATALOGUE_JOBS is set, a change of the catalogue enqueues the
+recomputation of the signature collisions (and snapshot), the export and
+the stats, once the transaction is committed, so that the results are
+cached before the next request needs them; until then, the requests get
+the previous results. A pending job of a kind is never enqueued twice.
+The admin also enqueues the comparison with εxodus.
+
+The jobs and the requests must share the cache, see etip/caches.py.
+
+Workers claim a job with `SELECT ... FOR UPDATE SKIP LOCKED` when the
+database supports it. Otherwise (SQLite), they claim it with an update
+conditioned on its status, which a single worker can win. A failed job
+is retried MAX_ATTEMPTS times, and a job whose worker died is claimed
+again after STALE_SECONDS.
+"""
+from datetime import timedelta
+import io
+import logging
+import traceback
+
+from django.conf import settings
+from django.core.management import call_command
+from django.db import connection, IntegrityError, transaction
+from django.db.models import F, Q
+from django.utils import timezone
+
+from trackers import versions
+from trackers.models import Job
+
+logger = logging.getLogger(__name__)
+
+SIGNATURES = 'signatures'
+EXPORT = 'export'
+STATS = 'stats'
+EXODUS_COMPARISON = 'compare_with_exodus'
+# Jobs enqueued when a tracker changes
+CATALOGUE_JOBS = (SIGNATURES, EXPORT, STATS)
+
+MAX_ATTEMPTS = 3
+RETRY_DELAY = 60
+STALE_SECONDS = 3600
+# Days the finished jobs are kept
+RETENTION_DAYS = 7
+# Jobs tried at once when claiming without row locks
+CLAIM_BATCH = 5
+
+HANDLERS = {}
+
+
+def handler(kind):
+    """
+    Registers the decorated function as the handler of a kind of jobs.
+    It returns the output of the job, if any.
+    """
+    def register(function):
+        HANDLERS[kind] = function
+        return function
+    return register
+
+
+@handler(SIGNATURES)
+def refresh_signatures():
+    from trackers import matcher
+
+    # Also rebuilds the snapshot, when SIGNATURE_SNAPSHOT_PATH is set
+    shared_matcher = matcher.get_matcher()
+    for kind, _ in matcher.SIGNATURE_FIELDS:
+        shared_matcher.collisions(kind)
+    return f'{len(shared_matcher.colliding_ids())} trackers with collisions'
+
+
+@handler(EXPORT)
+def refresh_export():
+    from trackers.views import get_export
+
+    return f'{len(get_export())} bytes exported'
+
+
+@handler(STATS)
+def refresh_stats():
+    from stats.views import current_hour, get_stats
+
+    get_stats(current_hour(None))
+
+
+@handler(EXODUS_COMPARISON)
+def compare_with_exodus():
+    output = io.StringIO()
+    call_command('compare_with_exodus', quiet=True, stdout=output)
+    return output.getvalue()
+
+
+def enqueue(kind, run_at=None):
+    """
+    Enqueues a job, unless one of the same kind is already pending.
+    """
+    while True:
+        pending = Job.objects.filter(kind=kind, status=Job.PENDING).first()
+        if pending is not None:
+            return pending
+        try:
+            with transaction.atomic():
+                return Job.objects.create(
+                    kind=kind, run_at=run_at or timezone.now())
+        except IntegrityError:
+            # Enqueued concurrently, and maybe claimed since
+            continue
+
+
+def enqueue_on_commit(*kinds):
+    """
+    Enqueues the jobs once the current transaction is committed, when
+    CATALOGUE_JOBS is set.
+    """
+    if not getattr(settings, 'CATALOGUE_JOBS', False):
+        return
+    for kind in kinds:
+        transaction.on_commit(lambda kind=kind: enqueue(kind))
+
+
+def _ready(now):
+    return Job.objects.filter(
+        Q(status=Job.PENDING, run_at__lte=now)
+        | Q(status=Job.RUNNING,
+            started__lt=now - timedelta(seconds=STALE_SECONDS))
+    ).order_by('run_at', 'pk')
+
+
+def claim(worker):
+    """
+    Returns the next ready job, marked as running by the worker, or None.
+    """
+    now = timezone.now()
+    running = {
+        'status': Job.RUNNING, 'started': now, 'worker': worker,
+        'attempts': F('attempts') + 1,
+    }
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            job = _ready(now).select_for_update(skip_locked=True).first()
+            if job is None:
+                return None
+            Job.objects.filter(pk=job.pk).update(**running)
+    else:
+        for job in _ready(now)[:CLAIM_BATCH]:
+            claimed = Job.objects.filter(
+                pk=job.pk, status=job.status, started=job.started
+            ).update(**running)
+            if claimed:
+                break
+        else:
+            return None
+    job.refresh_from_db()
+    return job
+
+
+def run(job):
+    """
+    Runs a claimed job and records its result.
+    """
+    try:
+        with versions.fresh_results():
+            output = HANDLERS[job.kind]()
+    except Exception:
+        logger.exception('Job %s %s failed', job.pk, job.kind)
+        job.error = traceback.format_exc()
+        if job.attempts < MAX_ATTEMPTS:
+            job.status = Job.PENDING
+            job.run_at = timezone.now() + timedelta(
+                seconds=RETRY_DELAY * job.attempts)
+        else:
+            job.status = Job.FAILED
+    else:
+        job.status = Job.DONE
+        job.output = output or ''
+        job.error = ''
+    job.finished = timezone.now()
+    fields = ['status', 'run_at', 'finished', 'output', 'error']
+    try:
+        with transaction.atomic():
+            job.save(update_fields=fields)
+    except IntegrityError:
+        # A job of the same kind was enqueued meanwhile, which replaces the
+        # retry
+        job.status = Job.FAILED
+        job.save(update_fields=fields)
+    return job
+
+
+def run_pending(worker, limit=None):
+    """
+    Runs the ready jobs, at most limit of them, and returns their number.
+    """
+    count = 0
+    while limit is None or count < limit:
+        job = claim(worker)
+        if job is None:
+            break
+        run(job)
+        count += 1
+    return count
+
+
+def purge():
+    """
+    Deletes the jobs finished for more than RETENTION_DAYS.
+    """
+    deleted, _ = Job.objects.filter(
+        status__in=[Job.DONE, Job.FAILED],
+        finished__lt=timezone.now() - timedelta(days=RETENTION_DAYS),
+    ).delete()
+    return deleted
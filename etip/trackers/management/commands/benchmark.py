@@ -0,0 +1,113 @@
+import json
+import platform
+import time
+
+import django
+from django.core.management import call_command
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings, \
+    setup_test_environment, teardown_test_environment
+
+from trackers import benchmark
+
+DEFAULT_SIZES = [1000, 10000, 50000]
+
+
+class Command(BaseCommand):
+    help = 'Benchmark the main endpoints on synthetic catalogues'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-s',
+            '--sizes',
+            type=int,
+            nargs='+',
+            default=DEFAULT_SIZES,
+            help='Number of trackers of each generated catalogue.' +
+            f" Default is {' '.join(str(s) for s in DEFAULT_SIZES)}.",
+        )
+        parser.add_argument(
+            '-r',
+            '--repeat',
+            type=int,
+            default=3,
+            help='Number of warm requests timed for each endpoint.',
+        )
+        parser.add_argument(
+            '--seed',
+            type=int,
+            default=0,
+            help='Seed of the generated catalogues.',
+        )
+        parser.add_argument(
+            '--explain',
+            action='store_true',
+            help='Add the query plans of the statements of every endpoint.',
+        )
+        parser.add_argument(
+            '--migration',
+            type=str,
+            help='Migration of the trackers app to benchmark, to compare '
+            'with the schema of an older release. Default is the latest.',
+        )
+        parser.add_argument(
+            '-o',
+            '--output',
+            type=str,
+            help='Path of the JSON report. Default is the standard output.',
+        )
+
+    def handle(self, *args, **options):
+        if options['repeat'] < 1:
+            raise CommandError('--repeat must be at least 1')
+
+        report = {
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'database': connection.vendor,
+            },
+            'catalogues': {},
+        }
+
+        # Never touch the configured database: work on a test database
+        setup_test_environment()
+        # A single process: the versions must not expire in the middle of
+        # the measurements of a catalogue, forcing its recomputations
+        versions_setting = override_settings(CATALOGUE_VERSION_TIMEOUT=None)
+        versions_setting.enable()
+        old_name = connection.settings_dict['NAME']
+        connection.creation.create_test_db(
+            verbosity=0, autoclobber=True, serialize=False)
+        try:
+            if options['migration']:
+                call_command(
+                    'migrate', 'trackers', options['migration'], verbosity=0)
+            for size in options['sizes']:
+                call_command('flush', interactive=False, verbosity=0)
+                start = time.perf_counter()
+                benchmark.generate_catalogue(size, seed=options['seed'])
+                generation = time.perf_counter() - start
+                if options['verbosity'] >= 2:
+                    self.stderr.write(
+                        f'{size} trackers generated in {generation:.1f}s')
+
+                report['catalogues'][str(size)] = {
+                    'generation_seconds': round(generation, 3),
+                    'collisions_seconds': round(
+                        benchmark.compute_collisions(), 3),
+                    'endpoints': benchmark.run(
+                        repeat=options['repeat'], plans=options['explain']),
+                }
+        finally:
+            connection.creation.destroy_test_db(old_name, verbosity=0)
+            teardown_test_environment()
+            versions_setting.disable()
+
+        output = json.dumps(report, indent=2)
+        if options['output']:
+            with open(options['output'], 'w') as file:
+                file.write(output + '\n')
+        else:
+            self.stdout.write(output)
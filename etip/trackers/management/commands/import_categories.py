@@ -1,107 +1,113 @@
-from django.core.management.base import BaseCommand
+import json
+from pathlib import Path
 
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from trackers import versions
 from trackers.models import \
     Advertising, Analytic, Capability, Network, TrackerCategory
 
+DATA_FILE = Path(__file__).resolve().parents[2] / 'data' / 'categories.json'
+SUPPORTED_VERSIONS = [1]
+
+# (key in the data file, model, label used in logs)
+CATEGORY_MODELS = [
+    ('capability', Capability, 'Capability'),
+    ('advertising', Advertising, 'Advertising'),
+    ('analytic', Analytic, 'Analytic'),
+    ('network', Network, 'Network'),
+    ('tracker', TrackerCategory, 'Tracker'),
+]
+
+
+def load_categories(filename):
+    try:
+        with open(filename, 'r') as file:
+            data = json.load(file)
+    except (OSError, ValueError) as e:
+        raise CommandError(f'Unable to read {filename}: {e}')
+
+    if data.get('version') not in SUPPORTED_VERSIONS:
+        raise CommandError(
+            f"Unsupported categories file version: {data.get('version')}")
+
+    return data
+
 
 class Command(BaseCommand):
     help = 'Import trackers categories'
 
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '-f',
+            '--file',
+            type=str,
+            default=str(DATA_FILE),
+            help='Path to the JSON categories file.' +
+            ' Default is the file shipped with the application.',
+        )
+
     def handle(self, *args, **options):
-        capability_names = [
-            'Tracks users using bluetooth',
-            'Tracks users using ultrasonic',
-            'Tracks users using location data',
-            'Tracks users using GPS',
-            'Tracks users using WiFi',
-            'Tracks users using NFC',
-            'Targets user location and proximity via geofencing',
-            'Targets users via geotargeting',
-        ]
+        self.verbosity = options['verbosity']
+        data = load_categories(options['file'])
 
-        existing_capabilities = Capability.objects.all()
-        for name in capability_names:
-            if not existing_capabilities.filter(name=name):
-                m = Capability(name=name)
-                m.save()
-        self.stdout.write('Capability categories created')
-
-        advertising_names = [
-            'Loads advertisements',
-            'Loads targeted advertisements',
-            'Real-world location targeting',
-            'Targeted advertising based on consumer actions',
-            'Timed advertisements',
-            'Targets across devices, ' +
-            'channels and/or platforms ' +
-            '(omni-channel marketing, customer journey)',
-            'Bidding services',
-            'Location-based ad pushing',
-            'Alters app functionality based upon user profiles',
-        ]
+        with transaction.atomic():
+            for key, model, label in CATEGORY_MODELS:
+                created, renamed, removed = self.sync_model(
+                    model, data.get(key, {}))
+                self.stdout.write(f'{label} categories created')
+                self.log_changes(created, renamed, removed)
 
-        existing_advertising = Advertising.objects.all()
-        for name in advertising_names:
-            if not existing_advertising.filter(name=name):
-                m = Advertising(name=name)
-                m.save()
-        self.stdout.write('Advertising categories created')
-
-        analytic_names = [
-            'Offers analytics activity to app developers',
-            'Offers reports to app developers',
-            'Collects Personally Identifiable Information (PII)',
-            'Collects Sensitive Personal Information (SPI)',
-            'Profiles users via Personally Identifiable Information (PII)',
-            'Profiles users via Sensitive Personal Information (SPI)',
-            'Performs cross-device identification',
-            'Identifies users via Google ID (AAID)',
-            'Identifies users via iOS ID (IDFA)',
-            'Identifies users via network ID (hostname/ISP/SSID)',
-            'Stores facial recognition data',
-            'Stores personal profile data (name, address, phone)',
-            'Analytics AI and machine learning',
-            'Audience segmenting',
-        ]
+        # Bulk operations do not send the signals invalidating the caches
+        versions.bump_version(versions.CATEGORIES)
 
-        existing_analytics = Analytic.objects.all()
-        for name in analytic_names:
-            if not existing_analytics.filter(name=name):
-                m = Analytic(name=name)
-                m.save()
-        self.stdout.write('Analytic categories created')
-
-        network_names = [
-            'Transmits user data to multiple ad networks',
-            'Transmits information to Facebook ad network',
-            'Transmits information to Google ad network',
-            'Transmits information to Adobe ad network',
-            'Transmits information to Yahoo! ad network',
-            'Transmits information to Salesforce platform',
-            'Transmits information to Twitter platform',
-            'Transmits information to Amazon ad network',
-            'Transmits information to Microsoft ad network',
-        ]
+    def sync_model(self, model, definition):
+        """
+        Applies the file definition to the model with a single read query.
+        Returns the names created, renamed and removed.
+        """
+        names = definition.get('names', [])
+        renamed = definition.get('renamed', {})
+        removed = definition.get('removed', [])
 
-        existing_networks = Network.objects.all()
-        for name in network_names:
-            if not existing_networks.filter(name=name):
-                m = Network(name=name)
-                m.save()
-        self.stdout.write('Network categories created')
-
-        category_names = [
-            'Crash reporting',
-            'Analytics',
-            'Profiling',
-            'Identification',
-            'Advertisement',
-            'Location',
+        existing = {c.name: c for c in model.objects.all()}
+
+        to_rename = []
+        for old_name, new_name in renamed.items():
+            category = existing.get(old_name)
+            if category is None or new_name in existing:
+                continue
+            category.name = new_name
+            existing[new_name] = existing.pop(old_name)
+            to_rename.append(category)
+
+        to_remove = [existing[name] for name in removed if name in existing]
+        to_create = [
+            model(name=name, kind=model.KIND) for name in dict.fromkeys(names)
+            if name not in existing
         ]
 
-        existing_categories = TrackerCategory.objects.all()
-        for name in category_names:
-            if not existing_categories.filter(name=name):
-                m = TrackerCategory(name=name)
-                m.save()
-        self.stdout.write('Tracker categories created')
+        if to_rename:
+            model.objects.bulk_update(to_rename, ['name'])
+        if to_remove:
+            model.objects.filter(
+                pk__in=[c.pk for c in to_remove]).delete()
+        if to_create:
+            model.objects.bulk_create(to_create)
+
+        return (
+            [c.name for c in to_create],
+            [c.name for c in to_rename],
+            [c.name for c in to_remove],
+        )
+
+    def log_changes(self, created, renamed, removed):
+        if self.verbosity < 2:
+            return
+        for name in created:
+            self.stdout.write(f'  + {name}')
+        for name in renamed:
+            self.stdout.write(f'  ~ {name}')
+        for name in removed:
+            self.stdout.write(f'  - {name}')
@@ -0,0 +1,34 @@
+from django.core.management.base import BaseCommand
+
+from trackers.models import Tracker
+from trackers.rendering import render_markdown
+
+BATCH_SIZE = 500
+
+
+class Command(BaseCommand):
+    help = 'Render the Markdown descriptions of all trackers'
+
+    def handle(self, *args, **options):
+        trackers = Tracker.objects.only(
+            'id', 'description', 'description_html').order_by('pk')
+
+        batch = []
+        updated = 0
+        for tracker in trackers.iterator(chunk_size=BATCH_SIZE):
+            description_html = render_markdown(tracker.description)
+            if description_html == tracker.description_html:
+                continue
+            tracker.description_html = description_html
+            batch.append(tracker)
+            if len(batch) >= BATCH_SIZE:
+                updated += self.update(batch)
+                batch = []
+        updated += self.update(batch)
+
+        self.stdout.write(f'{updated} tracker descriptions rendered')
+
+    def update(self, batch):
+        # Only the rendered column changes: no signal is needed
+        Tracker.objects.bulk_update(batch, ['description_html'])
+        return len(batch)
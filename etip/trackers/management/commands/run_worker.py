@@ -0,0 +1,60 @@
+import os
+import signal
+import socket
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from trackers import jobs
+
+DEFAULT_POLL_INTERVAL = 2.0
+# Seconds between two purges of the finished jobs
+PURGE_INTERVAL = 3600
+
+
+class Command(BaseCommand):
+    help = 'Run the background jobs enqueued in the database'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--once',
+            action='store_true',
+            help='Run the ready jobs, then exit, for instance from cron.',
+        )
+        parser.add_argument(
+            '--poll-interval',
+            type=float,
+            default=DEFAULT_POLL_INTERVAL,
+            help='Seconds to wait for new jobs when none is ready.' +
+            f' Default is {DEFAULT_POLL_INTERVAL}.',
+        )
+
+    def handle(self, *args, **options):
+        if options['poll_interval'] <= 0:
+            raise CommandError('--poll-interval must be positive')
+
+        worker = f'{socket.gethostname()}:{os.getpid()}'
+        if options['once']:
+            count = jobs.run_pending(worker)
+            jobs.purge()
+            self.stdout.write(f'{count} jobs run')
+            return
+
+        self.stopping = False
+        signal.signal(signal.SIGTERM, self.stop)
+        signal.signal(signal.SIGINT, self.stop)
+        self.stdout.write(f'Worker {worker} started')
+        purged = None
+        while not self.stopping:
+            close_old_connections()
+            if purged is None or time.monotonic() - purged > PURGE_INTERVAL:
+                jobs.purge()
+                purged = time.monotonic()
+            # The current job is always finished before stopping
+            if not jobs.run_pending(worker, limit=1):
+                time.sleep(options['poll_interval'])
+        self.stdout.write(f'Worker {worker} stopped')
+
+    def stop(self, signum, frame):
+        self.stopping = True
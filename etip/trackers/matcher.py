@@ -0,0 +1,302 @@
+"""
+In-memory matcher of tracker signatures.
+
+The matcher compiles every signature pattern once and indexes it by its
+literal prefix, so a lookup only runs the regexes of the few patterns
+whose prefix starts one of the segments of the looked up value. It is
+built lazily and rebuilt when the trackers version is bumped.
+
+With several workers, the index can be shared through a memory-mapped
+snapshot instead (see trackers/snapshot.py). Until a process has the
+matcher of the current version, lookups query the same prefix index in
+the SignaturePattern table.
+
+It also finds the signature collisions of all trackers at once, running
+each signature only against the other signatures of the same kind that
+contain the literal text it requires.
+"""
+from collections import defaultdict
+import re
+
+from django.conf import settings
+from etip.replicas import read_from_primary
+
+from trackers import versions
+from trackers.signatures import candidate_prefixes, literal_fragments, \
+    literal_prefix, split_alternation
+
+CODE = 'code'
+NETWORK = 'network'
+SIGNATURE_FIELDS = (
+    (CODE, 'code_signature'),
+    (NETWORK, 'network_signature'),
+)
+# Same as Tracker.MIN_SIGNATURE_SIZE: shorter signatures never collide
+MIN_SIGNATURE_SIZE = 4
+
+
+def _trigrams(text):
+    return {text[i:i + 3] for i in range(len(text) - 2)}
+
+
+def _candidate_lines(signature, postings, all_lines):
+    """
+    Returns the numbers of the signatures that may contain a match of the
+    signature: those containing every trigram of the literal fragments of
+    one of its branches, or all of them when a branch has no trigram.
+    """
+    candidates = set()
+    for branch in split_alternation(signature):
+        fragments = literal_fragments(branch)
+        trigrams = set()
+        for fragment in fragments or ():
+            trigrams.update(_trigrams(fragment))
+        if not trigrams:
+            return all_lines
+        lines = None
+        for trigram in sorted(trigrams, key=lambda t: len(postings.get(t, ()))):
+            found = postings.get(trigram, set())
+            lines = found if lines is None else lines & found
+            if not lines:
+                break
+        candidates.update(lines)
+    return candidates
+
+
+def find_collisions(signatures):
+    """
+    signatures is a dict of tracker ids to signatures. Returns a dict of
+    the tracker ids whose signature regex is found in other signatures,
+    mapped to the set of those other tracker ids.
+
+    The signatures are indexed by trigram, so that each regex only runs
+    against the signatures containing the literal text it requires.
+    """
+    ids = list(signatures)
+    lines = [signatures[tracker_id] for tracker_id in ids]
+    postings = defaultdict(set)
+    for number, line in enumerate(lines):
+        for trigram in _trigrams(line):
+            postings[trigram].add(number)
+    all_lines = range(len(lines))
+
+    collisions = {}
+    for number, (tracker_id, signature) in enumerate(signatures.items()):
+        if len(signature) <= MIN_SIGNATURE_SIZE:
+            continue
+        candidates = [
+            other
+            for other in _candidate_lines(signature, postings, all_lines)
+            if other != number
+        ]
+        if not candidates:
+            continue
+        try:
+            regex = re.compile(signature)
+        except re.error:
+            continue
+
+        found = {
+            ids[other] for other in candidates if regex.search(lines[other])
+        }
+        if found:
+            collisions[tracker_id] = found
+    return collisions
+
+
+def collisions_key(version, kind):
+    return f'trackers:collisions:{version}:{kind}'
+
+
+class SignatureMatcher:
+    def __init__(self, trackers, version=None):
+        """
+        trackers is an iterable of (id, name, code_signature,
+        network_signature) tuples.
+        """
+        self.version = version
+        self.names = {}
+        self.signatures = {kind: {} for kind, _ in SIGNATURE_FIELDS}
+        self.index = defaultdict(list)
+        self._collisions = {}
+        for tracker_id, name, *signatures in trackers:
+            self.names[tracker_id] = name
+            for (kind, _), signature in zip(SIGNATURE_FIELDS, signatures):
+                self.signatures[kind][tracker_id] = signature
+                for pattern in dict.fromkeys(split_alternation(signature)):
+                    try:
+                        regex = re.compile(pattern)
+                    except re.error:
+                        continue
+                    self.index[(kind, literal_prefix(pattern))].append(
+                        (regex, tracker_id))
+
+    @classmethod
+    def build(cls, version=None):
+        from trackers.models import Tracker
+
+        trackers = Tracker.objects.values_list(
+            'id', 'name', *(field for _, field in SIGNATURE_FIELDS))
+        return cls(trackers, version)
+
+    def name(self, tracker_id):
+        return self.names[tracker_id]
+
+    def lookup(self, value, kinds=(CODE, NETWORK)):
+        """
+        Returns a dict of the trackers matching the value, mapped to the
+        set of signature kinds that matched.
+        """
+        matches = defaultdict(set)
+        for prefix in candidate_prefixes(value):
+            for kind in kinds:
+                for regex, tracker_id in self.index.get((kind, prefix), ()):
+                    if kind not in matches[tracker_id] and regex.search(value):
+                        matches[tracker_id].add(kind)
+        return {
+            tracker_id: found for tracker_id, found in matches.items() if found
+        }
+
+    def collisions(self, kind):
+        """
+        Returns a dict of the tracker ids whose signature of the given kind
+        is found in the signature of other trackers, mapped to the set of
+        those trackers ids. Computed once per trackers version.
+        """
+        if kind in self._collisions:
+            return self._collisions[kind]
+
+        signatures = self.signatures[kind]
+        if self.version is None:
+            self._collisions[kind] = find_collisions(signatures)
+            return self._collisions[kind]
+
+        from trackers import jobs
+
+        # Shared by the processes, and computed ahead of the requests by
+        # the signatures job when jobs are enabled
+        collisions, current = versions.get_or_compute(
+            collisions_key(self.version, kind),
+            lambda: find_collisions(signatures),
+            latest=f'trackers:collisions:latest:{kind}', job=jobs.SIGNATURES)
+        if current:
+            self._collisions[kind] = collisions
+            return collisions
+        # The previous collisions, until the job computes the current ones,
+        # without the deleted trackers
+        return {
+            tracker_id: others & self.names.keys()
+            for tracker_id, others in collisions.items()
+            if tracker_id in self.names
+        }
+
+    def colliding_trackers(self, tracker_id, kind):
+        """
+        Returns the (id, name) of the trackers whose signature of the given
+        kind is matched by the one of the tracker, sorted by name.
+        """
+        ids = self.collisions(kind).get(tracker_id, ())
+        return sorted(
+            ((pk, self.name(pk)) for pk in ids), key=lambda item: item[1])
+
+    def colliding_ids(self):
+        """
+        Returns the ids of the trackers having any signature collision.
+        """
+        ids = set()
+        for kind, _ in SIGNATURE_FIELDS:
+            ids.update(self.collisions(kind))
+        return ids
+
+
+def attach_collisions(trackers):
+    """
+    Fetches the colliding trackers of all trackers at once, with a single
+    query, so that listing them costs no query per tracker.
+    """
+    from trackers.models import Tracker
+
+    trackers = list(trackers)
+    shared_matcher = get_matcher()
+    collisions = {
+        kind: shared_matcher.collisions(kind) for kind, _ in SIGNATURE_FIELDS
+    }
+    wanted = set()
+    for tracker in trackers:
+        for kind, _ in SIGNATURE_FIELDS:
+            wanted.update(collisions[kind].get(tracker.pk, ()))
+    others = {}
+    if wanted:
+        others = {
+            other.pk: other
+            for other in Tracker.objects.filter(pk__in=wanted)
+        }
+
+    for tracker in trackers:
+        tracker._collisions = {}
+        for kind, _ in SIGNATURE_FIELDS:
+            ids = collisions[kind].get(tracker.pk, ())
+            tracker._collisions[kind] = sorted(
+                (others[pk] for pk in ids if pk in others),
+                key=lambda other: other.created)
+    return trackers
+
+
+_matcher = None
+
+
+def get_matcher():
+    """
+    Returns the matcher of the current trackers version, read from the
+    snapshot shared by the workers when SIGNATURE_SNAPSHOT_PATH is set.
+    """
+    global _matcher
+    version = versions.get_version(versions.TRACKERS)
+    if _matcher is None or _matcher.version != version:
+        path = getattr(settings, 'SIGNATURE_SNAPSHOT_PATH', None)
+        with read_from_primary():
+            if path:
+                from trackers import snapshot
+
+                _matcher = snapshot.load_or_build(path, version, _matcher)
+            else:
+                _matcher = SignatureMatcher.build(version)
+    return _matcher
+
+
+def _lookup_patterns(value):
+    from trackers.models import SignaturePattern
+
+    patterns = SignaturePattern.objects.select_related('tracker').only(
+        'kind', 'pattern', 'tracker__name').matching(value)
+    matches = defaultdict(set)
+    names = {}
+    for pattern in patterns:
+        matches[pattern.tracker_id].add(pattern.kind)
+        names[pattern.tracker_id] = pattern.tracker.name
+    return matches, names.get
+
+
+def lookup(value):
+    """
+    Returns the trackers whose signatures match the package name or
+    hostname, as (id, name, sorted kinds) tuples sorted by name.
+
+    Until the process has the matcher of the current trackers version, the
+    candidates are found with the prefix index of the SignaturePattern
+    table rather than by building the matcher of the whole catalogue in
+    the request.
+    """
+    value = value.strip()
+    version = versions.get_version(versions.TRACKERS)
+    if _matcher is not None and _matcher.version == version:
+        matches, name = _matcher.lookup(value), _matcher.name
+    else:
+        matches, name = _lookup_patterns(value)
+    return sorted(
+        (
+            (tracker_id, name(tracker_id), sorted(kinds))
+            for tracker_id, kinds in matches.items()
+        ),
+        key=lambda match: match[1]
+    )
@@ -0,0 +1,102 @@
+# Collapses the multi-table Category inheritance into a single typed table.
+#
+# The child tables only held a pointer to their Category row, so the
+# many-to-many rows already reference Category ids and are kept as is.
+
+from django.db import migrations, models
+
+KINDS = [
+    ('Capability', 'capability'),
+    ('Advertising', 'advertising'),
+    ('Analytic', 'analytic'),
+    ('Network', 'network'),
+    ('TrackerCategory', 'tracker'),
+]
+
+# (Tracker field, target model, related name)
+RELATIONS = [
+    ('capability', 'Capability', 'capability_trackers'),
+    ('advertising', 'Advertising', 'advertising_trackers'),
+    ('analytic', 'Analytic', 'analytic_trackers'),
+    ('network', 'Network', 'network_trackers'),
+    ('category', 'TrackerCategory', 'category_trackers'),
+]
+
+
+def set_kinds(apps, schema_editor):
+    Category = apps.get_model('trackers', 'Category')
+    for model_name, kind in KINDS:
+        model = apps.get_model('trackers', model_name)
+        ids = model.objects.values_list('category_ptr_id', flat=True)
+        Category.objects.filter(id__in=ids).update(kind=kind)
+
+
+def restore_children(apps, schema_editor):
+    Category = apps.get_model('trackers', 'Category')
+    for model_name, kind in KINDS:
+        model = apps.get_model('trackers', model_name)
+        for category_id in Category.objects.filter(
+                kind=kind).values_list('id', flat=True):
+            model(category_ptr_id=category_id).save_base(raw=True)
+
+
+def proxy_model(name):
+    return migrations.CreateModel(
+        name=name,
+        fields=[],
+        options={
+            'proxy': True,
+            'indexes': [],
+            'constraints': [],
+        },
+        bases=('trackers.category',),
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0009_tracker_needs_rework'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='kind',
+            field=models.CharField(
+                choices=[
+                    ('capability', 'Capability'),
+                    ('advertising', 'Advertising'),
+                    ('analytic', 'Analytic'),
+                    ('network', 'Network'),
+                    ('tracker', 'Tracker category'),
+                ],
+                db_index=True, default='', editable=False, max_length=20),
+            preserve_default=False,
+        ),
+        migrations.RunPython(set_kinds, migrations.RunPython.noop),
+    ] + [
+        # Point the relations to the parent table while the children go away
+        migrations.AlterField(
+            model_name='tracker',
+            name=field,
+            field=models.ManyToManyField(
+                blank=True, related_name=related_name, to='trackers.category'),
+        )
+        for field, _, related_name in RELATIONS
+    ] + [
+        migrations.RunPython(migrations.RunPython.noop, restore_children),
+    ] + [
+        migrations.DeleteModel(name=model_name) for model_name, _ in KINDS
+    ] + [
+        proxy_model(model_name) for model_name, _ in KINDS
+    ] + [
+        migrations.AlterField(
+            model_name='tracker',
+            name=field,
+            field=models.ManyToManyField(
+                blank=True, related_name=related_name,
+                to=f'trackers.{model_name.lower()}'),
+        )
+        for field, model_name, related_name in RELATIONS
+    ]
@@ -0,0 +1,42 @@
+# Generated by Django 5.2.15 on 2026-10-19 10:58
+
+import re
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+def fill_api_key_ids(apps, schema_editor):
+    Tracker = apps.get_model('trackers', 'Tracker')
+    TrackerApiKeyId = apps.get_model('trackers', 'TrackerApiKeyId')
+    entries = []
+    for tracker_id, api_key_ids in Tracker.objects.exclude(
+            api_key_ids='').values_list('id', 'api_key_ids'):
+        keys = (key for key in re.split(r'[\s,]+', api_key_ids) if key)
+        entries += [
+            TrackerApiKeyId(tracker_id=tracker_id, key_id=key_id)
+            for key_id in dict.fromkeys(keys)
+        ]
+    TrackerApiKeyId.objects.bulk_create(entries)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0010_category_kind'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TrackerApiKeyId',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key_id', models.CharField(db_index=True, max_length=1000)),
+                ('tracker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='api_key_id_entries', to='trackers.tracker')),
+            ],
+            options={
+                'unique_together': {('tracker', 'key_id')},
+            },
+        ),
+        migrations.RunPython(fill_api_key_ids, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,119 @@
+# Generated by Django 5.2.15 on 2026-10-19 10:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+# Frozen copies of trackers.signatures, as they were when the patterns
+# were first filled
+PREFIX_LENGTH = 50
+METACHARACTERS = '^$*+?{}[]()|\\'
+OPTIONAL_QUANTIFIERS = '*?{'
+
+
+def split_alternation(signature):
+    branches = []
+    current = []
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in signature:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            branches.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    branches.append(''.join(current))
+    return [branch for branch in branches if branch]
+
+
+def literal_prefix(pattern):
+    prefix = []
+    i = 1 if pattern.startswith('^') else 0
+    while i < len(pattern) and len(prefix) < PREFIX_LENGTH:
+        char = pattern[i]
+        if char == '\\':
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            char = pattern[i + 1]
+            step = 2
+        elif char in METACHARACTERS:
+            break
+        else:
+            step = 1
+
+        following = pattern[i + step:i + step + 1]
+        if following and following in OPTIONAL_QUANTIFIERS:
+            break
+        prefix.append(char)
+        if following == '+':
+            break
+        i += step
+    return ''.join(prefix)
+
+
+def fill_signature_patterns(apps, schema_editor):
+    Tracker = apps.get_model('trackers', 'Tracker')
+    SignaturePattern = apps.get_model('trackers', 'SignaturePattern')
+    patterns = []
+    for tracker_id, code_signature, network_signature in \
+            Tracker.objects.values_list(
+                'id', 'code_signature', 'network_signature'):
+        for kind, signature in (
+                ('code', code_signature), ('network', network_signature)):
+            patterns += [
+                SignaturePattern(
+                    tracker_id=tracker_id,
+                    kind=kind,
+                    pattern=pattern,
+                    prefix=literal_prefix(pattern),
+                )
+                for pattern in dict.fromkeys(split_alternation(signature))
+            ]
+    SignaturePattern.objects.bulk_create(patterns)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0011_trackerapikeyid'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='tracker',
+            name='code_signature',
+            field=models.CharField(blank=True, default='', max_length=2000),
+        ),
+        migrations.AlterField(
+            model_name='tracker',
+            name='network_signature',
+            field=models.CharField(blank=True, default='', max_length=2000),
+        ),
+        migrations.CreateModel(
+            name='SignaturePattern',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('code', 'Code signature'), ('network', 'Network signature')], max_length=10)),
+                ('pattern', models.CharField(max_length=2000)),
+                ('prefix', models.CharField(blank=True, max_length=50)),
+                ('tracker', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='signature_patterns', to='trackers.tracker')),
+            ],
+            options={
+                'indexes': [models.Index(fields=['kind', 'prefix'], name='trackers_si_kind_809555_idx')],
+            },
+        ),
+        migrations.RunPython(
+            fill_signature_patterns, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,74 @@
+import sqlite3
+
+from django.db import migrations
+
+# Frozen copies of trackers.search, as the index was first created
+SEARCH_FIELDS = (
+    'name', 'description', 'website', 'code_signature', 'network_signature'
+)
+FTS_TABLE = 'trackers_tracker_fts'
+SEARCH_EXPRESSION = " || ' ' || ".join(f'"{f}"' for f in SEARCH_FIELDS)
+
+SQLITE_CREATE = [
+    f"CREATE VIRTUAL TABLE {FTS_TABLE} USING fts5("
+    f"tracker_id UNINDEXED, {', '.join(SEARCH_FIELDS)})",
+    f"INSERT INTO {FTS_TABLE} (tracker_id, {', '.join(SEARCH_FIELDS)}) "
+    f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM trackers_tracker",
+]
+SQLITE_DROP = [f"DROP TABLE IF EXISTS {FTS_TABLE}"]
+
+POSTGRESQL_CREATE = [
+    "CREATE EXTENSION IF NOT EXISTS pg_trgm",
+    "CREATE INDEX trackers_tracker_search_fts ON trackers_tracker "
+    f"USING GIN (to_tsvector('simple', {SEARCH_EXPRESSION}))",
+    "CREATE INDEX trackers_tracker_search_trgm ON trackers_tracker "
+    f"USING GIN (({SEARCH_EXPRESSION}) gin_trgm_ops)",
+]
+POSTGRESQL_DROP = [
+    "DROP INDEX IF EXISTS trackers_tracker_search_fts",
+    "DROP INDEX IF EXISTS trackers_tracker_search_trgm",
+]
+
+
+def sqlite_has_fts5():
+    try:
+        sqlite3.connect(':memory:').execute(
+            'CREATE VIRTUAL TABLE fts5_check USING fts5(content)')
+    except sqlite3.OperationalError:
+        return False
+    return True
+
+
+def create_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite' and sqlite_has_fts5():
+        statements = SQLITE_CREATE
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_CREATE
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+def drop_search_index(apps, schema_editor):
+    vendor = schema_editor.connection.vendor
+    if vendor == 'sqlite':
+        statements = SQLITE_DROP
+    elif vendor == 'postgresql':
+        statements = POSTGRESQL_DROP
+    else:
+        statements = []
+    for statement in statements:
+        schema_editor.execute(statement)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0012_signaturepattern'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
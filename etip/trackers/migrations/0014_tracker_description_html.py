@@ -0,0 +1,68 @@
+import html
+from urllib.parse import urlparse
+
+import markdown
+from django.db import migrations, models
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+
+# Frozen copy of trackers.rendering, with the link check that decodes
+# character references
+EXTENSIONS = ['markdown.extensions.fenced_code']
+SAFE_SCHEMES = ('', 'http', 'https', 'mailto')
+URL_ATTRIBUTES = ('href', 'src')
+
+
+class SafeLinksTreeprocessor(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            for attribute in URL_ATTRIBUTES:
+                url = element.get(attribute)
+                if url is not None and not is_safe_url(url):
+                    del element.attrib[attribute]
+
+
+class SanitizeExtension(Extension):
+    def extendMarkdown(self, md):  # noqa: N802
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+        md.treeprocessors.register(
+            SafeLinksTreeprocessor(md), 'safe_links', 0)
+
+
+def is_safe_url(url):
+    cleaned = ''.join(c for c in html.unescape(url) if c > ' ').lower()
+    try:
+        scheme = urlparse(cleaned).scheme
+    except ValueError:
+        return False
+    return scheme in SAFE_SCHEMES
+
+
+def render_markdown(text):
+    return markdown.markdown(
+        text, extensions=EXTENSIONS + [SanitizeExtension()])
+
+
+def render_descriptions(apps, schema_editor):
+    Tracker = apps.get_model('trackers', 'Tracker')
+    trackers = list(Tracker.objects.exclude(description='').only('description'))
+    for tracker in trackers:
+        tracker.description_html = render_markdown(tracker.description)
+    Tracker.objects.bulk_update(trackers, ['description_html'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0013_tracker_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='tracker',
+            name='description_html',
+            field=models.TextField(blank=True, editable=False),
+        ),
+        migrations.RunPython(render_descriptions, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,58 @@
+# Generated by Django 5.2.15 on 2026-10-19 11:46
+
+import django.db.models.expressions
+import django.db.models.functions.comparison
+from django.db import migrations, models
+
+# Frozen copies of trackers.search, as the name index was first created
+NAME_INDEX = 'trackers_tracker_name_lower'
+NAME_INDEX_CREATE = {
+    'sqlite': f"CREATE INDEX {NAME_INDEX} ON trackers_tracker (LOWER(name))",
+    # The pattern operator class lets LIKE 'prefix%' use the index whatever
+    # the collation of the database
+    'postgresql': f"CREATE INDEX {NAME_INDEX} ON trackers_tracker "
+                  "(LOWER(name) text_pattern_ops)",
+}
+NAME_INDEX_DROP = f"DROP INDEX IF EXISTS {NAME_INDEX}"
+
+
+def create_name_index(apps, schema_editor):
+    statement = NAME_INDEX_CREATE.get(schema_editor.connection.vendor)
+    if statement:
+        schema_editor.execute(statement)
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor in NAME_INDEX_CREATE:
+        schema_editor.execute(NAME_INDEX_DROP)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0014_tracker_description_html'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(models.OrderBy(django.db.models.functions.comparison.Coalesce('exodus_matches', django.db.models.expressions.RawSQL('-1', ())), descending=True), models.F('name'), models.F('id'), condition=models.Q(('is_in_exodus', False)), name='tracker_review_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(condition=models.Q(('is_in_exodus', True)), fields=['name', 'id'], name='tracker_in_exodus_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(condition=models.Q(('needs_rework', True)), fields=['name', 'id'], name='tracker_rework_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(fields=['created'], name='tracker_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='tracker',
+            index=models.Index(fields=['-updated'], name='tracker_updated_idx'),
+        ),
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
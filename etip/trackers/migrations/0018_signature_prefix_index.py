@@ -0,0 +1,21 @@
+# Generated by Django 5.2.15 on 2026-10-19 12:17
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0017_rerender_descriptions'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='signaturepattern',
+            name='trackers_si_kind_809555_idx',
+        ),
+        migrations.AddIndex(
+            model_name='signaturepattern',
+            index=models.Index(fields=['prefix', 'kind'], name='trackers_si_prefix_bf02d6_idx'),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.15 on 2026-10-19 12:39
+
+from django.db import migrations, models
+
+
+def delete_duplicate_jobs(apps, schema_editor):
+    # Keep the oldest pending job of each kind
+    Job = apps.get_model('trackers', 'Job')
+    kept = set()
+    for job in Job.objects.filter(status='pending').order_by('pk'):
+        if job.kind in kept:
+            job.delete()
+        kept.add(job.kind)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('trackers', '0018_signature_prefix_index'),
+    ]
+
+    operations = [
+        migrations.RunPython(delete_duplicate_jobs, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='job',
+            constraint=models.UniqueConstraint(condition=models.Q(('status', 'pending')), fields=('kind',), name='job_pending_kind_unique'),
+        ),
+    ]
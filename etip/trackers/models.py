@@ -5,67 +5,147 @@ from django.contrib.auth.models import User
 from django.core.exceptions import ValidationError
 from django.core.validators import URLValidator
 from django.db import models
+from django.db.models import F, Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Coalesce
+from django.utils import timezone
 from reversion.models import Version
 
+from trackers import matcher
+from trackers.category_cache import category_names
+from trackers.rendering import render_markdown
+from trackers.signatures import candidate_prefixes, literal_prefix, \
+    PREFIX_LENGTH, split_alternation
+
 
 class Category(models.Model):
+    CAPABILITY = 'capability'
+    ADVERTISING = 'advertising'
+    ANALYTIC = 'analytic'
+    NETWORK = 'network'
+    TRACKER = 'tracker'
+    KIND_CHOICES = (
+        (CAPABILITY, 'Capability'),
+        (ADVERTISING, 'Advertising'),
+        (ANALYTIC, 'Analytic'),
+        (NETWORK, 'Network'),
+        (TRACKER, 'Tracker category'),
+    )
+    KIND = ''
+
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     name = models.CharField(max_length=200)
     description = models.TextField(blank=True)
     is_in_exodus = models.BooleanField(default=False)
+    kind = models.CharField(
+        max_length=20, choices=KIND_CHOICES, db_index=True, editable=False)
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        if not self.kind:
+            self.kind = self.KIND
+        super().save(*args, **kwargs)
+
     class Meta:
         ordering = ('name',)
 
 
+class CategoryKindManager(models.Manager):
+    """
+    Restricts a Category proxy model to the rows of its own kind.
+    """
+
+    def get_queryset(self):
+        return super().get_queryset().filter(kind=self.model.KIND)
+
+
 class Capability(Category):
-    pass
+    KIND = Category.CAPABILITY
+
+    objects = CategoryKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class Advertising(Category):
-    pass
+    KIND = Category.ADVERTISING
+
+    objects = CategoryKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class Analytic(Category):
-    pass
+    KIND = Category.ANALYTIC
+
+    objects = CategoryKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class Network(Category):
-    pass
+    KIND = Category.NETWORK
+
+    objects = CategoryKindManager()
+
+    class Meta:
+        proxy = True
 
 
 class TrackerCategory(Category):
-    pass
+    KIND = Category.TRACKER
+
+    objects = CategoryKindManager()
+
+    class Meta:
+        proxy = True
+
+
+# Sort key of the review queues: trackers not analyzed yet come last, as
+# with NULLS LAST. The -1 is written in the SQL rather than passed as a
+# parameter, for SQLite to match the ORDER BY with the review index.
+EXODUS_MATCHES_KEY = Coalesce('exodus_matches', RawSQL('-1', ()))
 
 
 class Tracker(models.Model):
     MIN_SIGNATURE_SIZE = 4
     MIN_DESCRIPTION_SIZE = 180
     MIN_WEBSITE_SIZE = 3
+    CATEGORY_FIELDS = (
+        'category', 'capability', 'advertising', 'analytic', 'network')
 
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     created = models.DateTimeField(auto_now_add=True)
     updated = models.DateTimeField(auto_now=True)
     name = models.CharField(unique=True, max_length=200)
     description = models.TextField(blank=True)
+    # Sanitized HTML rendering of the description, see save()
+    description_html = models.TextField(blank=True, editable=False)
     creation_date = models.DateField(auto_now_add=True)
-    code_signature = models.CharField(max_length=500, default='', blank=True)
+    code_signature = models.CharField(max_length=2000, default='', blank=True)
     network_signature = models.CharField(
-        max_length=500, default='', blank=True)
+        max_length=2000, default='', blank=True)
     website = models.URLField()
-    category = models.ManyToManyField(TrackerCategory, blank=True)
+    category = models.ManyToManyField(
+        TrackerCategory, blank=True, related_name='category_trackers')
     is_in_exodus = models.BooleanField(default=False)
     api_key_ids = models.CharField(max_length=1000, default='', blank=True)
     documentation = models.CharField(max_length=1000, default='', blank=True)
-    capability = models.ManyToManyField(Capability, blank=True)
-    advertising = models.ManyToManyField(Advertising, blank=True)
-    analytic = models.ManyToManyField(Analytic, blank=True)
-    network = models.ManyToManyField(Network, blank=True)
+    capability = models.ManyToManyField(
+        Capability, blank=True, related_name='capability_trackers')
+    advertising = models.ManyToManyField(
+        Advertising, blank=True, related_name='advertising_trackers')
+    analytic = models.ManyToManyField(
+        Analytic, blank=True, related_name='analytic_trackers')
+    network = models.ManyToManyField(
+        Network, blank=True, related_name='network_trackers')
     maven_repository = models.CharField(max_length=500, default='', blank=True)
     artifact_id = models.CharField(max_length=500, default='', blank=True)
     group_id = models.CharField(max_length=500, default='', blank=True)
@@ -74,19 +154,75 @@ class Tracker(models.Model):
     exodus_matches = models.PositiveIntegerField(blank=True, null=True)
     needs_rework = models.BooleanField(default=False)
 
+    class Meta:
+        # The lower-cased name index is created by migration 0015, with
+        # the operator class PostgreSQL needs for prefix searches
+        indexes = [
+            models.Index(
+                EXODUS_MATCHES_KEY.desc(), F('name'), F('id'),
+                condition=Q(is_in_exodus=False), name='tracker_review_idx'),
+            models.Index(
+                fields=['name', 'id'], condition=Q(is_in_exodus=True),
+                name='tracker_in_exodus_idx'),
+            models.Index(
+                fields=['name', 'id'], condition=Q(needs_rework=True),
+                name='tracker_rework_idx'),
+            models.Index(fields=['created'], name='tracker_created_idx'),
+            models.Index(fields=['-updated'], name='tracker_updated_idx'),
+        ]
+
     def __str__(self):
         return self.name
 
+    @classmethod
+    def from_db(cls, db, field_names, values):
+        instance = super().from_db(db, field_names, values)
+        # Remember the stored values to only process the changed ones on save
+        instance._saved_values = {
+            name: getattr(instance, name)
+            for name in (
+                'api_key_ids', 'documentation', 'description',
+                'code_signature', 'network_signature',
+            )
+            if name in field_names
+        }
+        return instance
+
+    def has_changed(self, name):
+        saved_values = getattr(self, '_saved_values', {})
+        return name not in saved_values \
+            or saved_values[name] != getattr(self, name)
+
+    def save(self, *args, **kwargs):
+        if self.has_changed('description') or \
+                (self.description and not self.description_html):
+            self.description_html = render_markdown(self.description)
+            update_fields = kwargs.get('update_fields')
+            if update_fields is not None and 'description' in update_fields:
+                kwargs['update_fields'] = \
+                    set(update_fields) | {'description_html'}
+        super().save(*args, **kwargs)
+        if not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        self._saved_values['description'] = self.description
+
+    def rendered_description(self):
+        # Reverted versions may predate the rendered column
+        if self.description and not self.description_html:
+            return render_markdown(self.description)
+        return self.description_html
+
     def get_fields(self):
         return [
             (field.name, field.value_to_string(self))
             for field in Tracker._meta.fields
+            if field.name != 'description_html'
         ]
 
     def clean_fields(self, exclude=None):
         super().clean_fields(exclude=exclude)
 
-        if self.documentation:
+        if self.documentation and self.has_changed('documentation'):
             links = self.documentation.split(' ')
             validate = URLValidator()
             for link in links:
@@ -122,41 +258,55 @@ class Tracker(models.Model):
             raise ValidationError(
                 {err: "Must be a valid regex." for err in regex_errors})
 
+    # Collisions are read from the shared matcher, which reflects the saved
+    # signatures of all trackers
     def has_any_signature_collision(self):
-        trackers = Tracker.objects.all().exclude(id=self.id)
-        for t in trackers:
-            if self._has_same_code_signature(t) \
-                    or self._has_same_network_signature(t):
-                return True
-        return False
+        return self.pk in matcher.get_matcher().colliding_ids()
 
     def get_trackers_with_code_signature_collision(self):
-        collisions = []
-        trackers = Tracker.objects.all().exclude(id=self.id)
-        for t in trackers:
-            if self._has_same_code_signature(t):
-                collisions.append(t)
-        return collisions
+        return self._signature_collisions(matcher.CODE)
 
     def get_trackers_with_network_signature_collision(self):
-        collisions = []
-        trackers = Tracker.objects.all().exclude(id=self.id)
-        for t in trackers:
-            if self._has_same_network_signature(t):
-                collisions.append(t)
-        return collisions
-
-    def _has_same_network_signature(self, tracker):
-        return re.search(self.network_signature, tracker.network_signature) \
-            and len(self.network_signature) > self.MIN_SIGNATURE_SIZE
-
-    def _has_same_code_signature(self, tracker):
-        return re.search(self.code_signature, tracker.code_signature) \
-            and len(self.code_signature) > self.MIN_SIGNATURE_SIZE
+        return self._signature_collisions(matcher.NETWORK)
+
+    def _signature_collisions(self, kind):
+        attached = getattr(self, '_collisions', {})
+        if kind in attached:
+            return attached[kind]
+        ids = matcher.get_matcher().collisions(kind).get(self.pk)
+        if not ids:
+            return []
+        return list(Tracker.objects.filter(pk__in=ids).order_by('created'))
+
+    @classmethod
+    def category_relation(cls, field):
+        """
+        Returns the relation table of a category field and the name of its
+        column holding the category id.
+        """
+        relation = cls._meta.get_field(field)
+        through = relation.remote_field.through
+        column = through._meta.get_field(
+            relation.m2m_reverse_field_name()).attname
+        return through, column
+
+    def category_ids(self, field='category'):
+        attached = getattr(self, '_category_ids', {})
+        if field in attached:
+            return attached[field]
+        prefetched = getattr(self, '_prefetched_objects_cache', {})
+        if field in prefetched:
+            return [category.pk for category in prefetched[field]]
+        through, column = self.category_relation(field)
+        return list(through.objects.filter(
+            tracker_id=self.pk).values_list(column, flat=True))
+
+    def category_names(self, field='category'):
+        return category_names(self.category_ids(field))
 
     def progress(self):
         p = 0
-        if self.category.count() > 0:
+        if self.category_ids('category'):
             p += 15
         if len(self.description) >= self.MIN_DESCRIPTION_SIZE:
             p += 15
@@ -166,13 +316,13 @@ class Tracker(models.Model):
             p += 10
         if len(self.website) >= self.MIN_WEBSITE_SIZE:
             p += 10
-        if self.capability.count() > 0:
+        if self.category_ids('capability'):
             p += 10
-        if self.analytic.count() > 0:
+        if self.category_ids('analytic'):
             p += 10
-        if self.advertising.count() > 0:
+        if self.category_ids('advertising'):
             p += 10
-        if self.network.count() > 0:
+        if self.category_ids('network'):
             p += 6
         if self.maven_repository:
             p += 1
@@ -186,7 +336,7 @@ class Tracker(models.Model):
 
     def missing_fields(self):
         missing = []
-        if self.category.count() == 0:
+        if not self.category_ids('category'):
             missing.append('Categories')
         if len(self.description) < self.MIN_DESCRIPTION_SIZE:
             missing.append('Description')
@@ -196,13 +346,13 @@ class Tracker(models.Model):
             missing.append('Network signature')
         if len(self.website) < self.MIN_WEBSITE_SIZE:
             missing.append('Website')
-        if self.capability.count() == 0:
+        if not self.category_ids('capability'):
             missing.append('Capabilities')
-        if self.analytic.count() == 0:
+        if not self.category_ids('analytic'):
             missing.append('Analytics')
-        if self.advertising.count() == 0:
+        if not self.category_ids('advertising'):
             missing.append('Advertising')
-        if self.network.count() == 0:
+        if not self.category_ids('network'):
             missing.append('Networks')
         if not self.maven_repository:
             missing.append('Maven repository')
@@ -214,16 +364,68 @@ class Tracker(models.Model):
             missing.append('Gradle')
         return missing
 
+    def approval_count(self):
+        # Annotated by the list views to save a query per row
+        if hasattr(self, 'approvals_count'):
+            return self.approvals_count
+        return self.approvals.count()
+
     def approvers(self):
         approvals = self.approvals.all()
         return [approval.approver.username for approval in approvals]
 
     def creator(self):
-        versions = Version.objects.get_for_object(self)
-        if len(versions) > 0:
-            return versions[len(versions) - 1].revision.user
-        else:
-            return None
+        if not hasattr(self, '_creator'):
+            versions = Version.objects.get_for_object(self)
+            if len(versions) > 0:
+                self._creator = versions[len(versions) - 1].revision.user
+            else:
+                self._creator = None
+        return self._creator
+
+    def api_key_id_list(self):
+        keys = re.split(r'[\s,]+', self.api_key_ids)
+        return list(dict.fromkeys(key for key in keys if key))
+
+    def sync_api_key_ids(self, created=False):
+        """
+        Mirrors api_key_ids into the indexed TrackerApiKeyId table.
+        """
+        if not self.has_changed('api_key_ids') \
+                or (created and not self.api_key_ids):
+            return
+        if not created:
+            self.api_key_id_entries.all().delete()
+        TrackerApiKeyId.objects.bulk_create([
+            TrackerApiKeyId(tracker=self, key_id=key_id)
+            for key_id in self.api_key_id_list()
+        ])
+        if not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        self._saved_values['api_key_ids'] = self.api_key_ids
+
+    def sync_signature_patterns(self, created=False):
+        """
+        Mirrors the signatures into the indexed SignaturePattern table.
+        """
+        changed = [
+            kind for kind, name in SignaturePattern.SIGNATURE_FIELDS
+            if self.has_changed(name)
+            and not (created and not getattr(self, name))
+        ]
+        if not changed:
+            return
+        if not created:
+            self.signature_patterns.filter(kind__in=changed).delete()
+        SignaturePattern.objects.bulk_create([
+            pattern
+            for kind in changed
+            for pattern in SignaturePattern.from_signature(self, kind)
+        ])
+        if not hasattr(self, '_saved_values'):
+            self._saved_values = {}
+        for kind, name in SignaturePattern.SIGNATURE_FIELDS:
+            self._saved_values[name] = getattr(self, name)
 
     def documentation_list(self):
         if self.documentation:
@@ -244,7 +446,7 @@ class Tracker(models.Model):
         if self.exodus_matches == 0:
             return 'Unmatched in εxodus'
 
-        if self.approvals.count() < 2:
+        if self.approval_count() < 2:
             return 'Waiting for review'
 
         return 'Approved'
@@ -266,7 +468,7 @@ class Tracker(models.Model):
             'code_signature': self.code_signature,
             'network_signature': self.network_signature,
             'website': self.website,
-            'category': [c.name for c in self.category.all()],
+            'category': self.category_names(),
             'is_in_exodus': self.is_in_exodus,
             'documentation': self.documentation_list()
         }
@@ -281,3 +483,118 @@ class TrackerApproval(models.Model):
 
     class Meta:
         unique_together = (("tracker", "approver"),)
+
+
+class TrackerApiKeyId(models.Model):
+    tracker = models.ForeignKey(
+        Tracker, related_name='api_key_id_entries', on_delete=models.CASCADE,)
+    key_id = models.CharField(max_length=1000, db_index=True)
+
+    def __str__(self):
+        return self.key_id
+
+    class Meta:
+        unique_together = (("tracker", "key_id"),)
+
+
+class SignaturePatternQuerySet(models.QuerySet):
+    def candidates(self, value):
+        return self.filter(prefix__in=candidate_prefixes(value))
+
+    def matching(self, value):
+        """
+        Returns the patterns matching the value, among the candidates found
+        with the prefix index.
+        """
+        matching = []
+        for pattern in self.candidates(value):
+            try:
+                if re.search(pattern.pattern, value):
+                    matching.append(pattern)
+            except re.error:
+                continue
+        return matching
+
+
+class SignaturePattern(models.Model):
+    CODE = 'code'
+    NETWORK = 'network'
+    KIND_CHOICES = (
+        (CODE, 'Code signature'),
+        (NETWORK, 'Network signature'),
+    )
+    SIGNATURE_FIELDS = (
+        (CODE, 'code_signature'),
+        (NETWORK, 'network_signature'),
+    )
+
+    tracker = models.ForeignKey(
+        Tracker, related_name='signature_patterns', on_delete=models.CASCADE,)
+    kind = models.CharField(max_length=10, choices=KIND_CHOICES)
+    pattern = models.CharField(max_length=2000)
+    prefix = models.CharField(max_length=PREFIX_LENGTH, blank=True)
+
+    objects = SignaturePatternQuerySet.as_manager()
+
+    def __str__(self):
+        return self.pattern
+
+    @classmethod
+    def from_signature(cls, tracker, kind):
+        signature = getattr(tracker, dict(cls.SIGNATURE_FIELDS)[kind])
+        return [
+            cls(
+                tracker=tracker,
+                kind=kind,
+                pattern=pattern,
+                prefix=literal_prefix(pattern),
+            )
+            for pattern in dict.fromkeys(split_alternation(signature))
+        ]
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['prefix', 'kind']),
+        ]
+
+
+class Job(models.Model):
+    """
+    Background job run by the `run_worker` command, see trackers/jobs.py.
+    """
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS_CHOICES = (
+        (PENDING, 'Pending'),
+        (RUNNING, 'Running'),
+        (DONE, 'Done'),
+        (FAILED, 'Failed'),
+    )
+
+    kind = models.CharField(max_length=50)
+    status = models.CharField(
+        max_length=10, choices=STATUS_CHOICES, default=PENDING)
+    created = models.DateTimeField(auto_now_add=True)
+    run_at = models.DateTimeField(default=timezone.now)
+    started = models.DateTimeField(blank=True, null=True)
+    finished = models.DateTimeField(blank=True, null=True)
+    attempts = models.PositiveIntegerField(default=0)
+    worker = models.CharField(max_length=200, blank=True)
+    output = models.TextField(blank=True)
+    error = models.TextField(blank=True)
+
+    def __str__(self):
+        return f'{self.kind} ({self.status})'
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['status', 'run_at'], name='job_status_idx'),
+        ]
+        constraints = [
+            # A kind is enqueued once while a job of it is pending
+            models.UniqueConstraint(
+                fields=['kind'], condition=Q(status='pending'),
+                name='job_pending_kind_unique'),
+        ]
@@ -0,0 +1,45 @@
+"""
+In-memory index of the tracker names, for autocompletion.
+
+Names are kept in a sorted array of case-folded keys: a prefix lookup is
+a binary search followed by a short scan. The index is rebuilt when the
+trackers version is bumped.
+"""
+from bisect import bisect_left
+
+from etip.replicas import read_from_primary
+
+from trackers import versions
+
+
+class NameIndex:
+    def __init__(self, names, version=None):
+        self.version = version
+        self.entries = sorted((name.casefold(), name) for name in names)
+
+    @classmethod
+    def build(cls, version=None):
+        from trackers.models import Tracker
+
+        return cls(Tracker.objects.values_list('name', flat=True), version)
+
+    def complete(self, prefix, limit=10):
+        key = prefix.casefold()
+        names = []
+        for folded, name in self.entries[bisect_left(self.entries, (key,)):]:
+            if not folded.startswith(key) or len(names) >= limit:
+                break
+            names.append(name)
+        return names
+
+
+_index = None
+
+
+def get_index():
+    global _index
+    version = versions.get_version(versions.TRACKERS)
+    if _index is None or _index.version != version:
+        with read_from_primary():
+            _index = NameIndex.build(version)
+    return _index
@@ -0,0 +1,218 @@
+"""
+Keyset ("seek") pagination of the HTML tracker lists.
+
+Pages are fetched with a `WHERE (key) > (last key of the previous page)`
+condition on an indexed ordering instead of an OFFSET, so every page
+costs the same as the first one. The position is carried in an opaque
+`cursor` query parameter holding the key of the page edge.
+
+Total counts are cached per filters, keyed by the trackers and approvals
+versions so they stay exact (see TRACKER_LIST_CACHE_COUNTS).
+"""
+import base64
+import json
+import uuid
+
+from django.conf import settings
+from django.db.models import Q
+
+from trackers import versions
+
+PAGE_SIZE = 20
+
+# (field, descending) keys, the last field being unique
+NAME_ORDERING = (('name', False), ('id', False))
+EXODUS_ORDERING = (('exodus_matches_key', True), ('name', False), ('id', False))
+
+
+def _is_uuid(value):
+    try:
+        uuid.UUID(value)
+    except (AttributeError, TypeError, ValueError):
+        return False
+    return True
+
+
+def _is_text(value):
+    # The databases reject the NUL character in text parameters
+    return isinstance(value, str) and '\x00' not in value
+
+
+# Checks of the cursor values of each ordering field, a tampered cursor
+# falling back to the first page instead of failing in the query
+KEY_CHECKS = {
+    'id': _is_uuid,
+    'name': _is_text,
+    'exodus_matches_key': lambda value: type(value) is int,
+}
+
+NEXT = 'next'
+PREVIOUS = 'previous'
+LAST = 'last'
+
+
+def encode_cursor(direction, values):
+    data = json.dumps([direction, values], separators=(',', ':'))
+    return base64.urlsafe_b64encode(data.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns the (direction, values) of a cursor, or (None, None) for the
+    first page or an invalid cursor.
+    """
+    if cursor == LAST:
+        return LAST, None
+    try:
+        data = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4))
+        direction, values = json.loads(data)
+    except (ValueError, TypeError):
+        return None, None
+    if direction not in (NEXT, PREVIOUS) or not isinstance(values, list):
+        return None, None
+    return direction, values
+
+
+def valid_values(ordering, values):
+    """
+    Returns whether the values of a cursor are a key of the ordering.
+    """
+    return len(values) == len(ordering) and all(
+        KEY_CHECKS[field](value)
+        for (field, _), value in zip(ordering, values)
+    )
+
+
+def _key_value(value):
+    return str(value) if isinstance(value, uuid.UUID) else value
+
+
+def _order_by(ordering, reverse=False):
+    return [
+        f'-{field}' if descending != reverse else field
+        for field, descending in ordering
+    ]
+
+
+def seek_condition(ordering, values, forward=True):
+    """
+    Returns the condition selecting the rows after (or before) the given
+    key values, in the given ordering.
+    """
+    condition = None
+    for (field, descending), value in reversed(list(zip(ordering, values))):
+        lookup = 'lt' if descending == forward else 'gt'
+        strict = Q(**{f'{field}__{lookup}': value})
+        if condition is None:
+            condition = strict
+        else:
+            condition = strict | (Q(**{field: value}) & condition)
+    if len(ordering) > 1:
+        # Redundant bound on the first field, for the database to start
+        # the index scan at the key instead of filtering from the start
+        (field, descending), value = ordering[0], values[0]
+        lookup = 'lte' if descending == forward else 'gte'
+        condition = Q(**{f'{field}__{lookup}': value}) & condition
+    return condition
+
+
+class KeysetPage:
+    def __init__(self, object_list, ordering, has_previous, has_next):
+        self.object_list = object_list
+        self.ordering = ordering
+        self.has_previous = has_previous
+        self.has_next = has_next
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __getitem__(self, index):
+        return self.object_list[index]
+
+    def _cursor(self, direction, item):
+        return encode_cursor(direction, [
+            _key_value(getattr(item, field)) for field, _ in self.ordering
+        ])
+
+    @property
+    def next_cursor(self):
+        if self.has_next and self.object_list:
+            return self._cursor(NEXT, self.object_list[-1])
+        return None
+
+    @property
+    def previous_cursor(self):
+        if self.has_previous and self.object_list:
+            return self._cursor(PREVIOUS, self.object_list[0])
+        return None
+
+
+def _last_page(queryset, ordering, per_page):
+    items = list(queryset.order_by(
+        *_order_by(ordering, reverse=True))[:per_page + 1])
+    page = items[:per_page]
+    page.reverse()
+    return KeysetPage(page, ordering, len(items) > per_page, False)
+
+
+def paginate(queryset, ordering, request, per_page=PAGE_SIZE):
+    """
+    Returns the KeysetPage of the queryset designated by the `cursor`
+    query parameter. The legacy `page` parameter is still honoured, with
+    an OFFSET, so that existing links keep working. A page left empty by
+    deletions is replaced with the last page, or the first one before it.
+    """
+    direction, values = decode_cursor(request.GET.get('cursor', ''))
+    if values is not None and not valid_values(ordering, values):
+        direction, values = None, None
+
+    if direction == LAST:
+        return _last_page(queryset, ordering, per_page)
+
+    if direction == NEXT:
+        items = list(queryset.filter(seek_condition(ordering, values)).order_by(
+            *_order_by(ordering))[:per_page + 1])
+        if items:
+            return KeysetPage(
+                items[:per_page], ordering, True, len(items) > per_page)
+        return _last_page(queryset, ordering, per_page)
+
+    if direction == PREVIOUS:
+        items = list(queryset.filter(
+            seek_condition(ordering, values, forward=False)
+        ).order_by(*_order_by(ordering, reverse=True))[:per_page + 1])
+        if items:
+            page = items[:per_page]
+            page.reverse()
+            return KeysetPage(page, ordering, len(items) > per_page, True)
+        number = 1
+    else:
+        try:
+            number = max(int(request.GET.get('page', 1)), 1)
+        except ValueError:
+            number = 1
+
+    offset = (number - 1) * per_page
+    items = list(queryset.order_by(
+        *_order_by(ordering))[offset:offset + per_page + 1])
+    if not items and number > 1:
+        return _last_page(queryset, ordering, per_page)
+    return KeysetPage(
+        items[:per_page], ordering, number > 1, len(items) > per_page)
+
+
+def count(queryset, view, filters):
+    """
+    Returns the number of rows of the queryset, cached per view and
+    filters until a tracker or an approval changes.
+    """
+    if not getattr(settings, 'TRACKER_LIST_CACHE_COUNTS', True):
+        return queryset.count()
+
+    return versions.cached(
+        f'trackers:count:{view}', queryset.count, filters,
+        names=[versions.TRACKERS, versions.APPROVALS]
+    )
@@ -0,0 +1,51 @@
+"""
+Sanitized Markdown rendering of the tracker descriptions.
+
+Raw HTML is escaped instead of passed through, and links or images using
+a scheme other than http(s) or mailto are dropped, so the rendered HTML
+can be stored and output as safe.
+"""
+import html
+from urllib.parse import urlparse
+
+import markdown
+from markdown.extensions import Extension
+from markdown.treeprocessors import Treeprocessor
+
+EXTENSIONS = ['markdown.extensions.fenced_code']
+SAFE_SCHEMES = ('', 'http', 'https', 'mailto')
+URL_ATTRIBUTES = ('href', 'src')
+
+
+class SafeLinksTreeprocessor(Treeprocessor):
+    def run(self, root):
+        for element in root.iter():
+            for attribute in URL_ATTRIBUTES:
+                url = element.get(attribute)
+                if url is not None and not is_safe_url(url):
+                    del element.attrib[attribute]
+
+
+class SanitizeExtension(Extension):
+    def extendMarkdown(self, md):  # noqa: N802
+        md.preprocessors.deregister('html_block')
+        md.inlinePatterns.deregister('html')
+        md.treeprocessors.register(
+            SafeLinksTreeprocessor(md), 'safe_links', 0)
+
+
+def is_safe_url(url):
+    # The attribute is output with its character references, which the
+    # browsers decode, and they ignore control characters and spaces in the
+    # scheme
+    cleaned = ''.join(c for c in html.unescape(url) if c > ' ').lower()
+    try:
+        scheme = urlparse(cleaned).scheme
+    except ValueError:
+        return False
+    return scheme in SAFE_SCHEMES
+
+
+def render_markdown(text):
+    return markdown.markdown(
+        text, extensions=EXTENSIONS + [SanitizeExtension()])
@@ -0,0 +1,137 @@
+"""
+Index-backed search of trackers.
+
+SQLite uses an FTS5 table kept in sync by signals. PostgreSQL uses a
+full-text expression index and a trigram index on the same expression,
+maintained by the database itself. Other databases fall back to
+unindexed `icontains` lookups.
+
+Name prefixes are searched, ignoring case, on an index of the lower-cased
+names.
+"""
+import re
+import sys
+
+from django.db import connections
+from django.db.models import Q
+from django.db.models.expressions import RawSQL
+from django.db.models.functions import Lower
+
+SEARCH_FIELDS = (
+    'name', 'description', 'website', 'code_signature', 'network_signature'
+)
+FTS_TABLE = 'trackers_tracker_fts'
+SEARCH_EXPRESSION = " || ' ' || ".join(f'"{f}"' for f in SEARCH_FIELDS)
+
+SQLITE_FILL = (
+    f"INSERT INTO {FTS_TABLE} (tracker_id, {', '.join(SEARCH_FIELDS)}) "
+    f"SELECT id, {', '.join(SEARCH_FIELDS)} FROM trackers_tracker"
+)
+
+_fts_tables = {}
+
+
+def _tokens(query):
+    return [token for token in re.split(r'\W+', query) if token]
+
+
+def _has_fts_table(using):
+    if using not in _fts_tables:
+        _fts_tables[using] = \
+            FTS_TABLE in connections[using].introspection.table_names()
+    return _fts_tables[using]
+
+
+def search_trackers(queryset, query):
+    """
+    Filters the trackers queryset on the words of the query, matched as
+    prefixes of the words of the searched fields.
+    """
+    words = [_tokens(word) for word in query.split()]
+    words = [tokens for tokens in words if tokens]
+    if not words:
+        return queryset
+
+    vendor = connections[queryset.db].vendor
+    if vendor == 'sqlite' and _has_fts_table(queryset.db):
+        # Each word is a phrase of its tokens, the last one being a prefix
+        phrases = (' '.join(tokens) for tokens in words)
+        match = ' '.join(f'"{phrase}" *' for phrase in phrases)
+        return queryset.filter(pk__in=RawSQL(
+            f"SELECT tracker_id FROM {FTS_TABLE} WHERE {FTS_TABLE} MATCH %s",
+            [match]
+        ))
+
+    if vendor == 'postgresql':
+        # Full-text prefix match, or substrings served by the trigram index
+        tsquery = ' & '.join(
+            f"'{token}':*" for tokens in words for token in tokens)
+        patterns = [
+            '%' + word.replace('%', r'\%').replace('_', r'\_') + '%'
+            for word in query.split()
+        ]
+        substrings = ' AND '.join(
+            [f"({SEARCH_EXPRESSION}) ILIKE %s"] * len(patterns))
+        return queryset.filter(pk__in=RawSQL(
+            "SELECT id FROM trackers_tracker WHERE "
+            f"to_tsvector('simple', {SEARCH_EXPRESSION}) "
+            f"@@ to_tsquery('simple', %s) OR ({substrings})",
+            [tsquery] + patterns
+        ))
+
+    condition = Q()
+    for word in query.split():
+        condition &= Q(*(
+            Q(**{f'{field}__icontains': word}) for field in SEARCH_FIELDS
+        ), _connector=Q.OR)
+    return queryset.filter(condition)
+
+
+def index_tracker(tracker, using='default'):
+    if not _has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE tracker_id = %s", [tracker.pk.hex])
+        cursor.execute(
+            f"INSERT INTO {FTS_TABLE} (tracker_id, {', '.join(SEARCH_FIELDS)}) "
+            f"VALUES (%s{', %s' * len(SEARCH_FIELDS)})",
+            [tracker.pk.hex] + [getattr(tracker, f) for f in SEARCH_FIELDS]
+        )
+
+
+def unindex_tracker(tracker, using='default'):
+    if not _has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(
+            f"DELETE FROM {FTS_TABLE} WHERE tracker_id = %s", [tracker.pk.hex])
+
+
+def filter_name_prefix(queryset, prefix):
+    """
+    Filters the trackers whose name starts with prefix, ignoring case.
+    """
+    prefix = prefix.lower()
+    queryset = queryset.annotate(name_lower=Lower('name')).filter(
+        name_lower__startswith=prefix)
+    if connections[queryset.db].vendor == 'sqlite' and prefix \
+            and prefix[-1] != chr(sys.maxunicode):
+        # SQLite never uses an expression index for LIKE: bound the
+        # prefix with a range, exact with its binary collation
+        queryset = queryset.filter(
+            name_lower__gte=prefix,
+            name_lower__lt=prefix[:-1] + chr(ord(prefix[-1]) + 1))
+    return queryset
+
+
+def rebuild_search_index(using='default'):
+    """
+    Refills the SQLite index from the trackers table, after bulk inserts
+    that bypassed the signals. The PostgreSQL indexes need no rebuild.
+    """
+    if not _has_fts_table(using):
+        return
+    with connections[using].cursor() as cursor:
+        cursor.execute(f"DELETE FROM {FTS_TABLE}")
+        cursor.execute(SQLITE_FILL)
@@ -0,0 +1,49 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from trackers import jobs, search, versions
+from trackers.models import Category, Tracker, TrackerApproval
+
+
+@receiver(post_save)
+@receiver(post_delete)
+def bump_categories_version(sender, **kwargs):
+    if issubclass(sender, Category):
+        versions.bump_version(versions.CATEGORIES)
+        jobs.enqueue_on_commit(jobs.EXPORT)
+
+
+@receiver(post_save, sender=Tracker)
+def sync_indexed_fields(sender, instance, created, **kwargs):
+    instance.sync_api_key_ids(created=created)
+    instance.sync_signature_patterns(created=created)
+    search.index_tracker(instance, using=kwargs['using'])
+    versions.bump_version(versions.TRACKERS)
+    jobs.enqueue_on_commit(*jobs.CATALOGUE_JOBS)
+
+
+@receiver(post_delete, sender=Tracker)
+def unindex_tracker(sender, instance, **kwargs):
+    search.unindex_tracker(instance, using=kwargs['using'])
+    versions.bump_version(versions.TRACKERS)
+    jobs.enqueue_on_commit(*jobs.CATALOGUE_JOBS)
+
+
+def bump_trackers_version(sender, action, **kwargs):
+    if action in ('post_add', 'post_remove', 'post_clear'):
+        versions.bump_version(versions.TRACKERS)
+        jobs.enqueue_on_commit(*jobs.CATALOGUE_JOBS)
+
+
+for field in Tracker.CATEGORY_FIELDS:
+    m2m_changed.connect(
+        bump_trackers_version,
+        sender=Tracker._meta.get_field(field).remote_field.through,
+        dispatch_uid=f'bump_trackers_version_{field}'
+    )
+
+
+@receiver(post_save, sender=TrackerApproval)
+@receiver(post_delete, sender=TrackerApproval)
+def bump_approvals_version(sender, **kwargs):
+    versions.bump_version(versions.APPROVALS)
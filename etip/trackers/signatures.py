@@ -0,0 +1,173 @@
+"""
+Helpers to pre-process tracker signatures.
+
+Signatures are regular expressions, mostly written as alternations of
+package names or hostnames (`com.foo.|com.bar.`). Each branch of the
+alternation is indexed by its literal prefix: a value can only be matched
+by the branches whose prefix starts one of its segments.
+
+Unescaped dots are read as package separators when extracting prefixes,
+as signatures are written, and branches are expected to start at the
+beginning of a package or host segment.
+"""
+PREFIX_LENGTH = 50
+SEPARATORS = './'
+METACHARACTERS = '^$*+?{}[]()|\\'
+OPTIONAL_QUANTIFIERS = '*?{'
+
+
+def split_alternation(signature):
+    """
+    Splits a signature on its top-level `|`.
+    """
+    branches = []
+    current = []
+    depth = 0
+    in_class = False
+    escaped = False
+    for char in signature:
+        if escaped:
+            escaped = False
+        elif char == '\\':
+            escaped = True
+        elif in_class:
+            in_class = char != ']'
+        elif char == '[':
+            in_class = True
+        elif char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+        elif char == '|' and depth == 0:
+            branches.append(''.join(current))
+            current = []
+            continue
+        current.append(char)
+    branches.append(''.join(current))
+    return [branch for branch in branches if branch]
+
+
+def literal_prefix(pattern):
+    """
+    Returns the literal text every match of the pattern starts with,
+    truncated to PREFIX_LENGTH characters.
+    """
+    prefix = []
+    i = 1 if pattern.startswith('^') else 0
+    while i < len(pattern) and len(prefix) < PREFIX_LENGTH:
+        char = pattern[i]
+        if char == '\\':
+            if i + 1 >= len(pattern) or pattern[i + 1].isalnum():
+                break
+            char = pattern[i + 1]
+            step = 2
+        elif char in METACHARACTERS:
+            break
+        else:
+            step = 1
+
+        following = pattern[i + step:i + step + 1]
+        if following and following in OPTIONAL_QUANTIFIERS:
+            break
+        prefix.append(char)
+        if following == '+':
+            break
+        i += step
+    return ''.join(prefix)
+
+
+def _skip_class(pattern, i):
+    # Returns the position following the character class starting at i
+    j = i + 1
+    if pattern[j:j + 1] == '^':
+        j += 1
+    if pattern[j:j + 1] == ']':
+        j += 1
+    while j < len(pattern) and pattern[j] != ']':
+        j += 2 if pattern[j] == '\\' else 1
+    return j + 1
+
+
+def _skip_group(pattern, i):
+    # Returns the position following the group starting at i
+    depth = 0
+    j = i
+    while j < len(pattern):
+        char = pattern[j]
+        if char == '\\':
+            j += 2
+            continue
+        if char == '[':
+            j = _skip_class(pattern, j)
+            continue
+        if char == '(':
+            depth += 1
+        elif char == ')':
+            depth -= 1
+            if depth == 0:
+                return j + 1
+        j += 1
+    return j
+
+
+def literal_fragments(pattern):
+    """
+    Returns the literal texts every match of the pattern contains, for a
+    branch of a top-level alternation. Unescaped dots, classes, groups and
+    optional characters separate the fragments. Returns None when the
+    pattern sets flags, which may make it ignore case.
+    """
+    fragments = []
+    current = []
+    i = 0
+    while i < len(pattern):
+        char = pattern[i]
+        step = 1
+        literal = None
+        if char == '\\':
+            if i + 1 < len(pattern) and not pattern[i + 1].isalnum():
+                literal = pattern[i + 1]
+            step = 2
+        elif char == '[':
+            step = _skip_class(pattern, i) - i
+        elif char == '(':
+            if pattern[i + 1:i + 2] == '?' \
+                    and pattern[i + 2:i + 3] not in ('=', '!', '<', ':', 'P'):
+                return None
+            step = _skip_group(pattern, i) - i
+        elif char == '{':
+            end = pattern.find('}', i)
+            step = end + 1 - i if end != -1 else 1
+        elif char not in METACHARACTERS and char != '.':
+            literal = char
+
+        following = pattern[i + step:i + step + 1]
+        if literal is not None \
+                and not (following and following in OPTIONAL_QUANTIFIERS):
+            current.append(literal)
+            if following == '+':
+                fragments.append(''.join(current))
+                current = []
+        else:
+            fragments.append(''.join(current))
+            current = []
+        i += step
+    fragments.append(''.join(current))
+    return [fragment for fragment in fragments if fragment]
+
+
+def candidate_prefixes(value):
+    """
+    Returns every prefix a pattern matching the value could have been
+    indexed with.
+    """
+    starts = {0}
+    for i, char in enumerate(value):
+        if char in SEPARATORS:
+            starts.update((i, i + 1))
+
+    prefixes = {''}
+    for start in starts:
+        end = min(len(value), start + PREFIX_LENGTH)
+        prefixes.update(value[start:i] for i in range(start + 1, end + 1))
+    return prefixes
@@ -0,0 +1,324 @@
+"""
+Signature index shared by all the processes of a server.
+
+The index of the in-memory matcher is serialized into a snapshot file,
+which every worker maps read-only: the pages are shared by the operating
+system, so adding workers adds neither memory nor start-up time. The
+snapshot records the trackers version it was built for (its generation);
+the first worker to see a new version rebuilds the file, under a lock,
+and replaces it atomically, and every worker maps the new file as soon
+as it is written. Meanwhile, the other workers keep serving the previous
+generation instead of waiting for the lock.
+
+The versions must live in a cache shared by the workers (see
+etip/caches.py), otherwise each worker would rebuild the file for its
+own version.
+
+The file is made of, in order, little-endian:
+
+- the header: magic, generation length and the number of trackers,
+  entries, slots and collisions;
+- the generation;
+- the trackers, sorted by id: id, name offset and length;
+- the entries, grouped by signature kind and literal prefix: pattern
+  offset and length, tracker number;
+- the slots of an open addressing hash table of the groups: hash, key
+  offset and length, first entry and number of entries;
+- the collisions, sorted: kind number, tracker number, other tracker
+  number;
+- the strings, in UTF-8, the offsets being relative to their start.
+"""
+from collections import defaultdict
+import fcntl
+import mmap
+import os
+import re
+import struct
+import tempfile
+import uuid
+import zlib
+
+from trackers import versions
+from trackers.matcher import CODE, NETWORK, SIGNATURE_FIELDS, \
+    SignatureMatcher
+from trackers.signatures import candidate_prefixes
+
+MAGIC = b'ETIPSNP1'
+HEADER = struct.Struct('<8s5I')
+TRACKER = struct.Struct('<16s2I')
+ENTRY = struct.Struct('<3I')
+SLOT = struct.Struct('<5I')
+COLLISION = struct.Struct('<B2I')
+KINDS = [kind for kind, _ in SIGNATURE_FIELDS]
+
+
+class SnapshotError(Exception):
+    pass
+
+
+def _key(kind, prefix):
+    return f'{kind}:{prefix}'.encode()
+
+
+def _slot_count(groups):
+    # Power of two at most half full
+    size = 1
+    while size < 2 * groups:
+        size *= 2
+    return size
+
+
+class StringTable:
+    def __init__(self):
+        self.data = bytearray()
+        self.offsets = {}
+
+    def add(self, value):
+        encoded = value.encode() if isinstance(value, str) else value
+        if encoded not in self.offsets:
+            self.offsets[encoded] = len(self.data)
+            self.data += encoded
+        return self.offsets[encoded], len(encoded)
+
+
+def serialize(matcher):
+    """
+    Returns the snapshot of the index of a SignatureMatcher whose tracker
+    ids are UUIDs.
+    """
+    strings = StringTable()
+    ids = sorted(matcher.names, key=lambda tracker_id: tracker_id.bytes)
+    numbers = {tracker_id: i for i, tracker_id in enumerate(ids)}
+    trackers = b''.join(
+        TRACKER.pack(tracker_id.bytes, *strings.add(matcher.names[tracker_id]))
+        for tracker_id in ids
+    )
+
+    entries = []
+    groups = []
+    for (kind, prefix), patterns in sorted(matcher.index.items()):
+        key = _key(kind, prefix)
+        groups.append((key, len(entries), len(patterns)))
+        for regex, tracker_id in patterns:
+            entries.append(ENTRY.pack(
+                *strings.add(regex.pattern), numbers[tracker_id]))
+
+    slots = [None] * _slot_count(len(groups))
+    mask = len(slots) - 1
+    for key, first, count in groups:
+        hashed = zlib.crc32(key)
+        position = hashed & mask
+        while slots[position] is not None:
+            position = (position + 1) & mask
+        slots[position] = SLOT.pack(hashed, *strings.add(key), first, count)
+    empty = SLOT.pack(0, 0, 0, 0, 0)
+
+    collisions = sorted(
+        (kind_number, numbers[tracker_id], numbers[other])
+        for kind_number, kind in enumerate(KINDS)
+        for tracker_id, others in matcher.collisions(kind).items()
+        for other in others
+    )
+
+    generation = (matcher.version or '').encode()
+    return b''.join([
+        HEADER.pack(MAGIC, len(generation), len(ids), len(entries),
+                    len(slots), len(collisions)),
+        generation,
+        trackers,
+        b''.join(entries),
+        b''.join(slot or empty for slot in slots),
+        b''.join(COLLISION.pack(*collision) for collision in collisions),
+        bytes(strings.data),
+    ])
+
+
+class SnapshotMatcher:
+    """
+    Matcher reading the signature index from a snapshot, with the same
+    interface as SignatureMatcher.
+    """
+    def __init__(self, buffer):
+        self.buffer = buffer
+        if len(buffer) < HEADER.size:
+            raise SnapshotError('Truncated signature snapshot')
+        magic, generation_length, self.tracker_count, entry_count, \
+            slot_count, collision_count = HEADER.unpack_from(buffer)
+        if magic != MAGIC:
+            raise SnapshotError('Not a signature snapshot')
+
+        offset = HEADER.size
+        self.version = bytes(
+            buffer[offset:offset + generation_length]).decode() or None
+        offset += generation_length
+        self.trackers_offset = offset
+        self.entries_offset = offset = \
+            offset + self.tracker_count * TRACKER.size
+        self.slots_offset = offset = offset + entry_count * ENTRY.size
+        self.collisions_offset = offset = offset + slot_count * SLOT.size
+        self.strings_offset = offset + collision_count * COLLISION.size
+        if self.strings_offset > len(buffer):
+            raise SnapshotError('Truncated signature snapshot')
+        self.slot_mask = slot_count - 1
+        self.collision_count = collision_count
+        self._collisions = None
+        # Compiled patterns, dropped with the matcher of their generation
+        self._patterns = {}
+
+    @classmethod
+    def open(cls, path):
+        with open(path, 'rb') as f:
+            # The mapping stays valid after the file is closed or replaced
+            return cls(mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ))
+
+    def _string(self, offset, length):
+        start = self.strings_offset + offset
+        return bytes(self.buffer[start:start + length])
+
+    def _tracker(self, number):
+        raw_id, *name = TRACKER.unpack_from(
+            self.buffer, self.trackers_offset + number * TRACKER.size)
+        return uuid.UUID(bytes=raw_id), name
+
+    def _compile(self, pattern):
+        regex = self._patterns.get(pattern)
+        if regex is None:
+            regex = self._patterns[pattern] = re.compile(pattern)
+        return regex
+
+    def _group(self, kind, prefix):
+        key = _key(kind, prefix)
+        hashed = zlib.crc32(key)
+        position = hashed & self.slot_mask
+        while True:
+            slot_hash, key_offset, key_length, first, count = SLOT.unpack_from(
+                self.buffer, self.slots_offset + position * SLOT.size)
+            if not count:
+                return 0, 0
+            if slot_hash == hashed and \
+                    self._string(key_offset, key_length) == key:
+                return first, count
+            position = (position + 1) & self.slot_mask
+
+    def name(self, tracker_id):
+        raw_id = tracker_id.bytes
+        low, high = 0, self.tracker_count
+        while low < high:
+            middle = (low + high) // 2
+            offset = self.trackers_offset + middle * TRACKER.size
+            current = self.buffer[offset:offset + 16]
+            if current == raw_id:
+                _, (name_offset, name_length) = self._tracker(middle)
+                return self._string(name_offset, name_length).decode()
+            if current < raw_id:
+                low = middle + 1
+            else:
+                high = middle
+        raise KeyError(tracker_id)
+
+    def lookup(self, value, kinds=(CODE, NETWORK)):
+        """
+        Returns a dict of the trackers matching the value, mapped to the
+        set of signature kinds that matched.
+        """
+        matches = defaultdict(set)
+        for prefix in candidate_prefixes(value):
+            for kind in kinds:
+                first, count = self._group(kind, prefix)
+                for i in range(first, first + count):
+                    pattern_offset, pattern_length, number = ENTRY.unpack_from(
+                        self.buffer, self.entries_offset + i * ENTRY.size)
+                    tracker_id, _ = self._tracker(number)
+                    if kind in matches[tracker_id]:
+                        continue
+                    pattern = self._string(
+                        pattern_offset, pattern_length).decode()
+                    if self._compile(pattern).search(value):
+                        matches[tracker_id].add(kind)
+        return {
+            tracker_id: found for tracker_id, found in matches.items() if found
+        }
+
+    def collisions(self, kind):
+        """
+        Returns a dict of the tracker ids whose signature of the given kind
+        is found in the signature of other trackers, mapped to the set of
+        those trackers ids.
+        """
+        if self._collisions is None:
+            self._collisions = {kind: {} for kind in KINDS}
+            for i in range(self.collision_count):
+                kind_number, number, other = COLLISION.unpack_from(
+                    self.buffer, self.collisions_offset + i * COLLISION.size)
+                tracker_id, _ = self._tracker(number)
+                self._collisions[KINDS[kind_number]].setdefault(
+                    tracker_id, set()).add(self._tracker(other)[0])
+        return self._collisions[kind]
+
+    colliding_trackers = SignatureMatcher.colliding_trackers
+    colliding_ids = SignatureMatcher.colliding_ids
+
+
+def read_generation(path):
+    """
+    Returns the generation of the snapshot file, or None when it is
+    missing or invalid.
+    """
+    try:
+        with open(path, 'rb') as f:
+            header = f.read(HEADER.size)
+            if len(header) < HEADER.size:
+                return None
+            magic, generation_length, *_ = HEADER.unpack(header)
+            if magic != MAGIC:
+                return None
+            return f.read(generation_length).decode()
+    except OSError:
+        return None
+
+
+def write_snapshot(matcher, path):
+    """
+    Writes the snapshot of the matcher, replacing the file atomically so
+    that readers never see it partially written.
+    """
+    directory = os.path.dirname(os.path.abspath(path))
+    fd, temporary = tempfile.mkstemp(dir=directory, prefix='.snapshot-')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(serialize(matcher))
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, path)
+    except BaseException:
+        os.unlink(temporary)
+        raise
+
+
+def load_or_build(path, version, previous=None):
+    """
+    Returns the matcher of the snapshot at path for the given trackers
+    version, building the snapshot first when it has another generation.
+
+    While another process builds it, the previous matcher, or else the
+    snapshot of the previous generation, is returned instead of waiting:
+    only a worker with nothing to serve waits for the build.
+    """
+    if read_generation(path) == version:
+        return SnapshotMatcher.open(path)
+
+    with open(f'{path}.lock', 'a') as lock:
+        try:
+            fcntl.flock(lock, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            if previous is not None:
+                return previous
+            if read_generation(path) is not None:
+                return SnapshotMatcher.open(path)
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        # Another process may have built it before we got the lock
+        if read_generation(path) != version:
+            # Never with the previous collisions, while their job is pending
+            with versions.fresh_results():
+                write_snapshot(SignatureMatcher.build(version), path)
+    return SnapshotMatcher.open(path)
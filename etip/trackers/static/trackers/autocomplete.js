@@ -0,0 +1,36 @@
+// Suggests tracker names for the inputs having a data-autocomplete-url
+(function () {
+  function attach (input) {
+    var list = document.createElement('datalist')
+    var controller = null
+
+    list.id = input.id + 'Suggestions'
+    input.setAttribute('list', list.id)
+    input.setAttribute('autocomplete', 'off')
+    input.parentNode.appendChild(list)
+
+    input.addEventListener('input', function () {
+      if (controller) {
+        controller.abort()
+      }
+      if (!input.value) {
+        list.replaceChildren()
+        return
+      }
+      controller = new AbortController()
+      fetch(input.dataset.autocompleteUrl + '?q=' + encodeURIComponent(input.value), {
+        signal: controller.signal
+      }).then(function (response) {
+        return response.json()
+      }).then(function (data) {
+        list.replaceChildren.apply(list, data.names.map(function (name) {
+          var option = document.createElement('option')
+          option.value = name
+          return option
+        }))
+      }).catch(function () {})
+    })
+  }
+
+  document.querySelectorAll('[data-autocomplete-url]').forEach(attach)
+})()
@@ -0,0 +1,19 @@
+// Loads the sections of the page having a data-fragment-url
+(function () {
+  function load (element) {
+    fetch(element.dataset.fragmentUrl, {
+      credentials: 'same-origin'
+    }).then(function (response) {
+      if (!response.ok) {
+        throw new Error(response.statusText)
+      }
+      return response.text()
+    }).then(function (html) {
+      element.innerHTML = html
+    }).catch(function () {
+      element.textContent = 'Unable to load this section.'
+    })
+  }
+
+  document.querySelectorAll('[data-fragment-url]').forEach(load)
+})()
@@ -1,6 +1,7 @@
 from django import template
 from django.template.defaultfilters import stringfilter
-import markdown as md
+
+from trackers.rendering import render_markdown
 
 register = template.Library()
 
@@ -8,4 +9,4 @@ register = template.Library()
 @register.filter()
 @stringfilter
 def markdown(value):
-    return md.markdown(value, extensions=['markdown.extensions.fenced_code'])
+    return render_markdown(value)
@@ -4,10 +4,13 @@ register = template.Library()
 
 
 @register.simple_tag(takes_context=True)
-def url_replace(context, field, value):
+def url_replace(context, field, value, *removed):
     """
-    Utility function to replace the value of a specified parameter in URL
+    Utility function to replace the value of a specified parameter in URL,
+    removing the other given parameters
     """
     get_dict = context['request'].GET.copy()
     get_dict[field] = value
+    for name in removed:
+        get_dict.pop(name, None)
     return get_dict.urlencode()
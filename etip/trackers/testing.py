@@ -0,0 +1,56 @@
+"""
+Query budgets of the views, shared by the test modules of the apps.
+"""
+from abc import ABC, abstractmethod
+
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+
+from trackers import benchmark
+from trackers.models import Tracker
+
+
+class QueryBudgetMixin(ABC):
+    """
+    Checks that every request of budgets() runs at most its number of
+    queries on an empty cache, on a catalogue of each of the SIZES. The
+    largest size fills more than a page of the lists, so that a query per
+    listed tracker cannot fit in the budgets.
+    """
+    SIZES = (10, 60)
+
+    @abstractmethod
+    def budgets(self, tracker):
+        """
+        Returns the (name, method, path, data, authenticated, budget) of
+        the checked requests. tracker is a tracker of the catalogue.
+        """
+
+    def test_query_budgets(self):
+        anonymous = Client()
+        authenticated = Client()
+        authenticated.force_login(User.objects.create_superuser(
+            'budget', password=None))
+
+        generated = 0
+        tracker = None
+        for size in self.SIZES:
+            benchmark.generate_catalogue(size - generated, seed=size)
+            generated = size
+            if tracker is None:
+                tracker = Tracker.objects.order_by('name').first()
+
+            for name, method, path, data, login, budget in \
+                    self.budgets(tracker):
+                client = authenticated if login else anonymous
+                cache.clear()
+                with CaptureQueriesContext(connection) as queries:
+                    response = getattr(client, method)(path, data)
+
+                with self.subTest(request=name, size=size):
+                    self.assertLess(response.status_code, 400)
+                    sql = '\n'.join(query['sql'] for query in queries)
+                    self.assertLessEqual(len(queries), budget, sql)
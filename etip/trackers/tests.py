@@ -1,15 +1,42 @@
+from datetime import timedelta
+import fcntl
 from io import BytesIO, StringIO
+import json
+import os
+import tempfile
+import time
+from unittest import skipUnless
 from unittest.mock import patch
 
+from django.conf import settings
 from django.contrib.auth.models import User
+from django.core.cache import cache
 from django.core.exceptions import PermissionDenied, ValidationError
 from django.core.management import call_command
 from django.core.management.base import CommandError
-from django.test import Client, RequestFactory, TestCase
-
-from .models import Advertising, Analytic, Capability, \
-    Network, Tracker, TrackerApproval, TrackerCategory
-from .views import approve, revoke, ship
+from django.db import connection, IntegrityError, transaction
+from django.http import HttpResponse
+from django.test import Client, override_settings, RequestFactory, TestCase
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from django.utils.http import http_date
+from etip.caches import caches_from_env
+from etip.replicas import read_from_replica, ReplicaMiddleware, ReplicaRouter
+import reversion
+
+from . import benchmark, jobs, matcher as matcher_module, pagination, \
+    snapshot, versions
+from .category_cache import attach_category_ids
+from .facets import compute_facets
+from .matcher import SignatureMatcher
+from .models import Advertising, Analytic, Capability, Category, Job, \
+    Network, SignaturePattern, Tracker, TrackerApproval, TrackerCategory
+from .name_index import NameIndex
+from .search import search_trackers
+from .signatures import literal_fragments, literal_prefix, \
+    split_alternation
+from .testing import QueryBudgetMixin
+from .views import approve, revoke, ship, with_approval_count
 
 
 class TrackerModelTests(TestCase):
@@ -157,6 +184,42 @@ class TrackerModelTests(TestCase):
         except ValidationError:
             self.fail("full_clean() raised unexpectedly")
 
+    def test_clean_fields_skips_unchanged_documentation(self):
+        tracker = Tracker.objects.create(
+            name="tracker1",
+            website="http://example.com",
+            documentation="not_a_link"
+        )
+        tracker = Tracker.objects.get(pk=tracker.pk)
+
+        try:
+            tracker.full_clean()
+        except ValidationError:
+            self.fail("full_clean() raised unexpectedly")
+
+        tracker.documentation = "still_not_a_link"
+        with self.assertRaisesRegex(ValidationError, "Invalid URL"):
+            tracker.full_clean()
+
+    def test_api_key_ids_are_indexed(self):
+        tracker = Tracker.objects.create(
+            name="tracker1",
+            api_key_ids="key1, key2 key1"
+        )
+
+        self.assertEqual(
+            sorted(tracker.api_key_id_entries.values_list('key_id', flat=True)),
+            ['key1', 'key2']
+        )
+
+        tracker.api_key_ids = "key3"
+        tracker.save()
+
+        self.assertEqual(
+            list(tracker.api_key_id_entries.values_list('key_id', flat=True)),
+            ['key3']
+        )
+
     def test_any_signature_collision_with_code_signature_one(self):
         existing_tracker = Tracker(
             name="toto",
@@ -451,6 +514,362 @@ class TrackerModelTests(TestCase):
         self.assertEqual(tracker.creator(), None)
 
 
+class CategoryModelTests(TestCase):
+
+    def test_kind_is_set_from_proxy_model(self):
+        capability = Capability.objects.create(name='cap')
+        network = Network.objects.create(name='net')
+
+        self.assertEqual(capability.kind, Category.CAPABILITY)
+        self.assertEqual(network.kind, Category.NETWORK)
+
+    def test_proxy_models_only_see_their_kind(self):
+        Capability.objects.create(name='cap')
+        Advertising.objects.create(name='ad')
+
+        self.assertEqual(
+            list(Capability.objects.values_list('name', flat=True)), ['cap'])
+        self.assertEqual(
+            list(Advertising.objects.values_list('name', flat=True)), ['ad'])
+        self.assertEqual(Category.objects.count(), 2)
+
+    def test_tracker_relations_only_see_their_kind(self):
+        tracker = Tracker.objects.create(name='tracker1')
+        capability = Capability.objects.create(name='cap')
+        tracker.capability.add(capability)
+
+        self.assertEqual(list(tracker.capability.all()), [capability])
+        self.assertEqual(list(tracker.network.all()), [])
+
+
+class CategoryCacheTests(TestCase):
+
+    def setUp(self):
+        self.tracker = Tracker.objects.create(name='tracker1')
+        self.category = TrackerCategory.objects.create(name='Ads')
+        self.tracker.category.add(
+            self.category, TrackerCategory.objects.create(name='Analytics'))
+
+    def test_names_are_resolved_without_category_table(self):
+        self.tracker.category_names()
+
+        with self.assertNumQueries(1):
+            names = self.tracker.category_names()
+
+        self.assertEqual(names, ['Ads', 'Analytics'])
+
+    def test_renamed_category_invalidates_cache(self):
+        self.tracker.category_names()
+
+        self.category.name = 'Advertisement'
+        self.category.save()
+
+        self.assertEqual(
+            self.tracker.category_names(), ['Advertisement', 'Analytics'])
+
+    def test_attached_ids_avoid_queries(self):
+        trackers = attach_category_ids(
+            Tracker.objects.all(), Tracker.CATEGORY_FIELDS)
+        trackers[0].category_names()
+
+        with self.assertNumQueries(0):
+            self.assertEqual(
+                trackers[0].category_names(), ['Ads', 'Analytics'])
+            trackers[0].progress()
+            trackers[0].missing_fields()
+
+
+class SignaturePatternTests(TestCase):
+
+    def test_split_alternation_keeps_groups_and_classes(self):
+        self.assertEqual(
+            split_alternation('com.a|com.(b|c)|[|]d|e\\|f'),
+            ['com.a', 'com.(b|c)', '[|]d', 'e\\|f']
+        )
+
+    def test_literal_prefix(self):
+        self.assertEqual(literal_prefix('com.foo.bar'), 'com.foo.bar')
+        self.assertEqual(literal_prefix('^com\\.foo\\.'), 'com.foo.')
+        self.assertEqual(literal_prefix('com.fo*o'), 'com.f')
+        self.assertEqual(literal_prefix('ab+c'), 'ab')
+        self.assertEqual(literal_prefix('.*\\.doubleclick\\.net'), '')
+
+    def test_literal_fragments(self):
+        self.assertEqual(literal_fragments('com.t1.ads'), ['com', 't1', 'ads'])
+        self.assertEqual(
+            literal_fragments('.*\\.doubleclick\\.net'), ['.doubleclick.net'])
+        self.assertEqual(literal_fragments('ab+c'), ['ab', 'c'])
+        self.assertEqual(
+            literal_fragments('a(bc|d)?efg[xyz]{2,3}hij\\d{2}kl'),
+            ['a', 'efg', 'hij', 'kl'])
+        self.assertIsNone(literal_fragments('(?i)abc'))
+
+    def test_patterns_follow_signatures(self):
+        tracker = Tracker.objects.create(
+            name='tracker1',
+            code_signature='com.t1.ads|com.t1.analytics',
+            network_signature='t1\\.com'
+        )
+
+        self.assertEqual(
+            sorted(tracker.signature_patterns.values_list('kind', 'prefix')),
+            [('code', 'com.t1.ads'), ('code', 'com.t1.analytics'),
+             ('network', 't1.com')]
+        )
+
+        tracker.code_signature = 'com.t1.sdk'
+        tracker.save()
+
+        self.assertEqual(
+            sorted(tracker.signature_patterns.values_list('kind', 'prefix')),
+            [('code', 'com.t1.sdk'), ('network', 't1.com')]
+        )
+
+    def test_matching_patterns(self):
+        tracker1 = Tracker.objects.create(
+            name='tracker1', code_signature='com.t1.ads|com.t1.analytics')
+        Tracker.objects.create(name='tracker2', code_signature='com.t2.')
+        tracker3 = Tracker.objects.create(name='tracker3', code_signature='ads.')
+
+        patterns = SignaturePattern.objects.filter(
+            kind=SignaturePattern.CODE).matching('com.t1.ads.Foo')
+
+        self.assertEqual(
+            sorted((p.tracker_id, p.pattern) for p in patterns),
+            sorted([(tracker1.id, 'com.t1.ads'), (tracker3.id, 'ads.')])
+        )
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_candidates_use_the_prefix_index(self):
+        plan = SignaturePattern.objects.candidates('com.t1.ads.Foo').explain()
+
+        self.assertIn('trackers_si_prefix_bf02d6_idx', plan)
+        self.assertNotIn('SCAN', plan)
+
+
+class SignatureMatcherTests(TestCase):
+
+    def test_lookup_package_and_host(self):
+        matcher = SignatureMatcher([
+            (1, 'tracker1', 'com.t1.ads|com.t1.analytics', 't1\\.com'),
+            (2, 'tracker2', 'com.t2.', 'ads\\.t2\\.net'),
+            (3, 'tracker3', 'analytics.', ''),
+        ])
+
+        self.assertEqual(
+            matcher.lookup('com.t1.analytics.Event'),
+            {1: {'code'}, 3: {'code'}}
+        )
+        self.assertEqual(matcher.lookup('api.t1.com'), {1: {'network'}})
+        self.assertEqual(matcher.lookup('com.t3.Foo'), {})
+
+    def test_collisions(self):
+        matcher = SignatureMatcher([
+            (1, 'tracker1', 'com.t1.ads', 't1\\.com'),
+            (2, 'tracker2', 'com.t1.', 'ads.t1.com'),
+            (3, 'tracker3', 'com.t3.', ''),
+            (4, 'tracker4', 'com.t3.ads', '^t1'),
+        ])
+
+        self.assertEqual(matcher.collisions('code'), {2: {1}, 3: {4}})
+        self.assertEqual(matcher.collisions('network'), {1: {2}})
+        self.assertEqual(matcher.colliding_ids(), {1, 2, 3})
+
+    def test_collisions_with_wildcards(self):
+        matcher = SignatureMatcher([
+            (1, 'tracker1', 'com.t1.', '.*\\.doubleclick\\.net'),
+            (2, 'tracker2', 'comXt1Yz', 'ad.doubleclick.net'),
+            (3, 'tracker3', '(?i)ABCDEF', '[a-z]+\\.io'),
+            (4, 'tracker4', 'xabcdefy', 'foo.io'),
+        ])
+
+        self.assertEqual(matcher.collisions('code'), {1: {2}, 3: {4}})
+        self.assertEqual(matcher.collisions('network'), {1: {2}, 3: {4}})
+
+    def test_lookup_before_the_matcher_is_built(self):
+        self.addCleanup(setattr, matcher_module, '_matcher', None)
+        matcher_module._matcher = None
+        tracker1 = Tracker.objects.create(
+            name='tracker1', code_signature='com.t1.|com.(t1',
+            network_signature='t1\\.com')
+        tracker2 = Tracker.objects.create(
+            name='tracker2', code_signature='com.t1.ads')
+
+        self.assertEqual(
+            matcher_module.lookup('com.t1.ads.Foo'),
+            [(tracker1.id, 'tracker1', ['code']),
+             (tracker2.id, 'tracker2', ['code'])])
+        self.assertEqual(
+            matcher_module.lookup('t1.com'),
+            [(tracker1.id, 'tracker1', ['network'])])
+        self.assertIsNone(matcher_module._matcher)
+
+        matcher_module.get_matcher()
+        self.assertEqual(
+            matcher_module.lookup('com.t1.ads.Foo'),
+            [(tracker1.id, 'tracker1', ['code']),
+             (tracker2.id, 'tracker2', ['code'])])
+
+    def test_invalid_patterns_are_ignored(self):
+        matcher = SignatureMatcher([(1, 'tracker1', 'com.(t1', '')])
+
+        self.assertEqual(matcher.lookup('com.(t1'), {})
+
+    def test_lookup_view(self):
+        tracker = Tracker.objects.create(
+            name='tracker1', code_signature='com.t1.', website='https://t1')
+
+        c = Client()
+        response = c.get('/trackers/lookup', {'value': 'com.t1.Foo'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['matches'], [(tracker.id, 'tracker1', ['code'])])
+
+        tracker.code_signature = 'com.tracker1.'
+        tracker.save()
+        response = c.get('/trackers/lookup', {'value': 'com.t1.Foo'})
+
+        self.assertEqual(response.context['matches'], [])
+
+
+class SignatureSnapshotTests(TestCase):
+
+    def setUp(self):
+        # Collisions are cached by trackers version
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'signatures.snapshot')
+        self.tracker1 = Tracker.objects.create(
+            name='tracker1', code_signature='com.t1.ads|com.t1.analytics',
+            network_signature='t1\\.com')
+        self.tracker2 = Tracker.objects.create(
+            name='tracker2', code_signature='com.t1.', network_signature='')
+        self.tracker3 = Tracker.objects.create(
+            name='tracker3', code_signature='analytics.',
+            network_signature='ads.t1.com')
+
+    def test_same_results_as_the_matcher(self):
+        matcher = SignatureMatcher.build('v1')
+        snapshot.write_snapshot(matcher, self.path)
+        snapshot_matcher = snapshot.SnapshotMatcher.open(self.path)
+
+        self.assertEqual(snapshot_matcher.version, 'v1')
+        for value in ('com.t1.analytics.Event', 'api.t1.com', 'com.t3.Foo',
+                      'analytics.Foo', ''):
+            self.assertEqual(
+                snapshot_matcher.lookup(value), matcher.lookup(value))
+        for kind in ('code', 'network'):
+            self.assertEqual(
+                snapshot_matcher.collisions(kind), matcher.collisions(kind))
+            self.assertEqual(
+                snapshot_matcher.colliding_trackers(self.tracker2.id, kind),
+                matcher.colliding_trackers(self.tracker2.id, kind))
+        self.assertEqual(snapshot_matcher.colliding_ids(),
+                         {self.tracker2.id, self.tracker1.id})
+        self.assertEqual(snapshot_matcher.name(self.tracker3.id), 'tracker3')
+
+    def test_rebuilt_for_a_new_generation(self):
+        first = snapshot.load_or_build(self.path, 'v1')
+        self.assertEqual(first.version, 'v1')
+        self.assertEqual(snapshot.read_generation(self.path), 'v1')
+
+        with CaptureQueriesContext(connection) as queries:
+            snapshot.load_or_build(self.path, 'v1')
+        self.assertEqual(len(queries), 0)
+
+        self.tracker2.code_signature = 'com.t2.'
+        self.tracker2.save()
+        second = snapshot.load_or_build(self.path, 'v2')
+
+        self.assertEqual(second.version, 'v2')
+        self.assertEqual(second.lookup('com.t1.Foo'), {})
+        # The previous mapping stays readable by the requests using it
+        self.assertEqual(
+            first.lookup('com.t1.Foo'), {self.tracker2.id: {'code'}})
+
+    def test_previous_generation_served_while_building(self):
+        first = snapshot.load_or_build(self.path, 'v1')
+        with open(f'{self.path}.lock', 'a') as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            # flock locks belong to the open file, as if another process held it
+            with CaptureQueriesContext(connection) as queries:
+                self.assertIs(
+                    snapshot.load_or_build(self.path, 'v2', first), first)
+                stale = snapshot.load_or_build(self.path, 'v2')
+            self.assertEqual(len(queries), 0)
+            self.assertEqual(stale.version, 'v1')
+
+        self.assertEqual(snapshot.load_or_build(self.path, 'v2').version, 'v2')
+
+    def test_get_matcher_reads_the_snapshot(self):
+        self.addCleanup(setattr, matcher_module, '_matcher', None)
+        with override_settings(SIGNATURE_SNAPSHOT_PATH=self.path):
+            matcher_module._matcher = None
+            shared_matcher = matcher_module.get_matcher()
+
+            self.assertIsInstance(shared_matcher, snapshot.SnapshotMatcher)
+            self.assertEqual(
+                matcher_module.lookup('com.t1.ads.Foo'),
+                [(self.tracker1.id, 'tracker1', ['code']),
+                 (self.tracker2.id, 'tracker2', ['code'])])
+
+            self.tracker3.delete()
+            self.assertNotEqual(
+                snapshot.read_generation(self.path),
+                versions.get_version(versions.TRACKERS))
+            matcher_module.get_matcher()
+            self.assertEqual(
+                snapshot.read_generation(self.path),
+                versions.get_version(versions.TRACKERS))
+            self.assertEqual(matcher_module.lookup('analytics.Foo'), [])
+
+    def test_invalid_file(self):
+        with open(self.path, 'wb') as f:
+            f.write(b'not a snapshot')
+
+        self.assertIsNone(snapshot.read_generation(self.path))
+        with self.assertRaises(snapshot.SnapshotError):
+            snapshot.SnapshotMatcher(b'not a snapshot, long enough')
+
+
+class NameIndexTests(TestCase):
+
+    def test_complete_is_case_insensitive_and_sorted(self):
+        index = NameIndex(['Google Ads', 'google analytics', 'Facebook', 'Go'])
+
+        self.assertEqual(
+            index.complete('goo'), ['Google Ads', 'google analytics'])
+        self.assertEqual(index.complete('GO', limit=2), ['Go', 'Google Ads'])
+        self.assertEqual(index.complete('x'), [])
+
+    def test_autocomplete_view(self):
+        Tracker.objects.create(name='Google Ads')
+        Tracker.objects.create(name='Facebook')
+
+        c = Client()
+        response = c.get('/trackers/autocomplete', {'q': 'goo'})
+
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'names': ['Google Ads']})
+
+        Tracker.objects.create(name='Google Firebase')
+        response = c.get('/trackers/autocomplete', {'q': 'goo'})
+
+        self.assertEqual(
+            response.json(), {'names': ['Google Ads', 'Google Firebase']})
+
+    def test_admin_changelist_loads_autocomplete(self):
+        User.objects.create_superuser('admin', 'admin@mail.com', 'password')
+        c = Client()
+        c.login(username='admin', password='password')
+
+        response = c.get('/admin/trackers/tracker/')
+
+        self.assertContains(response, '/trackers/autocomplete')
+
+
 class IndexTrackerListViewTests(TestCase):
     def test_with_trackers(self):
         tracker_1 = Tracker(
@@ -500,6 +919,56 @@ class IndexTrackerListViewTests(TestCase):
         self.assertNotContains(response, tracker_2.name)
         self.assertEqual(response.context['count'], 1)
 
+    def test_with_name_prefix_ignoring_case(self):
+        Tracker.objects.create(name='Matching tracker', website='https://t1')
+        Tracker.objects.create(name='Mat', website='https://t2')
+        Tracker.objects.create(name='Other tracker', website='https://t3')
+
+        response = Client().get('/trackers/all', {'tracker_name': 'mATCH'})
+
+        self.assertEqual(
+            [tracker.name for tracker in response.context['trackers']],
+            ['Matching tracker'])
+
+    def test_with_full_text_search(self):
+        tracker_1 = Tracker.objects.create(
+            name='Tracker One',
+            code_signature='com.vendor.sdk',
+            website='https://website1'
+        )
+        tracker_2 = Tracker.objects.create(
+            name='Tracker Two',
+            description='Another vendor',
+            code_signature='com.other',
+            website='https://website2',
+        )
+
+        c = Client()
+        response = c.get('/trackers/all', {'q': 'com.vend'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(list(response.context['trackers']), [tracker_1])
+
+        response = c.get('/trackers/all', {'q': 'vendor'})
+        self.assertEqual(
+            list(response.context['trackers']), [tracker_1, tracker_2])
+
+        response = c.get('/trackers/all', {'q': 'two vend'})
+        self.assertEqual(list(response.context['trackers']), [tracker_2])
+
+    def test_full_text_search_follows_updates(self):
+        tracker = Tracker.objects.create(
+            name='tracker1', network_signature='old.example')
+
+        tracker.network_signature = 'new.example'
+        tracker.save()
+
+        self.assertFalse(search_trackers(Tracker.objects.all(), 'old').exists())
+        self.assertTrue(search_trackers(Tracker.objects.all(), 'new').exists())
+
+        tracker.delete()
+
+        self.assertFalse(search_trackers(Tracker.objects.all(), 'new').exists())
+
     def test_with_only_collisions_filter(self):
         tracker_1 = Tracker(
             name='match_name_tracker_1',
@@ -673,6 +1142,119 @@ class IndexTrackerListViewTests(TestCase):
         self.assertEqual(response.context['count'], 25)
         self.assertEqual(len(response.context['trackers']), 5)
 
+    def test_with_cursor_pagination(self):
+        for i in range(0, 45):
+            Tracker(name=f'AcTracker_name_{i:02}').save()
+
+        c = Client()
+        response = c.get('/trackers/all')
+        first_page = [t.name for t in response.context['trackers']]
+        self.assertEqual(first_page[0], 'AcTracker_name_00')
+        self.assertEqual(len(first_page), 20)
+        self.assertFalse(response.context['trackers'].has_previous)
+
+        cursor = response.context['trackers'].next_cursor
+        response = c.get('/trackers/all', {'cursor': cursor})
+        self.assertEqual(
+            response.context['trackers'][0].name, 'AcTracker_name_20')
+        self.assertEqual(response.context['count'], 45)
+
+        cursor = response.context['trackers'].next_cursor
+        response = c.get('/trackers/all', {'cursor': cursor})
+        self.assertEqual(len(response.context['trackers']), 5)
+        self.assertFalse(response.context['trackers'].has_next)
+
+        cursor = response.context['trackers'].previous_cursor
+        response = c.get('/trackers/all', {'cursor': cursor})
+        self.assertEqual(
+            response.context['trackers'][0].name, 'AcTracker_name_20')
+        self.assertTrue(response.context['trackers'].has_previous)
+        self.assertTrue(response.context['trackers'].has_next)
+
+        cursor = response.context['trackers'].previous_cursor
+        response = c.get('/trackers/all', {'cursor': cursor})
+        self.assertEqual(
+            [t.name for t in response.context['trackers']], first_page)
+        self.assertFalse(response.context['trackers'].has_previous)
+
+    def test_with_last_and_invalid_cursor(self):
+        for i in range(0, 25):
+            Tracker(name=f'AcTracker_name_{i:02}').save()
+
+        c = Client()
+        response = c.get('/trackers/all', {'cursor': 'last'})
+        self.assertEqual(
+            [t.name for t in response.context['trackers']],
+            [f'AcTracker_name_{i:02}' for i in range(5, 25)]
+        )
+        self.assertTrue(response.context['trackers'].has_previous)
+        self.assertFalse(response.context['trackers'].has_next)
+
+        response = c.get('/trackers/all', {'cursor': 'not a cursor'})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            response.context['trackers'][0].name, 'AcTracker_name_00')
+
+        for values in (['a', 'nope'], [None, None], [1, 2], ['a\x00', None]):
+            cursor = pagination.encode_cursor('next', values)
+            response = c.get('/trackers/all', {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                response.context['trackers'][0].name, 'AcTracker_name_00')
+
+    def test_empty_pages_replaced(self):
+        trackers = [
+            Tracker.objects.create(name=f'AcTracker_name_{i:02}')
+            for i in range(25)
+        ]
+        c = Client()
+        response = c.get('/trackers/all')
+        next_cursor = response.context['trackers'].next_cursor
+        previous_cursor = pagination.encode_cursor(
+            'previous', ['AcTracker_name_00', str(trackers[0].pk)])
+        for tracker in trackers[20:]:
+            tracker.delete()
+        last_page = [f'AcTracker_name_{i:02}' for i in range(20)]
+
+        for params in ({'page': 9}, {'cursor': next_cursor}):
+            response = c.get('/trackers/all', params)
+            page = response.context['trackers']
+            self.assertEqual([t.name for t in page], last_page)
+            self.assertFalse(page.has_previous)
+            self.assertIsNone(page.next_cursor)
+
+        response = c.get('/trackers/all', {'cursor': previous_cursor})
+        page = response.context['trackers']
+        self.assertEqual([t.name for t in page], last_page)
+        self.assertIsNone(page.previous_cursor)
+
+        empty = pagination.KeysetPage([], pagination.NAME_ORDERING, True, True)
+        self.assertIsNone(empty.previous_cursor)
+        self.assertIsNone(empty.next_cursor)
+
+    def test_cursor_links_drop_the_page(self):
+        for i in range(0, 45):
+            Tracker(name=f'AcTracker_name_{i:02}').save()
+
+        response = Client().get('/trackers/all', {'page': 2})
+
+        self.assertEqual(
+            response.context['trackers'][0].name, 'AcTracker_name_20')
+        self.assertContains(response, 'href="?cursor=">First')
+        self.assertContains(response, 'href="?cursor=last">Last')
+        self.assertNotContains(response, 'page=2')
+
+    def test_count_follows_changes(self):
+        Tracker(name='AcTracker_name_1').save()
+
+        c = Client()
+        response = c.get('/trackers/all', {'tracker_name': 'Ac'})
+        self.assertEqual(response.context['count'], 1)
+
+        Tracker(name='AcTracker_name_2').save()
+        response = c.get('/trackers/all', {'tracker_name': 'Ac'})
+        self.assertEqual(response.context['count'], 2)
+
 
 class IndexTrackerApprovalTests(TestCase):
 
@@ -779,6 +1361,131 @@ class IndexTrackerApprovalTests(TestCase):
         self.assertContains(response, self.tracker_1.name)
         self.assertEqual(response.context['count'], 1)
 
+    def test_cached_rows_follow_changes(self):
+        response = self.c.get('/trackers/all')
+        self.assertContains(response, '<b>Not analyzed</b>', 2)
+
+        with CaptureQueriesContext(connection) as queries:
+            self.c.get('/trackers/all')
+        approval_queries = [
+            q for q in queries if '"trackers_trackerapproval"' in q['sql']]
+        self.assertEqual(len(approval_queries), 1)
+
+        self.tracker_2.exodus_matches = 1
+        self.tracker_2.save()
+        TrackerApproval.objects.create(
+            approver=self.user_1, tracker=self.tracker_2)
+        TrackerApproval.objects.create(
+            approver=self.user_2, tracker=self.tracker_2)
+        response = self.c.get('/trackers/all')
+        self.assertContains(response, '<b>Approved</b>')
+
+        category = TrackerCategory.objects.create(name='Crash reporting')
+        self.tracker_1.category.add(category)
+        response = self.c.get('/trackers/all')
+        self.assertContains(response, 'Crash reporting</span>')
+
+    def test_row_version_of_each_tracker(self):
+        other = Tracker.objects.create(name='other', code_signature='other.')
+
+        def row_versions():
+            response = self.c.get('/trackers/all')
+            return {
+                tracker.pk: tracker.row_version
+                for tracker in response.context['trackers']
+            }
+
+        before = row_versions()
+        other.code_signature = 'other.sdk'
+        other.save()
+        after = row_versions()
+        self.assertEqual(after[self.tracker_1.pk], before[self.tracker_1.pk])
+        self.assertEqual(after[self.tracker_2.pk], before[self.tracker_2.pk])
+
+        self.tracker_1.code_signature = 'other.'
+        self.tracker_1.save()
+        before = row_versions()
+        other.name = 'renamed'
+        other.save()
+        after = row_versions()
+        self.assertNotEqual(after[self.tracker_1.pk], before[self.tracker_1.pk])
+        self.assertEqual(after[self.tracker_2.pk], before[self.tracker_2.pk])
+
+    def test_facets(self):
+        category = TrackerCategory.objects.create(name='Ads')
+        TrackerCategory.objects.create(name='Analytics')
+        self.tracker_1.category.add(category)
+        Tracker.objects.create(
+            name='shipped', code_signature='shipped.com', is_in_exodus=True,
+            needs_rework=True)
+        TrackerApproval.objects.create(
+            approver=self.user_1, tracker=self.tracker_1)
+        TrackerApproval.objects.create(
+            approver=self.user_1, tracker=self.tracker_2)
+        TrackerApproval.objects.create(
+            approver=self.user_2, tracker=self.tracker_2)
+        self.tracker_2.exodus_matches = 3
+        self.tracker_2.save()
+
+        response = self.c.get('/trackers/all')
+        facets = response.context['facets']
+        self.assertEqual(facets['exodus'], 1)
+        self.assertEqual(facets['etip'], 2)
+        self.assertEqual(facets['needs_rework'], 1)
+        self.assertEqual(facets['approvals'], {
+            'no_approvals': 1, 'need_review': 1, 'approved': 1})
+        self.assertEqual(dict(facets['statuses']), {
+            'In εxodus': 1,
+            'Needs rework': 0,
+            'Missing signature': 0,
+            'Not analyzed': 1,
+            'Unmatched in εxodus': 0,
+            'Waiting for review': 0,
+            'Approved': 1,
+        })
+        self.assertEqual(facets['categories'], [('Ads', 1), ('Analytics', 0)])
+
+        response = self.c.get('/trackers/all', {'trackers_select': 'etip'})
+        self.assertEqual(response.context['facets']['exodus'], 0)
+        self.assertEqual(response.context['facets']['etip'], 2)
+
+    def test_facets_single_query(self):
+        trackers = with_approval_count(Tracker.objects.all())
+
+        with self.assertNumQueries(1):
+            compute_facets(trackers)
+
+    def test_review_page_cursor_pagination(self):
+        for i in range(0, 25):
+            tracker = Tracker.objects.create(
+                name=f'tracker_{i:02}',
+                exodus_matches=None if i % 5 == 0 else i % 3
+            )
+            TrackerApproval.objects.create(
+                approver=self.user_1, tracker=tracker)
+
+        response = self.c.get('/trackers/review')
+        trackers = list(response.context['trackers'])
+        cursor = response.context['trackers'].next_cursor
+        response = self.c.get('/trackers/review', {'cursor': cursor})
+        trackers += list(response.context['trackers'])
+
+        self.assertEqual(response.context['count'], 25)
+        self.assertFalse(response.context['trackers'].has_next)
+        expected = sorted(
+            Tracker.objects.filter(name__startswith='tracker_'),
+            key=lambda t: (-(t.exodus_matches if t.exodus_matches is not None else -1), t.name)
+        )
+        self.assertEqual(trackers, expected)
+
+        for values in ([None, None, None], [True, 'a', str(trackers[0].pk)],
+                       ['1', 'a', str(trackers[0].pk)], [1, 'a']):
+            cursor = pagination.encode_cursor('previous', values)
+            response = self.c.get('/trackers/review', {'cursor': cursor})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['trackers']), expected[:20])
+        self.assertIsNone(trackers[-1].exodus_matches)
+
 
 class DisplayTrackerListViewTests(TestCase):
     def test_returns_404_if_missing_tracker(self):
@@ -805,6 +1512,69 @@ class DisplayTrackerListViewTests(TestCase):
         self.assertContains(response, tracker.name, 2)
         self.assertNotContains(response, "Collision detected")
 
+    def test_display_shell_in_one_query(self):
+        tracker = Tracker.objects.create(
+            name='name_tracker_1',
+            code_signature='code_1',
+            website='https://website1',
+            description='some description'
+        )
+
+        c = Client()
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(f'/trackers/{tracker.id}/')
+
+        self.assertContains(
+            response, f'data-fragment-url="/trackers/{tracker.id}/description/"')
+        tracker_queries = [
+            q for q in queries if 'FROM "trackers_tracker"' in q['sql']]
+        self.assertEqual(len(tracker_queries), 1)
+
+    def test_fragments_return_404_if_missing_tracker(self):
+        c = Client()
+        for section in ['collisions', 'approvals', 'history', 'description']:
+            response = c.get(
+                f'/trackers/00b4c3a3-7240-4ffa-8525-3bc934157ccf/{section}/')
+            self.assertEqual(response.status_code, 404)
+            response = c.get(f'/trackers/1/{section}/')
+            self.assertEqual(response.status_code, 404)
+
+    def test_collisions_queries_do_not_depend_on_trackers(self):
+        for i in range(0, 30):
+            Tracker.objects.create(
+                name=f'tracker_{i}', code_signature='toto.com',
+                website='https://website')
+        tracker = Tracker.objects.get(name='tracker_0')
+
+        c = Client()
+        c.get(f'/trackers/{tracker.id}/collisions/')
+        with CaptureQueriesContext(connection) as queries:
+            response = c.get(f'/trackers/{tracker.id}/collisions/')
+
+        self.assertContains(response, 'tracker_29')
+        self.assertContains(response, '(code signature)', 29)
+        self.assertLessEqual(len(queries), 2)
+
+    def test_displays_sanitized_description(self):
+        tracker = Tracker.objects.create(
+            name='name_tracker_1',
+            website='https://website1',
+            description='**Ads** <script>alert(1)</script> [x](javascript:y) '
+                        '[a](&#106;avascript:alert(1)) '
+                        '[b](jav&#x09;ascript:alert(1)) '
+                        '[c](&#x6A;avascript&colon;alert(1)) '
+                        '[d](https://example.com)'
+        )
+
+        c = Client()
+        response = c.get(f'/trackers/{tracker.id}/description/')
+        self.assertContains(response, '<strong>Ads</strong>')
+        self.assertContains(response, '&lt;script&gt;')
+        self.assertNotContains(response, '<script>alert')
+        self.assertNotContains(response, 'javascript:')
+        self.assertNotContains(response, 'avascript')
+        self.assertContains(response, 'href="https://example.com"')
+
     def test_displays_collision_when_code_collision(self):
         tracker_1 = Tracker.objects.create(
             name='match_name_tracker_1',
@@ -821,7 +1591,7 @@ class DisplayTrackerListViewTests(TestCase):
         msg = f"<a href=\"/trackers/{tracker_2.id}/\">{tracker_2.name}</a> (code signature)"
 
         c = Client()
-        response = c.get(f'/trackers/{tracker_1.id}/')
+        response = c.get(f'/trackers/{tracker_1.id}/collisions/')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Collision detected")
         self.assertContains(response, msg)
@@ -842,7 +1612,7 @@ class DisplayTrackerListViewTests(TestCase):
         msg = f"<a href=\"/trackers/{tracker_2.id}/\">{tracker_2.name}</a> (network signature)"
 
         c = Client()
-        response = c.get(f'/trackers/{tracker_1.id}/')
+        response = c.get(f'/trackers/{tracker_1.id}/collisions/')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, "Collision detected")
         self.assertContains(response, msg)
@@ -866,9 +1636,84 @@ class DisplayTrackerListViewTests(TestCase):
         response = c.get(f'/trackers/{tracker.id}/')
         self.assertEqual(response.status_code, 200)
         self.assertContains(response, tracker.name, 2)
+        self.assertContains(response, 'This tracker can be added to εxodus!')
+
+        response = c.get(f'/trackers/{tracker.id}/approvals/')
+        self.assertEqual(response.status_code, 200)
         self.assertContains(response, f"✔️ {user_1.username}")
         self.assertContains(response, f"✔️ {user_2.username}")
 
+    def test_displays_history(self):
+        user = User.objects.create_user(username='testuser1', password='1')
+        with reversion.create_revision():
+            tracker = Tracker.objects.create(
+                name='name_tracker_1', website='https://website1')
+            reversion.set_user(user)
+            reversion.set_comment('Created from the tests')
+
+        c = Client()
+        response = c.get(f'/trackers/{tracker.id}/history/')
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'testuser1')
+        self.assertContains(response, 'Created from the tests')
+
+
+class ConditionalGetTests(TestCase):
+    def setUp(self):
+        self.tracker = Tracker.objects.create(
+            name='tracker_1', code_signature='code_1',
+            website='https://website1')
+        self.user = User.objects.create_user(
+            username='testuser1', password='12345')
+        self.c = Client()
+
+    def test_not_modified_until_catalogue_changes(self):
+        for path in ['/trackers/all', '/trackers/review', '/trackers/approved',
+                     f'/trackers/{self.tracker.id}/']:
+            response = self.c.get(path)
+            self.assertEqual(response.status_code, 200)
+            etag = response['ETag']
+
+            response = self.c.get(path, HTTP_IF_NONE_MATCH=etag)
+            self.assertEqual(response.status_code, 304)
+
+        TrackerApproval.objects.create(approver=self.user, tracker=self.tracker)
+        response = self.c.get(path, HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_deletion_ignores_if_modified_since(self):
+        since = http_date(time.time() + 3600)
+        response = self.c.get('/trackers/all', HTTP_IF_MODIFIED_SINCE=since)
+        etag = response['ETag']
+        self.assertEqual(response.status_code, 200)
+
+        Tracker.objects.create(name='tracker_2').delete()
+        response = self.c.get(
+            '/trackers/all', HTTP_IF_MODIFIED_SINCE=since,
+            HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_category_relation_change_modifies_pages(self):
+        response = self.c.get('/trackers/all')
+        etag = response['ETag']
+
+        self.tracker.category.add(TrackerCategory.objects.create(name='Ads'))
+        response = self.c.get('/trackers/all', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+
+    def test_cache_control(self):
+        response = self.c.get('/trackers/all')
+        self.assertIn('public', response['Cache-Control'])
+        self.assertIn('s-maxage=60', response['Cache-Control'])
+        self.assertIn('Cookie', response['Vary'])
+        self.assertNotIn('Last-Modified', response)
+        etag = response['ETag']
+
+        self.c.login(username='testuser1', password='12345')
+        response = self.c.get('/trackers/all', HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('private', response['Cache-Control'])
+
 
 class ApproveTrackerViewTests(TestCase):
     def setUp(self):
@@ -1001,6 +1846,10 @@ class ShipTrackerViewTests(TestCase):
 
 
 class ExportTrackerListViewTests(TestCase):
+    def setUp(self):
+        # Cached results outlive the rolled back data of previous tests
+        cache.clear()
+
     def test_without_trackers(self):
         c = Client()
         response = c.get('/trackers/export')
@@ -1444,3 +2293,425 @@ class ImportCategoriesCommandTest(TestCase):
         self.assertEqual(Analytic.objects.all().count(), 14)
         self.assertEqual(Network.objects.all().count(), 9)
         self.assertEqual(TrackerCategory.objects.all().count(), 6)
+
+    def test_categories_import_costs_one_query_per_model(self):
+        call_command(self.CMD_NAME, stdout=StringIO())
+
+        # Savepoint + one read per model + release
+        with self.assertNumQueries(7):
+            call_command(self.CMD_NAME, stdout=StringIO())
+
+    def _write_categories_file(self, data):
+        file = tempfile.NamedTemporaryFile(
+            'w', suffix='.json', delete=False)
+        with file:
+            json.dump(data, file)
+        self.addCleanup(os.remove, file.name)
+        return file.name
+
+    def test_categories_are_renamed_and_removed(self):
+        Capability.objects.create(name='Old capability')
+        Capability.objects.create(name='Obsolete capability')
+        filename = self._write_categories_file({
+            'version': 1,
+            'capability': {
+                'names': ['New capability', 'Other capability'],
+                'renamed': {'Old capability': 'New capability'},
+                'removed': ['Obsolete capability'],
+            },
+        })
+
+        call_command(self.CMD_NAME, file=filename, stdout=StringIO())
+
+        self.assertEqual(
+            list(Capability.objects.values_list('name', flat=True)),
+            ['New capability', 'Other capability']
+        )
+        self.assertEqual(TrackerCategory.objects.all().count(), 0)
+
+    def test_rejects_unsupported_file_version(self):
+        filename = self._write_categories_file({'version': 42})
+
+        with self.assertRaisesRegex(CommandError, 'Unsupported'):
+            call_command(self.CMD_NAME, file=filename, stdout=StringIO())
+
+
+class RenderDescriptionsCommandTest(TestCase):
+
+    def test_description_rendered_on_save(self):
+        tracker = Tracker.objects.create(
+            name='tracker_1', website='https://website1', description='*a*')
+        self.assertEqual(tracker.description_html, '<p><em>a</em></p>')
+
+        tracker = Tracker.objects.get(pk=tracker.pk)
+        tracker.description = '*b*'
+        tracker.save()
+        tracker.refresh_from_db()
+        self.assertEqual(tracker.description_html, '<p><em>b</em></p>')
+
+    def test_renders_all_descriptions(self):
+        tracker = Tracker.objects.create(
+            name='tracker_1', website='https://website1', description='*a*')
+        Tracker.objects.create(
+            name='tracker_2', website='https://website2', description='*b*')
+        Tracker.objects.filter(pk=tracker.pk).update(description_html='')
+
+        out = StringIO()
+        call_command('render_descriptions', stdout=out)
+
+        self.assertIn('1 tracker descriptions rendered', out.getvalue())
+        tracker.refresh_from_db()
+        self.assertEqual(tracker.description_html, '<p><em>a</em></p>')
+
+
+class BenchmarkTest(TestCase):
+
+    def test_generated_catalogue(self):
+        benchmark.generate_catalogue(30)
+
+        self.assertEqual(Tracker.objects.count(), 30)
+        self.assertTrue(TrackerApproval.objects.exists())
+        tracker = Tracker.objects.first()
+        self.assertIn(
+            tracker, search_trackers(Tracker.objects.all(), tracker.name))
+        self.assertTrue(tracker.description_html.startswith('<p><strong>'))
+
+    def test_measures_every_endpoint(self):
+        benchmark.generate_catalogue(30)
+
+        results = benchmark.run(repeat=1)
+
+        self.assertEqual(
+            set(results), {name for name, _, _, _ in benchmark.endpoints()})
+        self.assertIn('display_tracker:collisions', results)
+        for result in results.values():
+            self.assertGreater(result['cold_queries'], 0)
+            self.assertGreaterEqual(
+                result['cold_queries'], result['warm_queries'])
+
+    def test_collisions_computed_once(self):
+        benchmark.generate_catalogue(30)
+        self.assertGreaterEqual(benchmark.compute_collisions(), 0)
+        version = versions.get_version(versions.TRACKERS)
+
+        with patch.object(matcher_module, 'find_collisions') as find:
+            benchmark.run(repeat=1)
+
+        find.assert_not_called()
+        self.assertEqual(versions.get_version(versions.TRACKERS), version)
+
+    @skipUnless(connection.vendor == 'sqlite', 'SQLite query plans')
+    def test_query_plans(self):
+        benchmark.generate_catalogue(30)
+
+        results = benchmark.run(repeat=1, plans=True)
+
+        plans = [
+            plan['plan'] for plan in results['review']['plans']
+            if 'ORDER BY' in plan['sql'] and 'is_in_exodus' in plan['sql']
+        ]
+        self.assertEqual(len(plans), 1)
+        self.assertIn('tracker_review_idx', plans[0][0])
+        self.assertFalse(any('TEMP B-TREE' in line for line in plans[0]))
+        plans = [
+            line
+            for plan in results['index?tracker_name']['plans']
+            for line in plan['plan']
+        ]
+        self.assertTrue(
+            any('trackers_tracker_name_lower' in line for line in plans))
+
+    def test_invalid_repeat(self):
+        with self.assertRaises(CommandError):
+            call_command('benchmark', repeat=0)
+
+
+class TrackerViewsQueryBudgetTests(QueryBudgetMixin, TestCase):
+
+    def budgets(self, tracker):
+        path = f'/trackers/{tracker.pk}/'
+        return [
+            ('home', 'get', '/', {}, False, 0),
+            ('index', 'get', '/trackers/all', {}, False, 12),
+            ('index:filters', 'get', '/trackers/all', {
+                'trackers_select': 'etip', 'approve_select': 'need_review',
+                'only_collisions': 'on',
+            }, False, 6),
+            ('index:search', 'get', '/trackers/all', {'q': 'ads'}, False, 12),
+            ('index:last', 'get', '/trackers/all', {'cursor': 'last'},
+             False, 12),
+            ('index:authenticated', 'get', '/trackers/all', {}, True, 14),
+            ('review', 'get', '/trackers/review', {}, False, 14),
+            ('approved', 'get', '/trackers/approved', {}, False, 14),
+            ('lookup', 'get', '/trackers/lookup',
+             {'value': tracker.code_signature.split('|')[0]}, False, 1),
+            ('autocomplete', 'get', '/trackers/autocomplete', {'q': 'a'},
+             False, 1),
+            ('export', 'get', '/trackers/export', {}, False, 3),
+            ('display_tracker', 'get', path, {}, False, 4),
+            ('display_tracker:authenticated', 'get', path, {}, True, 6),
+            ('tracker_collisions', 'get', f'{path}collisions/', {}, False, 2),
+            ('tracker_approvals', 'get', f'{path}approvals/', {}, True, 8),
+            ('tracker_history', 'get', f'{path}history/', {}, False, 2),
+            ('tracker_description', 'get', f'{path}description/', {},
+             False, 1),
+            ('approve', 'post', f'{path}approve/', {}, True, 7),
+            ('revoke', 'post', f'{path}revoke/', {}, True, 5),
+            ('ship', 'post', f'{path}ship/', {}, True, 16),
+            ('needs_rework', 'post', f'{path}needs_rework/', {}, True, 16),
+            ('needs_no_rework', 'post', f'{path}needs_no_rework/', {}, True, 16),
+        ]
+
+
+class CatalogueVersionTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_catalogue_bumped_with_every_version(self):
+        user = User.objects.create_user('jane', 'jdoe@mail.com', '@password')
+        catalogue = versions.get_version(versions.CATALOGUE)
+
+        tracker = Tracker.objects.create(name='tracker_1')
+        self.assertNotEqual(
+            versions.get_version(versions.CATALOGUE), catalogue)
+
+        catalogue = versions.get_version(versions.CATALOGUE)
+        TrackerApproval.objects.create(tracker=tracker, approver=user)
+        self.assertNotEqual(
+            versions.get_version(versions.CATALOGUE), catalogue)
+
+        catalogue = versions.get_version(versions.CATALOGUE)
+        TrackerCategory.objects.create(name='Ads')
+        self.assertNotEqual(
+            versions.get_version(versions.CATALOGUE), catalogue)
+
+    def test_cached_results(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(versions.cached('test', compute, {'a': 1}), 1)
+        self.assertEqual(versions.cached('test', compute, {'a': 1}), 1)
+        self.assertEqual(versions.cached('test', compute, {'a': 2}), 2)
+
+        Tracker.objects.create(name='tracker_1')
+        self.assertEqual(versions.cached('test', compute, {'a': 1}), 3)
+
+        self.assertEqual(versions.cached(
+            'test', compute, names=[versions.CATEGORIES]), 4)
+        Tracker.objects.create(name='tracker_2')
+        self.assertEqual(versions.cached(
+            'test', compute, names=[versions.CATEGORIES]), 4)
+
+    @override_settings(CATALOGUE_JOBS=True)
+    def test_previous_result_while_the_job_is_pending(self):
+        calls = []
+
+        def compute():
+            calls.append(1)
+            return len(calls)
+
+        self.assertEqual(versions.cached('test', compute, job='test'), 1)
+        Tracker.objects.create(name='tracker_1')
+        job = jobs.enqueue('test')
+
+        self.assertEqual(versions.cached('test', compute, job='test'), 1)
+        with versions.fresh_results():
+            self.assertEqual(versions.cached('test', compute, job='test'), 2)
+        Job.objects.filter(pk=job.pk).update(status=Job.DONE)
+        self.assertEqual(versions.cached('test', compute, job='test'), 2)
+
+        Tracker.objects.create(name='tracker_2')
+        self.assertEqual(versions.cached('test', compute), 3)
+
+    def test_private_cache_versions_expire(self):
+        with self.settings():
+            del settings.CATALOGUE_VERSION_TIMEOUT
+            self.assertEqual(versions._timeout(), 60)
+            with self.settings(CACHES=caches_from_env(
+                    {'ETIP_CACHE_BACKEND': 'database'})):
+                self.assertIsNone(versions._timeout())
+
+    @override_settings(DATABASE_REPLICAS=['replica1'])
+    def test_cached_results_computed_on_primary(self):
+        routes = []
+
+        def compute():
+            routes.append(ReplicaRouter().db_for_read(Tracker))
+
+        @read_from_replica
+        def view(request):
+            versions.cached('test', compute)
+            routes.append(ReplicaRouter().db_for_read(Tracker))
+            return HttpResponse()
+
+        ReplicaMiddleware(view)(RequestFactory().get('/trackers/all'))
+
+        self.assertEqual(routes, ['default', 'replica1'])
+
+    def test_export_cached_until_a_change(self):
+        Tracker.objects.create(name='tracker_1')
+        c = Client()
+        c.get('/trackers/export')
+
+        with self.assertNumQueries(0):
+            response = c.get('/trackers/export')
+        self.assertEqual(len(response.json()['trackers']), 1)
+
+        Tracker.objects.create(name='tracker_2')
+        response = c.get('/trackers/export')
+        self.assertEqual(len(response.json()['trackers']), 2)
+
+
+class JobTests(TestCase):
+
+    def setUp(self):
+        cache.clear()
+
+    def test_enqueue_once_per_kind(self):
+        job = jobs.enqueue(jobs.EXPORT)
+
+        self.assertEqual(jobs.enqueue(jobs.EXPORT), job)
+        self.assertNotEqual(jobs.enqueue(jobs.STATS), job)
+        self.assertEqual(Job.objects.count(), 2)
+
+    def test_one_pending_job_per_kind(self):
+        job = jobs.enqueue(jobs.EXPORT)
+
+        with self.assertRaises(IntegrityError), transaction.atomic():
+            Job.objects.create(kind=jobs.EXPORT)
+
+        # Enqueued by another process between the check and the insert
+        with patch.object(Job.objects, 'filter', side_effect=[
+                Job.objects.none(), Job.objects.filter(pk=job.pk)]):
+            self.assertEqual(jobs.enqueue(jobs.EXPORT), job)
+
+    def test_retry_replaced_by_a_new_job(self):
+        jobs.enqueue('broken')
+        job = jobs.claim('test')
+        jobs.enqueue('broken')
+
+        with self.assertLogs('trackers.jobs', 'ERROR'):
+            job = jobs.run(job)
+
+        self.assertEqual(job.status, Job.FAILED)
+        self.assertEqual(
+            Job.objects.filter(kind='broken', status=Job.PENDING).count(), 1)
+
+    def test_catalogue_changes_enqueue_jobs(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            Tracker.objects.create(name='tracker1')
+        self.assertFalse(Job.objects.exists())
+
+        with override_settings(CATALOGUE_JOBS=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                tracker = Tracker.objects.create(name='tracker2')
+                tracker.name = 'tracker3'
+                tracker.save()
+
+        self.assertEqual(
+            sorted(Job.objects.values_list('kind', flat=True)),
+            sorted(jobs.CATALOGUE_JOBS))
+
+    def test_run_pending_jobs(self):
+        Tracker.objects.create(name='tracker1', code_signature='com.t1.ads')
+        Tracker.objects.create(name='tracker2', code_signature='com.t1.')
+        for kind in jobs.CATALOGUE_JOBS:
+            jobs.enqueue(kind)
+
+        self.assertEqual(jobs.run_pending('test'), 3)
+
+        self.assertEqual(
+            set(Job.objects.values_list('status', 'attempts', 'worker')),
+            {(Job.DONE, 1, 'test')})
+        job = Job.objects.get(kind=jobs.SIGNATURES)
+        self.assertEqual(job.output, '1 trackers with collisions')
+        with self.assertNumQueries(0):
+            response = Client().get('/trackers/export')
+        self.assertEqual(len(response.json()['trackers']), 2)
+
+    def test_previous_collisions_until_the_job_runs(self):
+        self.addCleanup(setattr, matcher_module, '_matcher', None)
+        tracker1 = Tracker.objects.create(
+            name='tracker1', code_signature='com.t1.ads')
+        tracker2 = Tracker.objects.create(
+            name='tracker2', code_signature='com.t1.')
+        tracker3 = Tracker.objects.create(
+            name='tracker3', code_signature='com.t1.a')
+        self.assertEqual(
+            matcher_module.get_matcher().collisions('code'),
+            {tracker2.id: {tracker1.id, tracker3.id},
+             tracker3.id: {tracker1.id}})
+
+        with override_settings(CATALOGUE_JOBS=True):
+            with self.captureOnCommitCallbacks(execute=True):
+                tracker3.delete()
+                tracker1.code_signature = 'com.t2.ads'
+                tracker1.save()
+            # Without the deleted tracker
+            self.assertEqual(
+                matcher_module.get_matcher().collisions('code'),
+                {tracker2.id: {tracker1.id}})
+
+            jobs.run_pending('test')
+            self.assertEqual(matcher_module.get_matcher().collisions('code'), {})
+
+    def test_failed_job_is_retried(self):
+        job = jobs.enqueue('broken')
+
+        with self.assertLogs('trackers.jobs', 'ERROR'):
+            job = jobs.run(jobs.claim('test'))
+
+        self.assertEqual(job.status, Job.PENDING)
+        self.assertIn('KeyError', job.error)
+        self.assertGreater(job.run_at, timezone.now())
+        self.assertIsNone(jobs.claim('test'))
+
+        Job.objects.update(run_at=timezone.now(), attempts=jobs.MAX_ATTEMPTS)
+        with self.assertLogs('trackers.jobs', 'ERROR'):
+            job = jobs.run(jobs.claim('test'))
+        self.assertEqual(job.status, Job.FAILED)
+
+    def test_running_job_claimed_again_when_stale(self):
+        jobs.enqueue(jobs.STATS)
+        job = jobs.claim('worker1')
+
+        self.assertEqual(job.status, Job.RUNNING)
+        self.assertIsNone(jobs.claim('worker2'))
+
+        Job.objects.update(started=timezone.now() - timedelta(
+            seconds=jobs.STALE_SECONDS + 1))
+        job = jobs.claim('worker2')
+        self.assertEqual((job.worker, job.attempts), ('worker2', 2))
+
+    def test_purge_finished_jobs(self):
+        old = timezone.now() - timedelta(days=jobs.RETENTION_DAYS + 1)
+        Job.objects.create(kind=jobs.STATS, status=Job.DONE, finished=old)
+        kept = Job.objects.create(kind=jobs.STATS, status=Job.PENDING)
+
+        self.assertEqual(jobs.purge(), 1)
+        self.assertEqual(list(Job.objects.all()), [kept])
+
+    def test_run_worker_once(self):
+        jobs.enqueue(jobs.STATS)
+        out = StringIO()
+
+        call_command('run_worker', once=True, stdout=out)
+
+        self.assertEqual(out.getvalue(), '1 jobs run\n')
+        self.assertEqual(Job.objects.get().status, Job.DONE)
+
+    def test_admin_enqueues_the_exodus_comparison(self):
+        User.objects.create_superuser('admin', 'admin@mail.com', 'password')
+        tracker = Tracker.objects.create(name='tracker1')
+        c = Client()
+        c.login(username='admin', password='password')
+
+        c.post('/admin/trackers/tracker/', {
+            'action': 'compare_with_exodus', '_selected_action': [tracker.pk],
+        })
+
+        self.assertEqual(Job.objects.get().kind, jobs.EXODUS_COMPARISON)
@@ -8,7 +8,13 @@ urlpatterns = [
     path('trackers/all', views.index, name='index'),
     path('trackers/review', views.review, name='review'),
     path('trackers/approved', views.approved, name='approved'),
+    path('trackers/lookup', views.lookup, name='lookup'),
+    path('trackers/autocomplete', views.autocomplete, name='autocomplete'),
     path('trackers/<id>/', views.display_tracker, name='display_tracker'),
+    path('trackers/<id>/collisions/', views.tracker_collisions, name='tracker_collisions'),
+    path('trackers/<id>/approvals/', views.tracker_approvals, name='tracker_approvals'),
+    path('trackers/<id>/history/', views.tracker_history, name='tracker_history'),
+    path('trackers/<id>/description/', views.tracker_description, name='tracker_description'),
     path('trackers/<id>/approve/', views.approve, name='approve'),
     path('trackers/<id>/revoke/', views.revoke, name='revoke'),
     path('trackers/<id>/ship/', views.ship, name='ship'),
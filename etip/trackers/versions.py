@@ -0,0 +1,183 @@
+"""
+Version tokens invalidating the caches of the trackers app.
+
+Tokens live in the default cache, so every process sharing the cache
+backend sees a bump at the same time. Random tokens are used instead of
+integers so that a token evicted from the cache can never be mistaken
+for the one a process has already loaded.
+
+The catalogue version is bumped with any of the others, for the results
+depending on the whole catalogue.
+
+The results refreshed by a background job (see trackers/jobs.py) are also
+kept under a key without the versions: while the job is pending, the
+requests get this previous result instead of computing the new one.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+import hashlib
+import json
+import uuid
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+from etip.caches import version_timeout
+from etip.replicas import read_from_primary
+
+CATEGORIES = 'categories'
+TRACKERS = 'trackers'
+APPROVALS = 'approvals'
+CATALOGUE = 'catalogue'
+NAMES = (CATEGORIES, TRACKERS, APPROVALS, CATALOGUE)
+
+_missing = object()
+_fresh = ContextVar('etip_fresh_results', default=False)
+_watch = ContextVar('etip_previous_results', default=None)
+
+
+def _key(name):
+    return f'trackers:version:{name}'
+
+
+def _new_token():
+    return uuid.uuid4().hex
+
+
+def _timeout():
+    # Without the setting, the tokens of a cache private to the process
+    # still expire, for the changes of the other processes to be seen
+    if hasattr(settings, 'CATALOGUE_VERSION_TIMEOUT'):
+        return settings.CATALOGUE_VERSION_TIMEOUT
+    return version_timeout(settings.CACHES)
+
+
+def get_version(name):
+    return cache.get_or_set(_key(name), _new_token, timeout=_timeout())
+
+
+def bump_version(name):
+    tokens = {_key(name): _new_token()}
+    if name != CATALOGUE:
+        tokens[_key(CATALOGUE)] = _new_token()
+    cache.set_many(tokens, timeout=_timeout())
+
+
+def get_tokens():
+    """
+    Returns the cached tokens of all the versions, to restore them with
+    set_tokens() after clearing the cache.
+    """
+    return cache.get_many([_key(name) for name in NAMES])
+
+
+def set_tokens(tokens):
+    cache.set_many(tokens, timeout=_timeout())
+
+
+def _params_hash(params):
+    return hashlib.sha1(
+        json.dumps(sorted(params.items())).encode()).hexdigest()
+
+
+def versioned_key(prefix, names, params=None):
+    """
+    Returns a cache key for data derived from the given versions, which
+    changes as soon as one of them is bumped.
+    """
+    parts = [prefix] + [get_version(name) for name in names]
+    if params:
+        parts.append(_params_hash(params))
+    return ':'.join(parts)
+
+
+def latest_key(prefix, params=None):
+    """
+    Returns the key of the last result computed for the given parameters,
+    whatever the versions.
+    """
+    parts = [prefix, 'latest']
+    if params:
+        parts.append(_params_hash(params))
+    return ':'.join(parts)
+
+
+@contextmanager
+def fresh_results():
+    """
+    Computes the missing results within the block even while their job is
+    pending, for the jobs themselves.
+    """
+    token = _fresh.set(True)
+    try:
+        yield
+    finally:
+        _fresh.reset(token)
+
+
+class PreviousResults:
+    served = False
+
+
+@contextmanager
+def watch_previous_results():
+    """
+    Yields an object whose served attribute tells whether a previous
+    result was returned within the block.
+    """
+    watch = PreviousResults()
+    token = _watch.set(watch)
+    try:
+        yield watch
+    finally:
+        _watch.reset(token)
+
+
+def _refreshing(job):
+    from trackers.models import Job
+
+    if job is None or _fresh.get() or \
+            not getattr(settings, 'CATALOGUE_JOBS', False):
+        return False
+    return Job.objects.filter(
+        kind=job, status__in=[Job.PENDING, Job.RUNNING]).exists()
+
+
+def get_or_compute(key, compute, timeout=DEFAULT_TIMEOUT, latest=None,
+                   job=None):
+    """
+    Returns the result cached under key, or computes and caches it, and
+    whether it is current. When the job of the given kind is pending, the
+    result cached under the latest key is returned instead, if any.
+    """
+    result = cache.get(key, _missing)
+    if result is not _missing:
+        return result, True
+    if latest is not None and _refreshing(job):
+        result = cache.get(latest, _missing)
+        if result is not _missing:
+            watch = _watch.get()
+            if watch is not None:
+                watch.served = True
+            return result, False
+
+    with read_from_primary():
+        result = compute()
+    cache.set(key, result, timeout=timeout)
+    if latest is not None:
+        cache.set(latest, result, timeout=timeout)
+    return result, True
+
+
+def cached(prefix, compute, params=None, names=(CATALOGUE,),
+           timeout=DEFAULT_TIMEOUT, job=None):
+    """
+    Returns the result of compute(), cached under the given versions and
+    parameters until one of the versions is bumped or the timeout expires.
+    It is computed on the primary database, which has the data of the
+    versions. job is the kind of the job refreshing the result, if any.
+    """
+    result, _ = get_or_compute(
+        versioned_key(prefix, names, params), compute, timeout,
+        latest_key(prefix, params) if job else None, job)
+    return result
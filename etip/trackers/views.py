@@ -1,30 +1,44 @@
+import hashlib
+import json
+
 from django.core.exceptions import PermissionDenied, ValidationError
-from django.core.paginator import Paginator
-from django.http import JsonResponse
+from django.db.models import Count, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce
+from django.http import HttpResponse, JsonResponse
 from django.http.response import Http404
 from django.shortcuts import redirect, render
+from etip.replicas import read_from_replica
 import reversion
+from reversion.models import Version
 
-from .models import Tracker, TrackerApproval
+from . import jobs, matcher, name_index, pagination, versions
+from .catalogue import catalogue_condition
+from .category_cache import attach_category_ids
+from .facets import get_facets
+from .models import EXODUS_MATCHES_KEY, Tracker, TrackerApproval
+from .search import filter_name_prefix, search_trackers
 
 
 def home(request):
     return render(request, 'home.html')
 
 
+@read_from_replica
+@catalogue_condition()
 def index(request):
     try:
         # TODO: Use a Django Form instead ?
         filter_name = request.GET.get('tracker_name', '')
+        search_query = request.GET.get('q', '')
         only_collisions = request.GET.get('only_collisions', False)
         approve_select = request.GET.get('approve_select', '')
         trackers_select = request.GET.get('trackers_select', '')
+        trackers = with_approval_count(Tracker.objects.all())
         if filter_name:
-            trackers = Tracker.objects.filter(name__startswith=filter_name)
-        else:
-            trackers = Tracker.objects
+            trackers = filter_name_prefix(trackers, filter_name)
 
-        trackers = trackers.order_by('name')
+        if search_query:
+            trackers = search_trackers(trackers, search_query)
 
         if trackers_select == "exodus":
             trackers = trackers.filter(is_in_exodus=True)
@@ -32,94 +46,235 @@ def index(request):
             trackers = trackers.filter(is_in_exodus=False)
 
         if only_collisions:
-            trackers = list(
-                t for t in trackers if t.has_any_signature_collision()
-            )
+            trackers = trackers.filter(
+                pk__in=matcher.get_matcher().colliding_ids())
 
         if approve_select == "approved":
-            trackers = list(
-                t for t in trackers if t.approvals.count() >= 2
-            )
+            trackers = trackers.filter(approvals_count__gte=2)
         elif approve_select == "need_review":
-            trackers = list(
-                t for t in trackers if t.approvals.count() == 1
-            )
+            trackers = trackers.filter(approvals_count=1)
         elif approve_select == "no_approvals":
-            trackers = list(
-                t for t in trackers if t.approvals.count() == 0
-            )
-
-        count = len(trackers)
-
-        paginator = Paginator(trackers, 20)
-        page = request.GET.get('page', 1)
-        trackers = paginator.get_page(page)
+            trackers = trackers.filter(approvals_count=0)
+
+        filters = {
+            'tracker_name': filter_name,
+            'q': search_query,
+            'only_collisions': bool(only_collisions),
+            'approve_select': approve_select,
+            'trackers_select': trackers_select,
+        }
+        count = pagination.count(trackers, 'index', filters)
+        facets = get_facets(trackers, filters)
+
+        trackers = pagination.paginate(
+            trackers, pagination.NAME_ORDERING, request)
+        attach_category_ids(trackers, Tracker.CATEGORY_FIELDS)
+        matcher.attach_collisions(trackers)
+        attach_row_versions(trackers)
     except Tracker.DoesNotExist:
         raise Http404("trackers does not exist")
 
     return render(request, 'tracker_list.html', {
         'trackers': trackers,
         'count': count,
+        'facets': facets,
         'filter_name': filter_name,
+        'search_query': search_query,
         'only_collisions': 'checked' if only_collisions else '',
         'approve_select': approve_select,
         'trackers_select': trackers_select
     })
 
 
-def display_tracker(request, id):
+def get_tracker_or_404(id, queryset=None):
+    if queryset is None:
+        queryset = Tracker.objects.all()
     try:
-        tracker = Tracker.objects.get(pk=id)
+        return queryset.get(pk=id)
     except (Tracker.DoesNotExist, ValidationError):
         raise Http404("Tracker does not exist")
 
+
+@read_from_replica
+@catalogue_condition()
+def display_tracker(request, id):
+    # The expensive sections are loaded afterwards from the fragment views
+    tracker = get_tracker_or_404(
+        id, with_approval_count(Tracker.objects.defer('description_html')))
+
     return render(request, 'tracker.html', {'tracker': tracker})
 
 
-def review(request):
+@read_from_replica
+def tracker_collisions(request, id):
+    tracker = get_tracker_or_404(id, Tracker.objects.only('id'))
+
+    shared_matcher = matcher.get_matcher()
+    return render(request, 'tracker_collisions.html', {
+        'code_collisions': shared_matcher.colliding_trackers(
+            tracker.pk, matcher.CODE),
+        'network_collisions': shared_matcher.colliding_trackers(
+            tracker.pk, matcher.NETWORK),
+    })
+
+
+@read_from_replica
+def tracker_approvals(request, id):
+    tracker = get_tracker_or_404(
+        id, Tracker.objects.prefetch_related('approvals__approver'))
+
+    return render(request, 'tracker_approvals.html', {'tracker': tracker})
+
+
+@read_from_replica
+def tracker_history(request, id):
+    tracker = get_tracker_or_404(id, Tracker.objects.only('id'))
+    versions = Version.objects.get_for_object(tracker).select_related(
+        'revision__user')
+
+    return render(request, 'tracker_history.html', {'versions': versions})
+
+
+@read_from_replica
+def tracker_description(request, id):
+    tracker = get_tracker_or_404(
+        id, Tracker.objects.only('id', 'description', 'description_html'))
+
+    return render(request, 'tracker_description.html', {'tracker': tracker})
+
+
+def autocomplete(request):
+    query = request.GET.get('q', '')
     try:
-        trackers = Tracker.objects.filter(is_in_exodus=False).order_by('-exodus_matches', 'name')
-        trackers = list(t for t in trackers if t.approvals.count() == 1)
+        limit = min(int(request.GET.get('limit', 10)), 50)
+    except ValueError:
+        limit = 10
+    names = name_index.get_index().complete(query, limit) if query else []
+    return JsonResponse({'names': names})
 
-        count = len(trackers)
 
-        paginator = Paginator(trackers, 20)
-        page = request.GET.get('page', 1)
-        trackers = paginator.get_page(page)
-    except Tracker.DoesNotExist:
-        raise Http404("trackers does not exist")
+def lookup(request):
+    value = request.GET.get('value', '').strip()
+    matches = matcher.lookup(value) if value else []
 
-    return render(request, 'tracker_review.html', {
-        'title': 'Waiting for review',
-        'trackers': trackers,
-        'count': count,
+    return render(request, 'tracker_lookup.html', {
+        'value': value,
+        'matches': matches,
     })
 
 
+@read_from_replica
+@catalogue_condition()
+def review(request):
+    return review_list(
+        request, 'review', 'Waiting for review', approvals_count=1)
+
+
+@read_from_replica
+@catalogue_condition()
 def approved(request):
-    try:
-        trackers = Tracker.objects.filter(is_in_exodus=False).order_by('-exodus_matches', 'name')
-        trackers = list(t for t in trackers if t.approvals.count() >= 2)
+    return review_list(
+        request, 'approved', 'Approved trackers', approvals_count__gte=2)
 
-        count = len(trackers)
 
-        paginator = Paginator(trackers, 20)
-        page = request.GET.get('page', 1)
-        trackers = paginator.get_page(page)
+def review_list(request, view, title, **approvals):
+    try:
+        trackers = with_approval_count(
+            Tracker.objects.filter(is_in_exodus=False)
+        ).filter(**approvals).annotate(
+            exodus_matches_key=EXODUS_MATCHES_KEY
+        ).prefetch_related('approvals__approver')
+
+        count = pagination.count(trackers, view, {})
+
+        trackers = pagination.paginate(
+            trackers, pagination.EXODUS_ORDERING, request)
+        attach_category_ids(trackers, Tracker.CATEGORY_FIELDS)
+        matcher.attach_collisions(trackers)
+        attach_creators(trackers)
+        attach_row_versions(trackers, approvers=True)
     except Tracker.DoesNotExist:
         raise Http404("trackers does not exist")
 
     return render(request, 'tracker_review.html', {
-        'title': 'Approved trackers',
+        'title': title,
         'trackers': trackers,
         'count': count,
     })
 
 
+def attach_creators(trackers):
+    """
+    Fetches the creators of all trackers at once, from their first
+    revision, with a single query.
+    """
+    trackers = list(trackers)
+    if not trackers:
+        return trackers
+
+    object_ids = {str(tracker.pk): tracker for tracker in trackers}
+    creators = {}
+    first_versions = Version.objects.get_for_model(Tracker).filter(
+        object_id__in=object_ids).select_related('revision__user').order_by(
+        '-pk')
+    for version in first_versions:
+        creators[version.object_id] = version.revision.user
+    for object_id, tracker in object_ids.items():
+        tracker._creator = creators.get(object_id)
+    return trackers
+
+
+def attach_row_versions(trackers, approvers=False):
+    """
+    Sets the version of the cached rows of the trackers. Rows are also
+    keyed on their tracker update time and approval count, but show the
+    collisions with other trackers, the category names and, on the review
+    pages, the approvers: the version is a digest of those of the tracker,
+    so that the other changes of the catalogue keep its row cached.
+    """
+    for tracker in trackers:
+        parts = [
+            [(str(other.pk), other.name) for other in tracker._collisions[kind]]
+            for kind, _ in matcher.SIGNATURE_FIELDS
+        ]
+        parts.append(tracker.category_names())
+        if approvers:
+            parts.append(tracker.approvers())
+        tracker.row_version = hashlib.sha1(
+            json.dumps(parts).encode()).hexdigest()
+    return trackers
+
+
+def with_approval_count(trackers):
+    # A correlated subquery rather than a GROUP BY, so that the facets can
+    # aggregate on top of it
+    approvals = TrackerApproval.objects.filter(
+        tracker=OuterRef('pk')).order_by().values('tracker').annotate(
+        count=Count('pk')).values('count')
+    return trackers.annotate(
+        approvals_count=Coalesce(Subquery(approvals), Value(0)))
+
+
+def get_export():
+    """
+    Returns the JSON export of all trackers, cached until a tracker or a
+    category changes.
+    """
+    def export():
+        trackers = attach_category_ids(
+            Tracker.objects.order_by('name'), ['category'])
+        trackers_list = [tracker.serialize() for tracker in trackers]
+        return JsonResponse(dict(trackers=trackers_list)).content
+
+    return versions.cached(
+        'trackers:export', export,
+        names=[versions.TRACKERS, versions.CATEGORIES], job=jobs.EXPORT)
+
+
+@read_from_replica
 def export_tracker_list(request):
-    trackers = Tracker.objects.order_by('name')
-    trackers_list = [tracker.serialize() for tracker in trackers]
-    response = JsonResponse(dict(trackers=trackers_list))
+    content = get_export()
+    response = HttpResponse(content, content_type='application/json')
     response['Content-Disposition'] = 'attachment; filename=trackers.json'
     return response
 